@@ -1,44 +1,123 @@
-import mysql.connector
+import sqlite3
+import threading
+from itertools import islice
 from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from backends import create_backend
+from db_pool import Error
+from password_hasher import password_hasher
+
+# What a failed or unreachable database raises, whichever backend is in use
+DATABASE_ERRORS = (Error, sqlite3.Error, OSError)
+
+# Storage backend (MySQL or SQLite) - picked from NYX_DB_BACKEND on first use,
+# or explicitly with configure()
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def configure(backend=None, **options):
+    """
+    Switch to another backend, e.g. configure('sqlite', path=':memory:').
+    Closes the current one first. Returns the new backend.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.close()
+        _backend = create_backend(backend, **options)
+    return _backend
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
 
 def get_connection():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="",          # default XAMPP
-        database="nyx_sleep"
-    )
+    """Check a connection out of the shared pool - close() hands it back"""
+    return get_backend().connect()
+
+
+def get_pool_stats():
+    """Pool counters (hits, waits, checkout time...) for monitoring"""
+    return get_backend().stats()
+
+
+def close_pool():
+    """Close all pooled connections, e.g. when the app stops (an in-memory SQLite database is discarded)"""
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.close()
+            _backend = None
 
 
 # ---------- USERS ----------
-def create_user(username, password, email):
-    """Create user with email support"""
+# users.password holds a password_hasher hash. Hashing happens before a
+# pooled connection is checked out, so slow hashes never hold one.
+def create_user(username, password, email, password_hash=None):
+    """
+    Create user with email support. Data generators pass password_hash
+    (password_hasher.hash(password), made once) to skip hashing per user.
+    """
+    password_hash = password_hash or password_hasher.hash(password)
     db = get_connection()
     cur = db.cursor()
     cur.execute(
         "INSERT INTO users (username, password, email) VALUES (%s,%s,%s)",
-        (username, password, email)
+        (username, password_hash, email)
     )
     db.commit()
     db.close()
 
 
 def validate_user(username, password):
+    """
+    The user (without the password column) if the password is right, else None.
+    Hashes with an outdated algorithm or cost, and legacy plaintext
+    passwords, are replaced with a current hash on success.
+    """
     db = get_connection()
     cur = db.cursor(dictionary=True)
     cur.execute(
-        "SELECT * FROM users WHERE username=%s AND password=%s",
-        (username, password)
+        "SELECT user_id, username, email, password, created_at FROM users WHERE username=%s",
+        (username,)
     )
     user = cur.fetchone()
     db.close()
+    
+    stored = user.pop('password') if user else None
+    if not password_hasher.verify(password, stored):
+        return None
+    
+    if password_hasher.needs_rehash(stored):
+        new_hash = password_hasher.hash(password)
+        db = get_connection()
+        cur = db.cursor()
+        # Only if the password was not changed in the meantime
+        cur.execute(
+            "UPDATE users SET password=%s WHERE user_id=%s AND password=%s",
+            (new_hash, user['user_id'], stored)
+        )
+        db.commit()
+        db.close()
     return user
 
 
+# Never the password column - only validate_user needs it
+USER_COLUMNS = "user_id, username, email, created_at"
+
+
 def get_user_by_name(username):
     db = get_connection()
     cur = db.cursor(dictionary=True)
-    cur.execute("SELECT * FROM users WHERE username=%s", (username,))
+    cur.execute(f"SELECT {USER_COLUMNS} FROM users WHERE username=%s", (username,))
     user = cur.fetchone()
     db.close()
     return user
@@ -48,7 +127,7 @@ def get_user_by_email(email):
     """Get user by email address"""
     db = get_connection()
     cur = db.cursor(dictionary=True)
-    cur.execute("SELECT * FROM users WHERE email=%s", (email,))
+    cur.execute(f"SELECT {USER_COLUMNS} FROM users WHERE email=%s", (email,))
     user = cur.fetchone()
     db.close()
     return user
@@ -56,23 +135,27 @@ def get_user_by_email(email):
 
 def update_user_password(user_id, new_password):
     """Update user's password"""
+    password_hash = password_hasher.hash(new_password)
     db = get_connection()
     cur = db.cursor()
     cur.execute(
         "UPDATE users SET password=%s WHERE user_id=%s",
-        (new_password, user_id)
+        (password_hash, user_id)
     )
     db.commit()
     db.close()
 
 
 # ---------- PASSWORD RESET ----------
+RESET_CODE_TTL = timedelta(minutes=15)
+
+
 def save_reset_code(email, code):
     """Save password reset verification code"""
     db = get_connection()
     cur = db.cursor()
     
-    expires_at = datetime.now() + timedelta(minutes=15)
+    expires_at = datetime.now() + RESET_CODE_TTL
     
     cur.execute("""
         INSERT INTO password_resets (email, code, expires_at)
@@ -88,10 +171,12 @@ def verify_reset_code(email, code):
     db = get_connection()
     cur = db.cursor(dictionary=True)
     
+    # Every code lives RESET_CODE_TTL, so the latest expiry is the newest code.
+    # idx_resets_lookup answers this without touching the table.
     cur.execute("""
-        SELECT * FROM password_resets 
+        SELECT reset_id FROM password_resets
         WHERE email=%s AND code=%s AND used=0 AND expires_at > NOW()
-        ORDER BY created_at DESC LIMIT 1
+        ORDER BY expires_at DESC LIMIT 1
     """, (email, code))
     
     result = cur.fetchone()
@@ -99,8 +184,8 @@ def verify_reset_code(email, code):
     if result:
         # Mark code as used
         cur.execute(
-            "UPDATE password_resets SET used=1 WHERE id=%s",
-            (result['id'],)
+            "UPDATE password_resets SET used=1 WHERE reset_id=%s",
+            (result['reset_id'],)
         )
         db.commit()
         db.close()
@@ -119,60 +204,565 @@ def delete_reset_code(email):
     db.close()
 
 
-# ---------- SLEEP ----------
-def add_sleep_session(user_id, year, month, day, hours):
+def purge_reset_codes(retention=timedelta(hours=24), batch_size=500):
+    """
+    Delete codes, used or not, that expired more than `retention` ago.
+    Works through idx_resets_expiry batch_size rows at a time, each batch
+    on its own pooled connection and transaction, so a large backlog never
+    holds locks or a connection for long. Returns the number deleted.
+    """
+    cutoff = datetime.now() - retention
+    deleted = 0
+    while True:
+        db = get_connection()
+        cur = db.cursor()
+        try:
+            cur.execute("""
+                SELECT reset_id FROM password_resets
+                WHERE expires_at < %s
+                ORDER BY expires_at
+                LIMIT %s
+            """, (cutoff, batch_size))
+            reset_ids = [row[0] for row in cur.fetchall()]
+            if reset_ids:
+                placeholders = ','.join(['%s'] * len(reset_ids))
+                cur.execute(f"DELETE FROM password_resets WHERE reset_id IN ({placeholders})", reset_ids)
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        deleted += len(reset_ids)
+        if len(reset_ids) < batch_size:
+            return deleted
+
+
+# ---------- RATE LIMITS ----------
+# Token buckets in the database, shared by every app process
+# (rate_limiter.DatabaseStore). Times are Unix timestamps in seconds.
+def take_rate_limit_token(bucket_key, capacity, refill_rate, now):
+    """
+    Refill bucket_key for the time since it was last used (refill_rate
+    tokens a second, up to capacity), then take one token if it has one.
+    One upsert, so concurrent callers can't both take the last token.
+    Returns (allowed, tokens left).
+    """
+    backend = get_backend()
+    # Assignments only read columns not yet assigned, so MySQL (left to
+    # right, new values) and SQLite (old values) compute the same thing
+    refilled = "CASE WHEN tokens + (%s - updated_at) * %s > %s THEN %s ELSE tokens + (%s - updated_at) * %s END"
+    refill_params = (now, refill_rate, capacity, capacity, now, refill_rate)
+    db = get_connection()
+    cur = db.cursor()
+    try:
+        cur.execute(f"""
+            INSERT INTO rate_limits (bucket_key, allowed, tokens, updated_at)
+            VALUES (%s, 1, %s, %s)
+            {backend.upsert('bucket_key')}
+                allowed = CASE WHEN {refilled} >= 1 THEN 1 ELSE 0 END,
+                tokens = CASE WHEN {refilled} >= 1 THEN {refilled} - 1 ELSE {refilled} END,
+                updated_at = %s
+        """, (bucket_key, capacity - 1, now) + refill_params * 4 + (now,))
+        cur.execute("SELECT allowed, tokens FROM rate_limits WHERE bucket_key=%s", (bucket_key,))
+        allowed, tokens = cur.fetchone()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return bool(allowed), float(tokens)
+
+
+def refund_rate_limit_token(bucket_key, capacity):
+    """Give back a token take_rate_limit_token() took, up to capacity"""
     db = get_connection()
     cur = db.cursor()
     cur.execute(
-        "INSERT INTO sleep_sessions (user_id, year, month, day, hours) VALUES (%s,%s,%s,%s,%s)",
-        (user_id, year, month, day, hours)
+        "UPDATE rate_limits SET tokens = CASE WHEN tokens + 1 > %s THEN %s ELSE tokens + 1 END "
+        "WHERE bucket_key=%s",
+        (capacity, capacity, bucket_key)
     )
     db.commit()
     db.close()
 
 
+def reset_rate_limit(bucket_key):
+    """Forget a bucket, i.e. refill it completely"""
+    db = get_connection()
+    cur = db.cursor()
+    cur.execute("DELETE FROM rate_limits WHERE bucket_key=%s", (bucket_key,))
+    db.commit()
+    db.close()
+
+
+def purge_rate_limits(idle_before):
+    """Delete buckets unused since idle_before - they would be full again anyway"""
+    db = get_connection()
+    cur = db.cursor()
+    cur.execute("DELETE FROM rate_limits WHERE updated_at < %s", (idle_before,))
+    deleted = cur.rowcount
+    db.commit()
+    db.close()
+    return deleted
+
+
+# ---------- SLEEP ----------
+# A session is a start_ts/end_ts interval. The database derives sleep_date
+# (the day it started) and hours from them; session_interval() computes the
+# same values for the rollups.
+# Reads select exactly SESSION_COLUMNS, which idx_sessions_by_date covers.
+SESSION_COLUMNS = "session_id, sleep_date, start_ts, end_ts, hours"
+
+def _as_datetime(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def session_interval(start_ts, end_ts):
+    """
+    (start_ts, end_ts, sleep_date, hours) for a session, with times cut to
+    whole seconds like the DATETIME columns. Accepts datetimes or ISO strings.
+    """
+    start_ts = _as_datetime(start_ts).replace(microsecond=0)
+    end_ts = _as_datetime(end_ts).replace(microsecond=0)
+    if end_ts < start_ts:
+        raise ValueError(f"Sleep session ends ({end_ts}) before it starts ({start_ts})")
+    seconds = int((end_ts - start_ts).total_seconds())
+    hours = (Decimal(seconds) / 3600).quantize(Decimal('0.01'), ROUND_HALF_UP)
+    return start_ts, end_ts, start_ts.date(), hours
+
+
+def _insert_sessions(cur, sessions):
+    """INSERT (user_id, start_ts, end_ts) rows and their rollups inside the caller's transaction"""
+    rows = [(user_id,) + session_interval(start_ts, end_ts)
+            for user_id, start_ts, end_ts in sessions]
+    cur.executemany(
+        "INSERT INTO sleep_sessions (user_id, start_ts, end_ts) VALUES (%s,%s,%s)",
+        [(user_id, start_ts, end_ts) for user_id, start_ts, end_ts, _, _ in rows]
+    )
+    _apply_rollups(cur, [(user_id, sleep_date, hours) for user_id, _, _, sleep_date, hours in rows])
+
+
+def add_sleep_session(user_id, start_ts, end_ts):
+    """Insert a session and fold it into the user's rollups in one transaction"""
+    db = get_connection()
+    cur = db.cursor()
+    try:
+        _insert_sessions(cur, [(user_id, start_ts, end_ts)])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def add_sleep_sessions_bulk(sessions, batch_size=1000):
+    """
+    Insert many sessions at once.
+    `sessions` is any iterable of (user_id, start_ts, end_ts) and is
+    consumed lazily, so generators of millions of rows are fine. Each batch
+    is one multi-row INSERT plus its rollup updates in a single transaction.
+    Returns the number of sessions inserted.
+    """
+    sessions = iter(sessions)
+    inserted = 0
+    db = get_connection()
+    cur = db.cursor()
+    try:
+        while True:
+            batch = list(islice(sessions, batch_size))
+            if not batch:
+                break
+            _insert_sessions(cur, batch)
+            db.commit()
+            inserted += len(batch)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return inserted
+
+
 def get_all_sessions(user_id):
     db = get_connection()
     cur = db.cursor(dictionary=True)
+    cur.execute(f"""
+        SELECT {SESSION_COLUMNS}
+        FROM sleep_sessions
+        WHERE user_id=%s
+        ORDER BY sleep_date DESC, session_id DESC
+    """, (user_id,))
+    sessions = cur.fetchall()
+    db.close()
+    return sessions
+
+
+def get_sessions_between(user_id, start_date, end_date):
+    """Sessions whose sleep date falls within [start_date, end_date], oldest first"""
+    db = get_connection()
+    cur = db.cursor(dictionary=True)
+    cur.execute(f"""
+        SELECT {SESSION_COLUMNS}
+        FROM sleep_sessions
+        WHERE user_id=%s AND sleep_date BETWEEN %s AND %s
+        ORDER BY sleep_date, session_id
+    """, (user_id, start_date, end_date))
+    sessions = cur.fetchall()
+    db.close()
+    return sessions
+
+
+def get_sessions_page(user_id, after=None, limit=50):
+    """
+    One page of sessions, newest first.
+    Returns (sessions, cursor) - pass the cursor back as `after` to get the
+    next page. The cursor is None once there is nothing left to fetch.
+    """
+    db = get_connection()
+    cur = db.cursor(dictionary=True)
+    
+    if after is None:
+        cur.execute(f"""
+            SELECT {SESSION_COLUMNS}
+            FROM sleep_sessions
+            WHERE user_id=%s
+            ORDER BY sleep_date DESC, session_id DESC
+            LIMIT %s
+        """, (user_id, limit))
+    else:
+        after_date, after_id = after
+        cur.execute(f"""
+            SELECT {SESSION_COLUMNS}
+            FROM sleep_sessions
+            WHERE user_id=%s
+              AND (sleep_date < %s OR (sleep_date = %s AND session_id < %s))
+            ORDER BY sleep_date DESC, session_id DESC
+            LIMIT %s
+        """, (user_id, after_date, after_date, after_id, limit))
+    
+    sessions = cur.fetchall()
+    db.close()
+    
+    cursor = None
+    if len(sessions) == limit:
+        last = sessions[-1]
+        cursor = (last['sleep_date'], last['session_id'])
+    return sessions, cursor
+
+
+def iter_sessions(user_id, page_size=500):
+    """Stream a user's sessions newest first without loading them all at once"""
+    cursor = None
+    while True:
+        sessions, cursor = get_sessions_page(user_id, after=cursor, limit=page_size)
+        yield from sessions
+        if cursor is None:
+            break
+
+
+def get_sessions_fingerprint(user_id):
+    """
+    Cheap version stamp for a user's sessions (count + newest id).
+    Changes whenever a session is added or removed, so callers can tell
+    if anything derived from the sessions needs rebuilding.
+    """
+    db = get_connection()
+    cur = db.cursor()
     cur.execute(
-        "SELECT * FROM sleep_sessions WHERE user_id=%s ORDER BY created_at DESC",
+        "SELECT COUNT(*), COALESCE(MAX(session_id), 0) FROM sleep_sessions WHERE user_id=%s",
         (user_id,)
     )
+    fingerprint = tuple(cur.fetchone())
+    db.close()
+    return fingerprint
+
+
+def _summary_row(total_hours, session_count):
+    total_hours = total_hours or 0
+    session_count = int(session_count or 0)
+    return {
+        'session_count': session_count,
+        'total_hours': total_hours,
+        'avg_hours': total_hours / session_count if session_count else 0,
+    }
+
+
+def get_sleep_summary(user_id):
+    """Session count, total and average hours across a user's whole history"""
+    db = get_connection()
+    cur = db.cursor()
+    cur.execute("""
+        SELECT SUM(total_hours), SUM(session_count)
+        FROM sleep_rollups
+        WHERE user_id=%s AND period='month'
+    """, (user_id,))
+    summary = _summary_row(*cur.fetchone())
+    db.close()
+    return summary
+
+
+def get_monthly_summary(user_id, year, month):
+    """Session count, total and average hours for a single month"""
+    db = get_connection()
+    cur = db.cursor()
+    cur.execute("""
+        SELECT total_hours, session_count
+        FROM sleep_rollups
+        WHERE user_id=%s AND period='month' AND bucket=%s
+    """, (user_id, f"{year:04d}-{month:02d}"))
+    row = cur.fetchone()
+    db.close()
+    return _summary_row(*row) if row else _summary_row(0, 0)
+
+
+def get_recent_sessions(user_id, limit=10):
+    """Most recent sessions only - what the stats screen actually lists"""
+    db = get_connection()
+    cur = db.cursor(dictionary=True)
+    cur.execute(f"""
+        SELECT {SESSION_COLUMNS}
+        FROM sleep_sessions
+        WHERE user_id=%s
+        ORDER BY sleep_date DESC, session_id DESC
+        LIMIT %s
+    """, (user_id, limit))
     sessions = cur.fetchall()
     db.close()
     return sessions
 
 
-# ---------- USER SETTINGS ----------
-def save_user_settings(user_id, bedtime_enabled, bedtime_hour, bedtime_minute, bedtime_ampm,
-                      alarm_enabled, alarm_hour, alarm_minute, alarm_ampm):
-    """Save or update user's bedtime and alarm settings"""
+# ---------- ROLLUPS ----------
+# sleep_rollups keeps per-user sums and counts so statistics read a handful of
+# buckets instead of every session. Periods and their bucket keys:
+#   day   - 'YYYY-MM-DD'
+#   week  - 'YYYY-MM-DD' of the Sunday the week starts on
+#   month - 'YYYY-MM'
+#   dow   - '0'..'6', Monday=0
+# Every bucket also tracks the weekend (Sat/Sun) share of its hours.
+# Each backend computes the same bucket keys in SQL (Backend.ROLLUP_BUCKET_SQL).
+ROLLUP_PERIODS = ('day', 'week', 'month', 'dow')
+
+
+def rollup_buckets(sleep_date):
+    """(period, bucket) pairs a session on sleep_date contributes to"""
+    week_start = sleep_date - timedelta(days=(sleep_date.weekday() + 1) % 7)
+    return [
+        ('day', sleep_date.isoformat()),
+        ('week', week_start.isoformat()),
+        ('month', sleep_date.strftime('%Y-%m')),
+        ('dow', str(sleep_date.weekday())),
+    ]
+
+
+def _apply_rollups(cur, sessions):
+    """Add (user_id, sleep_date, hours) rows to the rollups inside the caller's transaction"""
+    deltas = {}
+    for user_id, sleep_date, hours in sessions:
+        weekend = sleep_date.weekday() >= 5
+        for period, bucket in rollup_buckets(sleep_date):
+            key = (user_id, period, bucket)
+            total, count, weekend_total, weekend_count = deltas.get(key, (0, 0, 0, 0))
+            deltas[key] = (
+                total + hours,
+                count + 1,
+                weekend_total + (hours if weekend else 0),
+                weekend_count + (1 if weekend else 0),
+            )
+    
+    backend = get_backend()
+    new = backend.excluded
+    cur.executemany(f"""
+        INSERT INTO sleep_rollups
+        (user_id, period, bucket, total_hours, session_count, weekend_hours, weekend_count)
+        VALUES (%s,%s,%s,%s,%s,%s,%s)
+        {backend.upsert('user_id', 'period', 'bucket')}
+            total_hours = total_hours + {new('total_hours')},
+            session_count = session_count + {new('session_count')},
+            weekend_hours = weekend_hours + {new('weekend_hours')},
+            weekend_count = weekend_count + {new('weekend_count')}
+    """, [key + values for key, values in sorted(deltas.items())])
+
+
+def get_rollups(user_id, period, limit=None):
+    """
+    Rollup buckets for one period, oldest first.
+    With a limit, only the most recent `limit` buckets are returned.
+    """
+    db = get_connection()
+    cur = db.cursor(dictionary=True)
+    query = """
+        SELECT bucket, total_hours, session_count, weekend_hours, weekend_count
+        FROM sleep_rollups
+        WHERE user_id=%s AND period=%s
+        ORDER BY bucket DESC
+    """
+    params = (user_id, period)
+    if limit is not None:
+        query += " LIMIT %s"
+        params += (limit,)
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    db.close()
+    rows.reverse()
+    return rows
+
+
+def rebuild_rollups(user_id=None):
+    """
+    Recompute rollups from sleep_sessions - for existing data or after manual edits.
+    Runs one transaction per user so a big table is never locked all at once.
+    Returns the number of users rebuilt.
+    """
+    backend = get_backend()
     db = get_connection()
     cur = db.cursor()
     
-    # Check if settings exist
-    cur.execute("SELECT * FROM user_settings WHERE user_id=%s", (user_id,))
-    existing = cur.fetchone()
+    if user_id is None:
+        cur.execute("SELECT user_id FROM users ORDER BY user_id")
+        user_ids = [row[0] for row in cur.fetchall()]
+    else:
+        user_ids = [user_id]
+    
+    try:
+        for uid in user_ids:
+            cur.execute("DELETE FROM sleep_rollups WHERE user_id=%s", (uid,))
+            for period in ROLLUP_PERIODS:
+                cur.execute("""
+                    INSERT INTO sleep_rollups
+                    (user_id, period, bucket, total_hours, session_count, weekend_hours, weekend_count)
+                    SELECT user_id, %s, {bucket} AS bucket, SUM(hours), COUNT(*),
+                           SUM(CASE WHEN {weekend} THEN hours ELSE 0 END),
+                           SUM(CASE WHEN {weekend} THEN 1 ELSE 0 END)
+                    FROM sleep_sessions
+                    WHERE user_id=%s
+                    GROUP BY user_id, bucket
+                """.format(bucket=backend.ROLLUP_BUCKET_SQL[period], weekend=backend.WEEKEND_SQL),
+                    (period, uid))
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    
+    return len(user_ids)
+
+
+# ---------- SYNC ----------
+# Used by sync_engine.py to move sessions between the local store and the server database
+
+def push_sleep_sessions(user_id, sessions):
+    """
+    Insert sessions recorded on a device, skipping any already pushed.
+    `sessions` is a list of dicts with client_uuid, start_ts, end_ts.
+    Returns {client_uuid: session_id} for all of them, new or not.
+    """
+    if not sessions:
+        return {}
     
-    if existing:
-        # Update existing settings
+    uuids = [s['client_uuid'] for s in sessions]
+    placeholders = ','.join(['%s'] * len(uuids))
+    db = get_connection()
+    cur = db.cursor()
+    try:
+        cur.execute(
+            f"SELECT client_uuid FROM sleep_sessions WHERE client_uuid IN ({placeholders})", uuids
+        )
+        existing = {row[0] for row in cur.fetchall()}
+        new = [s for s in sessions if s['client_uuid'] not in existing]
+        
+        if new:
+            intervals = [session_interval(s['start_ts'], s['end_ts']) for s in new]
+            cur.executemany(
+                "INSERT INTO sleep_sessions (user_id, client_uuid, start_ts, end_ts) "
+                "VALUES (%s,%s,%s,%s)",
+                [(user_id, s['client_uuid'], start_ts, end_ts)
+                 for s, (start_ts, end_ts, _, _) in zip(new, intervals)]
+            )
+            _apply_rollups(cur, [(user_id, sleep_date, hours) for _, _, sleep_date, hours in intervals])
+        
+        cur.execute(
+            f"SELECT client_uuid, session_id FROM sleep_sessions WHERE client_uuid IN ({placeholders})",
+            uuids
+        )
+        session_ids = dict(cur.fetchall())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return session_ids
+
+
+# Incremental pulls go by created_at, which the server assigns. Ids can't
+# be a watermark: AUTO_INCREMENT hands them out at insert, not commit, so
+# a lower id can become visible after a higher one was pulled. Each pull
+# re-reads PULL_OVERLAP before the newest created_at it saw, so rows from
+# transactions still open back then are picked up (merging is idempotent).
+PULL_OVERLAP = timedelta(minutes=5)
+
+
+def get_sessions_created_after(user_id, after=None, limit=200):
+    """
+    Sessions in the order the server stored them, for incremental pulls.
+    after is a (created_at, session_id) cursor - the last row of the
+    previous page, or (watermark - PULL_OVERLAP, 0) to resume.
+    """
+    db = get_connection()
+    cur = db.cursor(dictionary=True)
+    if after is None:
         cur.execute("""
-            UPDATE user_settings 
-            SET bedtime_enabled=%s, bedtime_hour=%s, bedtime_minute=%s, bedtime_ampm=%s,
-                alarm_enabled=%s, alarm_hour=%s, alarm_minute=%s, alarm_ampm=%s,
-                updated_at=NOW()
+            SELECT session_id, client_uuid, start_ts, end_ts, created_at
+            FROM sleep_sessions
             WHERE user_id=%s
-        """, (bedtime_enabled, bedtime_hour, bedtime_minute, bedtime_ampm,
-              alarm_enabled, alarm_hour, alarm_minute, alarm_ampm, user_id))
+            ORDER BY created_at, session_id
+            LIMIT %s
+        """, (user_id, limit))
     else:
-        # Insert new settings
+        after_created, after_id = after
         cur.execute("""
-            INSERT INTO user_settings 
-            (user_id, bedtime_enabled, bedtime_hour, bedtime_minute, bedtime_ampm,
-             alarm_enabled, alarm_hour, alarm_minute, alarm_ampm)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        """, (user_id, bedtime_enabled, bedtime_hour, bedtime_minute, bedtime_ampm,
-              alarm_enabled, alarm_hour, alarm_minute, alarm_ampm))
+            SELECT session_id, client_uuid, start_ts, end_ts, created_at
+            FROM sleep_sessions
+            WHERE user_id=%s
+              AND (created_at > %s OR (created_at = %s AND session_id > %s))
+            ORDER BY created_at, session_id
+            LIMIT %s
+        """, (user_id, after_created, after_created, after_id, limit))
+    sessions = cur.fetchall()
+    db.close()
+    return sessions
+
+
+# ---------- USER SETTINGS ----------
+# revision goes up by one on every save. Devices compare it, never
+# updated_at, to tell whether the settings changed since they last synced,
+# so their clocks don't matter.
+def save_user_settings(user_id, bedtime_enabled, bedtime_hour, bedtime_minute, bedtime_ampm,
+                      alarm_enabled, alarm_hour, alarm_minute, alarm_ampm):
+    """Save or update user's bedtime and alarm settings in one round trip"""
+    backend = get_backend()
+    new = backend.excluded
+    db = get_connection()
+    cur = db.cursor()
+    
+    # user_id is UNIQUE, so an existing row is updated in place
+    cur.execute(f"""
+        INSERT INTO user_settings 
+        (user_id, bedtime_enabled, bedtime_hour, bedtime_minute, bedtime_ampm,
+         alarm_enabled, alarm_hour, alarm_minute, alarm_ampm, revision)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,1)
+        {backend.upsert('user_id')}
+            bedtime_enabled={new('bedtime_enabled')}, bedtime_hour={new('bedtime_hour')},
+            bedtime_minute={new('bedtime_minute')}, bedtime_ampm={new('bedtime_ampm')},
+            alarm_enabled={new('alarm_enabled')}, alarm_hour={new('alarm_hour')},
+            alarm_minute={new('alarm_minute')}, alarm_ampm={new('alarm_ampm')},
+            revision=revision + 1, updated_at=NOW()
+    """, (user_id, bedtime_enabled, bedtime_hour, bedtime_minute, bedtime_ampm,
+          alarm_enabled, alarm_hour, alarm_minute, alarm_ampm))
     
     db.commit()
     db.close()
@@ -182,7 +772,11 @@ def get_user_settings(user_id):
     """Retrieve user's bedtime and alarm settings"""
     db = get_connection()
     cur = db.cursor(dictionary=True)
-    cur.execute("SELECT * FROM user_settings WHERE user_id=%s", (user_id,))
+    cur.execute("""
+        SELECT bedtime_enabled, bedtime_hour, bedtime_minute, bedtime_ampm,
+               alarm_enabled, alarm_hour, alarm_minute, alarm_ampm, revision, updated_at
+        FROM user_settings WHERE user_id=%s
+    """, (user_id,))
     settings = cur.fetchone()
     db.close()
     return settings
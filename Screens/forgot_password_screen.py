@@ -13,12 +13,50 @@ from kivy.clock import Clock
 import NyxDB as db
 import random
 import string
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import re
 
 from celestial_overlay import add_celestial_background
+from db_worker import dispatcher
+from mail_queue import mail_queue
+from rate_limiter import RateLimited, rate_limiter
+
+
+def prepare_reset_code(email, code):
+    """Store a fresh reset code - returns False if no account uses this email"""
+    rate_limiter.check('reset_send', email)
+    if not db.get_user_by_email(email):
+        return False
+    db.save_reset_code(email, code)
+    return True
+
+
+def check_reset_code(email, code):
+    """True if code is the email's current reset code (and marks it used)"""
+    rate_limiter.check('reset_verify', email)
+    return db.verify_reset_code(email, code)
+
+
+def reset_account_password(email, password):
+    """Set the new password and clear the user's outstanding reset codes"""
+    user = db.get_user_by_email(email)
+    db.update_user_password(user['user_id'], password)
+    db.delete_reset_code(email)
+
+
+def reset_code_email(code):
+    """Subject and body of the password reset email"""
+    body = f"""
+        Hello,
+        
+        Your password reset verification code is: {code}
+        
+        This code will expire in 15 minutes.
+        
+        If you didn't request this, please ignore this email.
+        
+        - Nyx Sleep Tracker Team
+        """
+    return "Nyx Sleep Tracker - Password Reset Code", body
 
 
 class ForgotPasswordScreen(Screen):
@@ -29,6 +67,7 @@ class ForgotPasswordScreen(Screen):
 
         self.verification_code = None
         self.user_email = None
+        self.mail_job = None
         self.step = 1  # 1: Enter email, 2: Enter code, 3: Reset password
         
         self.layout = BoxLayout(
@@ -286,43 +325,6 @@ class ForgotPasswordScreen(Screen):
         """Generate a 6-digit verification code"""
         return ''.join(random.choices(string.digits, k=6))
     
-    def send_email(self, to_email, code):
-        """Send verification code via email"""
-        # IMPORTANT: Configure these with your email settings
-        sender_email = "djcaguioa22@gmail.com"  # Replace with your email
-        sender_password = "tbmi bdzt auar vnkv"   # Replace with your app password
-        
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = to_email
-        msg['Subject'] = "Nyx Sleep Tracker - Password Reset Code"
-        
-        body = f"""
-        Hello,
-        
-        Your password reset verification code is: {code}
-        
-        This code will expire in 15 minutes.
-        
-        If you didn't request this, please ignore this email.
-        
-        - Nyx Sleep Tracker Team
-        """
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        try:
-            # For Gmail, use app password: https://support.google.com/accounts/answer/185833
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
-            server.quit()
-            return True
-        except Exception as e:
-            print(f"Email error: {e}")
-            return False
-    
     def send_verification_code(self, instance, resend=False):
         email = self.email_input.text.strip() if not resend else self.user_email
         
@@ -336,36 +338,44 @@ class ForgotPasswordScreen(Screen):
             self.message.text = "Invalid email format"
             return
         
-        # Check if email exists
-        user = db.get_user_by_email(email)
-        if not user:
+        # Check the email and save a new code in the background
+        code = self.generate_code()
+        self.message.text = "Sending code..."
+        self.message.color = (0.8, 0.8, 0.3, 1)
+        dispatcher.submit(
+            prepare_reset_code, email, code,
+            owner=self,
+            write=True,
+            on_success=lambda found: self.on_code_saved(found, email, code),
+            on_error=self.on_db_error
+        )
+    
+    def on_code_saved(self, found, email, code):
+        if not found:
             self.message.text = "Email not found"
+            self.message.color = (1, 0.3, 0.3, 1)
             return
         
-        # Generate and save code
-        self.verification_code = self.generate_code()
+        self.verification_code = code
         self.user_email = email
-        db.save_reset_code(email, self.verification_code)
-        
-        # Send email
-        self.message.text = "Sending code..."
-        self.message.color = (0.8, 0.8, 0.3, 1)
-        
-        # Simulate email sending (replace with actual email sending)
-        print(f"Verification code for {email}: {self.verification_code}")
         
-        # For testing without email: just show success
-        # In production, uncomment the email sending code above
-        self.message.text = f"Code sent! (Test code: {self.verification_code})"
-        self.message.color = (0.3, 1, 0.3, 1)
-        Clock.schedule_once(lambda dt: self.show_code_step(), 2)
+        # Delivered in the background; on_mail_status follows its progress
+        subject, body = reset_code_email(code)
+        self.mail_job = mail_queue.send(email, subject, body, on_status=self.on_mail_status)
+    
+    def on_mail_status(self, job, status):
+        if job is not self.mail_job:
+            return  # superseded by a resend
         
-        # To actually send email, uncomment:
-        if self.send_email(email, self.verification_code):
+        if status == 'sent':
             self.message.text = "Code sent to your email!"
             self.message.color = (0.3, 1, 0.3, 1)
-            Clock.schedule_once(lambda dt: self.show_code_step(), 2)
-        else:
+            if self.step == 1:
+                Clock.schedule_once(lambda dt: self.show_code_step(), 2)
+        elif status == 'retrying':
+            self.message.text = f"Mail server busy, retrying in {job.retry_in:g}s..."
+            self.message.color = (0.8, 0.8, 0.3, 1)
+        elif status == 'failed':
             self.message.text = "Failed to send email. Try again."
             self.message.color = (1, 0.3, 0.3, 1)
     
@@ -376,7 +386,16 @@ class ForgotPasswordScreen(Screen):
             self.message.text = "Please enter the verification code"
             return
         
-        if db.verify_reset_code(self.user_email, code):
+        dispatcher.submit(
+            check_reset_code, self.user_email, code,
+            owner=self,
+            write=True,
+            on_success=self.on_code_verified,
+            on_error=self.on_db_error
+        )
+    
+    def on_code_verified(self, valid):
+        if valid:
             self.message.text = "Code verified!"
             self.message.color = (0.3, 1, 0.3, 1)
             Clock.schedule_once(lambda dt: self.show_reset_step(), 1)
@@ -384,6 +403,16 @@ class ForgotPasswordScreen(Screen):
             self.message.text = "Invalid or expired code"
             self.message.color = (1, 0.3, 0.3, 1)
     
+    def on_db_error(self, error):
+        if isinstance(error, RateLimited):
+            self.message.text = f"Too many attempts. Try again in {error.retry_after:.0f}s"
+        else:
+            self.message.text = f"Error: {str(error)}"
+        self.message.color = (1, 0.3, 0.3, 1)
+    
+    def on_db_busy(self, busy):
+        self.layout.disabled = busy
+    
     def validate_password(self, password):
         """Validate password requirements"""
         if len(password) < 8:
@@ -422,17 +451,18 @@ class ForgotPasswordScreen(Screen):
             self.message.text = "Passwords do not match"
             return
         
-        try:
-            user = db.get_user_by_email(self.user_email)
-            db.update_user_password(user['user_id'], password)
-            db.delete_reset_code(self.user_email)
-            
-            self.message.text = "Password reset successful!"
-            self.message.color = (0.3, 1, 0.3, 1)
-            Clock.schedule_once(lambda dt: self.go_back(None), 2)
-        except Exception as e:
-            self.message.text = f"Error: {str(e)}"
-            self.message.color = (1, 0.3, 0.3, 1)
+        dispatcher.submit(
+            reset_account_password, self.user_email, password,
+            owner=self,
+            write=True,
+            on_success=self.on_password_reset,
+            on_error=self.on_db_error
+        )
+    
+    def on_password_reset(self, result):
+        self.message.text = "Password reset successful!"
+        self.message.color = (0.3, 1, 0.3, 1)
+        Clock.schedule_once(lambda dt: self.go_back(None), 2)
     
     def go_back(self, instance):
         self.show_email_step()
@@ -1,6 +1,7 @@
 """
 Graph Screen for Nyx Sleep Tracker
-Uses Matplotlib with Kivy Garden for visualization
+Charts are drawn with Matplotlib's Agg backend on a worker thread and shown as cached textures.
+Matplotlib and NumPy are imported on the first render, not at app startup
 """
 
 import random
@@ -8,25 +9,144 @@ from kivy.uix.screenmanager import Screen
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
+from kivy.uix.image import Image
 from kivy.uix.scrollview import ScrollView
 from kivy.graphics import Color, Rectangle
-from datetime import datetime
-from collections import defaultdict
-import matplotlib
+from kivy.graphics.texture import Texture
 
 from celestial_overlay import add_celestial_background
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.patches import Rectangle as MPLRectangle
-import numpy as np
-from kivy_garden.matplotlib import FigureCanvasKivyAgg
-import NyxDB as db
+from db_worker import dispatcher
+from session_repository import session_repository
+import local_store
+
+# user_id -> (sessions fingerprint, [(title, Texture), ...]) for the
+# signed-in user only - textures are big, so no one else's are kept
+_chart_cache = {}
+
+
+def draw_day_of_week_chart(ax, day_means):
+    # Average by day of week, see sleep_analytics.rollup_day_of_week_means
+    from matplotlib.patches import Patch
+    days, averages = day_means
+    
+    if days:
+        colors = ['#6650CC' if day in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri'] 
+                 else '#FF6B9D' for day in days]
+        
+        bars = ax.bar(days, averages, color=colors, edgecolor='#8B7BE8', linewidth=1.5)
+        
+        # Add value labels on bars
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height,
+                   f'{height:.1f}h',
+                   ha='center', va='bottom', color='#E0E0E0', fontsize=9)
+        
+        ax.set_ylabel('Average Hours', color='#E0E0E0', fontsize=11)
+        ax.set_xlabel('Day of Week', color='#E0E0E0', fontsize=11)
+        ax.tick_params(colors='#E0E0E0', labelsize=9)
+        ax.grid(True, alpha=0.2, axis='y', color='#404060')
+        
+        # Add legend
+        legend_elements = [
+            Patch(facecolor='#6650CC', label='Weekday'),
+            Patch(facecolor='#FF6B9D', label='Weekend')
+        ]
+        ax.legend(handles=legend_elements, facecolor='#1E1E2D', 
+                 edgecolor='#404060', labelcolor='#E0E0E0', fontsize=9)
+
+
+def draw_weekday_weekend_chart(ax, weekly_means):
+    # Weekday/weekend averages per week, see sleep_analytics.rollup_weekly_means
+    import numpy as np
+    weeks, weekday_avgs, weekend_avgs = weekly_means
+    week_labels = [f'W{i+1}' for i in range(len(weeks))]
+    
+    if week_labels:
+        x = np.arange(len(week_labels))
+        width = 0.35
+        
+        bars1 = ax.bar(x - width/2, weekday_avgs, width, label='Weekday',
+                      color='#6650CC', edgecolor='#8B7BE8', linewidth=1.5)
+        bars2 = ax.bar(x + width/2, weekend_avgs, width, label='Weekend',
+                      color='#FF6B9D', edgecolor='#FF8FB5', linewidth=1.5)
+        
+        # Add value labels
+        for bars in [bars1, bars2]:
+            for bar in bars:
+                height = bar.get_height()
+                if height > 0:
+                    ax.text(bar.get_x() + bar.get_width()/2., height,
+                           f'{height:.1f}',
+                           ha='center', va='bottom', color='#E0E0E0', fontsize=8)
+        
+        ax.set_ylabel('Average Hours', color='#E0E0E0', fontsize=11)
+        ax.set_xlabel('Week', color='#E0E0E0', fontsize=11)
+        ax.set_xticks(x)
+        ax.set_xticklabels(week_labels)
+        ax.tick_params(colors='#E0E0E0', labelsize=9)
+        ax.legend(facecolor='#1E1E2D', edgecolor='#404060', 
+                 labelcolor='#E0E0E0', fontsize=9)
+        ax.grid(True, alpha=0.2, axis='y', color='#404060')
+
+
+def render_chart(draw, data):
+    """
+    Draw one chart into an off-screen Agg buffer.
+    Uses Figure directly rather than pyplot, so it is safe on a worker
+    thread and nothing is left registered in pyplot's figure manager.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    
+    fig = Figure(figsize=(8, 4), facecolor='#0C0C12')
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_facecolor('#1E1E2D')
+    draw(ax, data)
+    fig.tight_layout()
+    canvas.draw()
+    
+    width, height = canvas.get_width_height()
+    return width, height, bytes(canvas.buffer_rgba())
+
+
+def render_charts(user_id, cached_fingerprint=None, store=local_store):
+    """
+    Background job: re-render the charts only if the user's sessions changed.
+    Returns (fingerprint, images) where images is None when the cached
+    charts are still current, and [] when there is no data yet.
+    store is where the fingerprint and rollups come from - the local store
+    (through the session cache) by default.
+    """
+    if store is local_store:
+        fingerprint = session_repository.get_fingerprint(user_id)
+    else:
+        fingerprint = store.get_sessions_fingerprint(user_id)
+    if fingerprint == cached_fingerprint:
+        return fingerprint, None
+    
+    # Both charts come straight from the rollup buckets, not the raw sessions
+    day_rollups = store.get_rollups(user_id, 'dow')
+    if not day_rollups:
+        return fingerprint, []
+    week_rollups = store.get_rollups(user_id, 'week', limit=8)
+    
+    import sleep_analytics
+    charts = [
+        ("Average Sleep by Day of Week", draw_day_of_week_chart,
+         sleep_analytics.rollup_day_of_week_means(day_rollups)),
+        ("Weekday vs Weekend Sleep Comparison", draw_weekday_weekend_chart,
+         sleep_analytics.rollup_weekly_means(week_rollups)),
+    ]
+    return fingerprint, [(title, render_chart(draw, data)) for title, draw, data in charts]
+
 
 class GraphScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.user = None
+        self.shown_charts = None
 
         add_celestial_background(self, star_count=15, cloud_count=2)
         
@@ -81,173 +201,120 @@ class GraphScreen(Screen):
 
     def set_user(self, user):
         self.user = user
+        self.shown_charts = None
         self.load_graphs()
 
     def load_graphs(self):
         if not self.user:
             return
         
-        self.graph_container.clear_widgets()
+        user_id = self.user['user_id']
+        cached = _chart_cache.get(user_id)
         
-        sessions = db.get_all_sessions(self.user['user_id'])
+        # Show what we already have straight away, then check it is still current
+        if cached and self.shown_charts is not cached:
+            self.show_charts(cached)
         
-        if not sessions:
-            self.graph_container.add_widget(Label(
-                text="No sleep data available yet.\nStart tracking to see graphs!",
-                font_size=18,
-                color=(0.7, 0.7, 0.8, 1),
-                size_hint_y=None,
-                height=200
-            ))
+        dispatcher.cancel(self)
+        if cached and cached[0] == session_repository.peek(user_id, 'fingerprint'):
             return
         
-        # Only create 2 graphs now
-        self.graph_container.add_widget(self.create_day_of_week_chart(sessions))
-        self.graph_container.add_widget(self.create_weekday_weekend_chart(sessions))
+        dispatcher.submit(
+            render_charts, user_id, cached[0] if cached else None,
+            owner=self,
+            on_success=lambda result, uid=user_id: self.on_charts_rendered(uid, result),
+            on_error=self.on_load_error
+        )
 
-    def create_day_of_week_chart(self, sessions):
-        container = BoxLayout(orientation='vertical', size_hint_y=None, height=350, spacing=10)
-        
-        container.add_widget(Label(
-            text="Average Sleep by Day of Week",
-            font_size=20,
-            color=(0.8, 0.8, 1, 1),
-            size_hint_y=None,
-            height=30
-        ))
+    def on_charts_rendered(self, user_id, result):
+        fingerprint, images = result
         
-        fig, ax = plt.subplots(figsize=(8, 4), facecolor='#0C0C12')
-        ax.set_facecolor('#1E1E2D')
+        if images is None:
+            cached = _chart_cache[user_id]
+        else:
+            # Textures must be created on the main thread
+            textures = []
+            for title, (width, height, pixels) in images:
+                texture = Texture.create(size=(width, height), colorfmt='rgba')
+                texture.blit_buffer(pixels, colorfmt='rgba', bufferfmt='ubyte')
+                texture.flip_vertical()
+                textures.append((title, texture))
+            cached = (fingerprint, textures)
+            if not (self.user and self.user['user_id'] == user_id):
+                return  # signed out meanwhile
+            _chart_cache.clear()
+            _chart_cache[user_id] = cached
         
-        # Calculate average by day of week
-        day_data = defaultdict(list)
-        for session in sessions:
-            date = datetime(session['year'], session['month'], session['day'])
-            day_name = date.strftime('%a')
-            day_data[day_name].append(session['hours'])
-        
-        # Order by weekday
-        days_order = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-        days = []
-        averages = []
-        
-        for day in days_order:
-            if day in day_data:
-                days.append(day)
-                averages.append(np.mean(day_data[day]))
-        
-        if days:
-            colors = ['#6650CC' if day in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri'] 
-                     else '#FF6B9D' for day in days]
-            
-            bars = ax.bar(days, averages, color=colors, edgecolor='#8B7BE8', linewidth=1.5)
-            
-            # Add value labels on bars
-            for bar in bars:
-                height = bar.get_height()
-                ax.text(bar.get_x() + bar.get_width()/2., height,
-                       f'{height:.1f}h',
-                       ha='center', va='bottom', color='#E0E0E0', fontsize=9)
-            
-            ax.set_ylabel('Average Hours', color='#E0E0E0', fontsize=11)
-            ax.set_xlabel('Day of Week', color='#E0E0E0', fontsize=11)
-            ax.tick_params(colors='#E0E0E0', labelsize=9)
-            ax.grid(True, alpha=0.2, axis='y', color='#404060')
-            
-            # Add legend
-            from matplotlib.patches import Patch
-            legend_elements = [
-                Patch(facecolor='#6650CC', label='Weekday'),
-                Patch(facecolor='#FF6B9D', label='Weekend')
-            ]
-            ax.legend(handles=legend_elements, facecolor='#1E1E2D', 
-                     edgecolor='#404060', labelcolor='#E0E0E0', fontsize=9)
+        if self.user and self.user['user_id'] == user_id:
+            self.show_charts(cached)
+
+    def show_charts(self, cached):
+        self.graph_container.clear_widgets()
+        self.shown_charts = cached
         
-        plt.tight_layout()
-        canvas = FigureCanvasKivyAgg(fig)
-        container.add_widget(canvas)
+        textures = cached[1]
+        if not textures:
+            self.show_message("No sleep data available yet.\nStart tracking to see graphs!")
+            return
         
-        return container
+        for title, texture in textures:
+            self.graph_container.add_widget(self.create_chart_container(title, texture))
 
-    def create_weekday_weekend_chart(self, sessions):
+    def create_chart_container(self, title, texture):
         container = BoxLayout(orientation='vertical', size_hint_y=None, height=350, spacing=10)
         
         container.add_widget(Label(
-            text="Weekday vs Weekend Sleep Comparison",
+            text=title,
             font_size=20,
             color=(0.8, 0.8, 1, 1),
             size_hint_y=None,
             height=30
         ))
         
-        fig, ax = plt.subplots(figsize=(8, 4), facecolor='#0C0C12')
-        ax.set_facecolor('#1E1E2D')
-        
-        # Group by week
-        week_data = defaultdict(lambda: {'weekday': [], 'weekend': []})
-        
-        for session in sessions:
-            date = datetime(session['year'], session['month'], session['day'])
-            week_num = date.strftime('%Y-W%U')
-            
-            if date.weekday() < 5:
-                week_data[week_num]['weekday'].append(session['hours'])
-            else:
-                week_data[week_num]['weekend'].append(session['hours'])
-        
-        # Prepare data for last 8 weeks
-        weeks = sorted(week_data.keys())[-8:]
-        weekday_avgs = []
-        weekend_avgs = []
-        week_labels = []
-        
-        for i, week in enumerate(weeks):
-            weekday_hours = week_data[week]['weekday']
-            weekend_hours = week_data[week]['weekend']
-            
-            weekday_avgs.append(np.mean(weekday_hours) if weekday_hours else 0)
-            weekend_avgs.append(np.mean(weekend_hours) if weekend_hours else 0)
-            week_labels.append(f'W{i+1}')
-        
-        if week_labels:
-            x = np.arange(len(week_labels))
-            width = 0.35
-            
-            bars1 = ax.bar(x - width/2, weekday_avgs, width, label='Weekday',
-                          color='#6650CC', edgecolor='#8B7BE8', linewidth=1.5)
-            bars2 = ax.bar(x + width/2, weekend_avgs, width, label='Weekend',
-                          color='#FF6B9D', edgecolor='#FF8FB5', linewidth=1.5)
-            
-            # Add value labels
-            for bars in [bars1, bars2]:
-                for bar in bars:
-                    height = bar.get_height()
-                    if height > 0:
-                        ax.text(bar.get_x() + bar.get_width()/2., height,
-                               f'{height:.1f}',
-                               ha='center', va='bottom', color='#E0E0E0', fontsize=8)
-            
-            ax.set_ylabel('Average Hours', color='#E0E0E0', fontsize=11)
-            ax.set_xlabel('Week', color='#E0E0E0', fontsize=11)
-            ax.set_xticks(x)
-            ax.set_xticklabels(week_labels)
-            ax.tick_params(colors='#E0E0E0', labelsize=9)
-            ax.legend(facecolor='#1E1E2D', edgecolor='#404060', 
-                     labelcolor='#E0E0E0', fontsize=9)
-            ax.grid(True, alpha=0.2, axis='y', color='#404060')
-        
-        plt.tight_layout()
-        canvas = FigureCanvasKivyAgg(fig)
-        container.add_widget(canvas)
+        container.add_widget(Image(
+            texture=texture,
+            allow_stretch=True,
+            keep_ratio=True
+        ))
         
         return container
 
+    def show_message(self, text):
+        self.graph_container.clear_widgets()
+        self.graph_container.add_widget(Label(
+            text=text,
+            font_size=18,
+            color=(0.7, 0.7, 0.8, 1),
+            size_hint_y=None,
+            height=200
+        ))
+
+    def on_load_error(self, error):
+        print(f"Error loading graphs: {error}")
+        self.shown_charts = None
+        self.show_message("Could not load sleep data.\nCheck your connection.")
+
+    def on_db_busy(self, busy):
+        if busy and self.shown_charts is None:
+            self.show_message("Loading charts...")
+
+    def clear_user(self):
+        """On logout: forget the user and free their chart textures"""
+        dispatcher.cancel(self)
+        _chart_cache.clear()
+        self.user = None
+        self.shown_charts = None
+        self.graph_container.clear_widgets()
+
     def go_back(self, instance):
         self.manager.current = 'stats'
 
     def on_pre_enter(self):
         if self.user:
             self.load_graphs()
+
+    def on_leave(self):
+        dispatcher.cancel(self)
     # Add this function to your components.py
     def create_celestial_overlay():
         """Create a simple celestial overlay widget"""
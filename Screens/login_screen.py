@@ -11,7 +11,34 @@ from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.image import Image
 import NyxDB as db
-from components import add_celestial_background
+from celestial_overlay import add_celestial_background
+from db_worker import dispatcher
+from password_hasher import HasherBusy
+from rate_limiter import RateLimited, rate_limiter
+from sync_engine import sync_engine
+import local_store
+
+
+def authenticate(username, password):
+    """
+    Check credentials against MySQL and remember them for offline use.
+    If the server cannot be reached, fall back to the local store.
+    Raises RateLimited, before touching either, after too many attempts,
+    and HasherBusy if too many logins are already being checked.
+    """
+    rate_limiter.check('login', username)
+    try:
+        user = db.validate_user(username, password)
+    except db.DATABASE_ERRORS as e:
+        print(f"⚠️ Server unreachable, trying offline login: {e}")
+        user = local_store.verify_user(username, password)
+    else:
+        if user:
+            local_store.remember_user(user, password)
+    
+    if user:
+        rate_limiter.reset('login', username)
+    return user
 
 class LoginScreen(Screen):
     def __init__(self, **kwargs):
@@ -99,15 +126,15 @@ class LoginScreen(Screen):
         layout.add_widget(forgot_container)
         
         # Login button
-        login_btn = Button(
+        self.login_btn = Button(
             text="Login",
             font_size=22,
             size_hint_y=None,
             height=55,
             background_color=(0.4, 0.3, 0.8, 1)
         )
-        login_btn.bind(on_press=self.check_login)
-        layout.add_widget(login_btn)
+        self.login_btn.bind(on_press=self.check_login)
+        layout.add_widget(self.login_btn)
         
         # Separator with "Or" and images
         separator_box = BoxLayout(
@@ -187,14 +214,19 @@ class LoginScreen(Screen):
             self.message.text = "Please enter username and password"
             return
         
-        user = db.validate_user(username, password)
-        
+        dispatcher.submit(
+            authenticate, username, password,
+            owner=self,
+            on_success=self.on_login_result,
+            on_error=self.on_login_error
+        )
+    
+    def on_login_result(self, user):
         if user:
             self.message.text = "Login successful!"
             tracker = self.manager.get_screen("tracker")
             tracker.set_user(user)
-            stats = self.manager.get_screen("stats")
-            stats.set_user(user)
+            sync_engine.start(user['user_id'])
             self.manager.current = "tracker"
             self.username.text = ""
             self.password.text = ""
@@ -203,6 +235,23 @@ class LoginScreen(Screen):
         else:
             self.message.text = "Invalid username or password"
     
+    def on_login_error(self, error):
+        if isinstance(error, RateLimited):
+            self.message.text = f"Too many attempts. Try again in {error.retry_after:.0f}s"
+            return
+        if isinstance(error, HasherBusy):
+            self.message.text = "Server is busy. Try again in a moment."
+            return
+        print(f"Login error: {error}")
+        self.message.text = "Cannot reach the database. Try again."
+    
+    def on_db_busy(self, busy):
+        self.login_btn.disabled = busy
+        self.login_btn.text = "Logging in..." if busy else "Login"
+    
+    def on_leave(self):
+        dispatcher.cancel(self)
+    
     def go_register(self, instance):
         self.manager.current = "register"
     
@@ -13,9 +13,22 @@ from kivy.uix.image import Image
 from kivy.clock import Clock
 import NyxDB as db
 import re
+from db_worker import dispatcher
 from celestial_overlay import add_celestial_background
 
 
+def create_account(username, password, email):
+    """Check for duplicates and create the user - returns an error message or None"""
+    if db.get_user_by_name(username):
+        return "Username already exists"
+    
+    if db.get_user_by_email(email):
+        return "Email already registered"
+    
+    db.create_user(username, password, email)
+    return None
+
+
 class RegisterScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -128,15 +141,15 @@ class RegisterScreen(Screen):
         self.req_label.bind(size=self.req_label.setter('text_size'))
         layout.add_widget(self.req_label)
         
-        register_btn = Button(
+        self.register_btn = Button(
             text="Create Account",
             font_size=22,
             size_hint_y=None,
             height=55,
             background_color=(0.4, 0.3, 0.8, 1)
         )
-        register_btn.bind(on_press=self.register)
-        layout.add_widget(register_btn)
+        self.register_btn.bind(on_press=self.register)
+        layout.add_widget(self.register_btn)
         
         self.message = Label(
             text="",
@@ -239,25 +252,25 @@ class RegisterScreen(Screen):
             self.message.text = "Passwords do not match"
             return
         
-        # Check if username exists
-        existing_user = db.get_user_by_name(username)
-        if existing_user:
-            self.message.text = "Username already exists"
-            return
-        
-        # Check if email exists
-        existing_email = db.get_user_by_email(email)
-        if existing_email:
-            self.message.text = "Email already registered"
+        dispatcher.submit(
+            create_account, username, password, email,
+            owner=self,
+            write=True,
+            on_success=self.on_register_result,
+            on_error=lambda e: setattr(self.message, 'text', f"Error: {str(e)}")
+        )
+    
+    def on_register_result(self, error):
+        if error:
+            self.message.text = error
             return
         
-        try:
-            db.create_user(username, password, email)
-            self.message.text = "Account created successfully!"
-            self.message.color = (0.3, 1, 0.3, 1)
-            Clock.schedule_once(lambda dt: self.go_back(None), 1.5)
-        except Exception as e:
-            self.message.text = f"Error: {str(e)}"
+        self.message.text = "Account created successfully!"
+        self.message.color = (0.3, 1, 0.3, 1)
+        Clock.schedule_once(lambda dt: self.go_back(None), 1.5)
+    
+    def on_db_busy(self, busy):
+        self.register_btn.disabled = busy
     
     def go_back(self, instance):
         self.reg_user.text = ""
@@ -7,19 +7,25 @@ from kivy.uix.screenmanager import Screen
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
-from kivy.uix.scrollview import ScrollView
-from kivy.uix.gridlayout import GridLayout
 from kivy.graphics import Color, RoundedRectangle, Rectangle
-from datetime import datetime
 from celestial_overlay import add_celestial_background
 from components import create_stat_card
-import NyxDB as db
+from db_worker import dispatcher
+from session_history import SessionHistory
+from session_repository import session_repository
+from sync_engine import sync_engine
+
+
+def fetch_stats(user_id):
+    """Summary figures for the stats screen, from the session cache or the database"""
+    return session_repository.get_stats(user_id)
 
 
 class StatsScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.user = None
+        sync_engine.bind(on_pulled=self.on_sync_pulled)
 
         add_celestial_background(self, star_count=15, cloud_count=2)
         
@@ -76,26 +82,19 @@ class StatsScreen(Screen):
         graph_btn.bind(on_press=self.open_graphs)
         content.add_widget(graph_btn)
 
-        # Sleep sessions list
-        sessions_label = Label(
-            text="Recent Sleep Sessions",
+        # Full sleep history, paged in as it scrolls
+        self.sessions_label = Label(
+            text="Sleep History",
             font_size=20,
             color=(0.8, 0.8, 1, 1),
             size_hint=(1, None),
             height=40
         )
-        content.add_widget(sessions_label)
-
-        scroll = ScrollView(size_hint=(1, 0.45))
-        self.sessions_list = GridLayout(
-            cols=1,
-            spacing=10,
-            size_hint_y=None,
-            padding=[0, 10]
-        )
-        self.sessions_list.bind(minimum_height=self.sessions_list.setter('height'))
-        scroll.add_widget(self.sessions_list)
-        content.add_widget(scroll)
+        content.add_widget(self.sessions_label)
+
+        self.history = SessionHistory(size_hint=(1, 0.45))
+        self.history.bind(loading=lambda *args: self.update_sessions_label())
+        content.add_widget(self.history)
 
         # Bottom navigation
         root.add_widget(self._create_nav_bar())
@@ -140,71 +139,62 @@ class StatsScreen(Screen):
         self.nav_rect.pos = nav_bar.pos
         self.nav_rect.size = nav_bar.size
 
-    def set_user(self, user):
-        self.user = user
-        self.load_stats()
-
     def load_stats(self):
         if not self.user:
             return
         
-        sessions = db.get_all_sessions(self.user['user_id'])
-        
-        if sessions:
-            total_hours = sum(s['hours'] for s in sessions)
-            avg_hours = total_hours / len(sessions)
-            
-            now = datetime.now()
-            monthly_sessions = [s for s in sessions 
-                              if s['year'] == now.year and s['month'] == now.month]
-            monthly_hours = sum(s['hours'] for s in monthly_sessions)
-            
-            self.avg_card.value_label.text = f"{avg_hours:.1f} hrs"
-            self.total_card.value_label.text = str(len(sessions))
-            self.monthly_card.value_label.text = f"{monthly_hours:.1f} hrs"
-            
-            self.sessions_list.clear_widgets()
-            for session in sessions[:10]:
-                session_box = self._create_session_item(session)
-                self.sessions_list.add_widget(session_box)
-
-    def _create_session_item(self, session):
-        session_box = BoxLayout(
-            orientation='horizontal',
-            size_hint_y=None,
-            height=60,
-            padding=15,
-            spacing=10
-        )
+        dispatcher.cancel(self)
+        user_id = self.user['user_id']
+        if session_repository.is_cached(user_id, 'stats'):
+            # Nothing changed since the history was loaded either, but
+            # on_leave may have cancelled a page before it arrived
+            if self.history.user_id != user_id:
+                self.history.show_user(user_id)
+            else:
+                self.history.resume()
+            self.show_stats(session_repository.peek(user_id, 'stats'))
+            return
         
-        with session_box.canvas.before:
-            Color(0.12, 0.12, 0.18, 1)
-            session_box.rect = RoundedRectangle(radius=[10])
-        session_box.bind(
-            pos=lambda inst, val, sb=session_box: setattr(sb.rect, 'pos', sb.pos),
-            size=lambda inst, val, sb=session_box: setattr(sb.rect, 'size', sb.size)
+        self.history.show_user(user_id)
+        dispatcher.submit(
+            fetch_stats, user_id,
+            owner=self,
+            on_success=self.show_stats,
+            on_error=lambda e: print(f"Error loading stats: {e}")
         )
+
+    def show_stats(self, stats):
+        if not stats:
+            return
         
-        date_str = f"{session['year']}-{str(session['month']).zfill(2)}-{str(session['day']).zfill(2)}"
-        
-        session_box.add_widget(Label(
-            text=date_str,
-            font_size=16,
-            color=(0.8, 0.8, 0.9, 1)
-        ))
-        
-        session_box.add_widget(Label(
-            text=f"{session['hours']:.1f} hrs",
-            font_size=18,
-            color=(0.6, 0.8, 0.6, 1),
-            size_hint_x=0.4
-        ))
-        
-        return session_box
+        summary = stats['summary']
+        self.avg_card.value_label.text = f"{summary['avg_hours']:.1f} hrs"
+        self.total_card.value_label.text = str(summary['session_count'])
+        monthly_text = f"{stats['monthly']['total_hours']:.1f} hrs"
+        if stats['month_change'] is not None:
+            monthly_text += f" ({stats['month_change']:+.1f} avg vs last month)"
+        self.monthly_card.value_label.text = monthly_text
+
+    def on_db_busy(self, busy):
+        self.update_sessions_label()
+
+    def update_sessions_label(self):
+        busy = dispatcher.is_busy(self) or self.history.loading
+        self.sessions_label.text = "Loading..." if busy else "Sleep History"
 
     def on_pre_enter(self):
+        # The signed-in user is the tracker's - login leaves this screen unbuilt
+        self.user = self.manager.get_screen('tracker').user
         self.load_stats()
 
+    def on_sync_pulled(self, engine, user_id, result):
+        if self.user and self.user['user_id'] == user_id and result['pulled']:
+            self.load_stats()
+
+    def on_leave(self):
+        dispatcher.cancel(self)
+        self.history.cancel()
+
     def open_graphs(self, instance):
         graph_screen = self.manager.get_screen('graphs')
         graph_screen.set_user(self.user)
@@ -19,10 +19,16 @@ from kivy.uix.floatlayout import FloatLayout
 from kivy.graphics import Color, RoundedRectangle, Rectangle
 from kivy.clock import Clock
 from kivy.core.audio import SoundLoader
-from datetime import datetime, time
+from kivy.core.window import Window
+from datetime import datetime
 from celestial_overlay import CelestialOverlay
 from components import DarkCard
-import NyxDB as db
+from db_worker import dispatcher
+from alarm_scheduler import scheduler, parse_time
+from settings_store import settings_store
+from session_repository import session_repository
+from sync_engine import sync_engine
+import local_store
 import os
 import sys
 from celestial_overlay import add_celestial_background
@@ -155,8 +161,8 @@ class TrackerScreen(Screen):
         self.bedtime_enabled = False
         self.alarm_enabled = False
         self.alarm_overlay = None
-        self.last_alarm_trigger = None  # Prevent repeated triggers
-        self.check_event = None  # Store the Clock event
+        # Re-arm once per frame however many inputs changed
+        self._trigger_schedule = Clock.create_trigger(self.schedule_alarms)
 
         root = BoxLayout(orientation='vertical', padding=0, spacing=0)
         self.root_layout = root
@@ -202,6 +208,18 @@ class TrackerScreen(Screen):
         # Spacer to push username to the right
         top_bar.add_widget(Label(size_hint_x=1))
         
+        # Sync status indicator
+        self.sync_label = Label(
+            text="",
+            font_size=14,
+            color=(0.6, 0.6, 0.7, 1),
+            size_hint=(None, 1),
+            width=90
+        )
+        top_bar.add_widget(self.sync_label)
+        sync_engine.bind(status=self.update_sync_status, pending=self.update_sync_status)
+        sync_engine.bind(on_pulled=self.on_sync_pulled)
+        
         # Username on the right
         self.username_label = Label(
             text="Guest",
@@ -385,6 +403,10 @@ class TrackerScreen(Screen):
         alarm_box.add_widget(alarm_inputs)
         time_grid.add_widget(alarm_box)
         
+        for time_input in (self.bedtime_hour, self.bedtime_minute, self.bedtime_ampm,
+                           self.alarm_hour, self.alarm_minute, self.alarm_ampm):
+            time_input.bind(text=self.on_time_input)
+        
         time_card.add_widget(time_grid)
         content.add_widget(time_card)
 
@@ -466,11 +488,7 @@ class TrackerScreen(Screen):
         
         # Save settings when changed
         self.save_user_settings()
-        
-        if value:
-            self.start_notification_checker()
-        else:
-            self.stop_notification_checker()
+        self.schedule_alarms()
         
     def on_alarm_toggle(self, checkbox, value):
         self.alarm_enabled = value
@@ -480,56 +498,32 @@ class TrackerScreen(Screen):
         
         # Save settings when changed
         self.save_user_settings()
+        self.schedule_alarms()
+
+    def on_time_input(self, instance, value):
+        self.save_user_settings()
+        self._trigger_schedule()
+
+    def schedule_alarms(self, *args):
+        """Hand the enabled bedtime and alarm to the app-wide scheduler"""
+        if not self.user:
+            return
         
-        if value:
-            self.start_notification_checker()
-        else:
-            self.stop_notification_checker()
-
-    def start_notification_checker(self):
-        """Start checking for bedtime and alarm notifications using Kivy's Clock"""
-        if self.check_event is None:
-            # Check every 30 seconds
-            self.check_event = Clock.schedule_interval(self.check_notifications, 30)
-            print("✅ Notification checker started")
-
-    def stop_notification_checker(self):
-        """Stop the notification checker if both alarms are disabled"""
-        if not self.bedtime_enabled and not self.alarm_enabled:
-            if self.check_event:
-                Clock.unschedule(self.check_event)
-                self.check_event = None
-                print("⏹️ Notification checker stopped")
-
-    def check_notifications(self, dt):
-        """Check if it's time for bedtime or alarm notifications"""
-        now = datetime.now()
-        current_time = now.time()
-        current_minute = f"{now.hour}:{now.minute}"
-        
-        # Check bedtime
-        if self.bedtime_enabled:
-            bedtime = self.get_time_from_inputs(
-                self.bedtime_hour.text,
-                self.bedtime_minute.text,
-                self.bedtime_ampm.text
-            )
-            if bedtime and self.is_within_minute(current_time, bedtime):
-                if self.last_alarm_trigger != f"bedtime_{current_minute}":
-                    self.last_alarm_trigger = f"bedtime_{current_minute}"
-                    self.send_bedtime_notification()
-        
-        # Check alarm
-        if self.alarm_enabled and not self.alarm_overlay:
-            alarm_time = self.get_time_from_inputs(
-                self.alarm_hour.text,
-                self.alarm_minute.text,
-                self.alarm_ampm.text
-            )
-            if alarm_time and self.is_within_minute(current_time, alarm_time):
-                if self.last_alarm_trigger != f"alarm_{current_minute}":
-                    self.last_alarm_trigger = f"alarm_{current_minute}"
-                    self.show_alarm_overlay()
+        user_id = self.user['user_id']
+        for name, enabled, inputs, callback in (
+            ('bedtime', self.bedtime_enabled,
+             (self.bedtime_hour, self.bedtime_minute, self.bedtime_ampm),
+             lambda alarm: self.send_bedtime_notification()),
+            ('alarm', self.alarm_enabled,
+             (self.alarm_hour, self.alarm_minute, self.alarm_ampm),
+             lambda alarm: self.show_alarm_overlay()),
+        ):
+            at = parse_time(*(widget.text for widget in inputs)) if enabled else None
+            if at:
+                scheduler.set_alarm((user_id, name), at, callback, owner=user_id,
+                                    label=name.capitalize())
+            else:
+                scheduler.remove_alarm((user_id, name))
 
     def send_bedtime_notification(self):
         """Send bedtime notification using Windows toast notifications"""
@@ -552,45 +546,22 @@ class TrackerScreen(Screen):
             print("🌙 Bedtime reminder (notifications not available)")
 
     def show_alarm_overlay(self):
-        """Show the alarm overlay with sound"""
+        """Show the alarm overlay with sound, over whichever screen is showing"""
         if not self.alarm_overlay:
             self.alarm_overlay = AlarmOverlay(callback=self.close_alarm_overlay)
-            self.add_widget(self.alarm_overlay)
+            Window.add_widget(self.alarm_overlay)
             print("⏰ Alarm triggered!")
 
     def close_alarm_overlay(self):
         """Close the alarm overlay"""
         if self.alarm_overlay:
-            self.remove_widget(self.alarm_overlay)
+            Window.remove_widget(self.alarm_overlay)
             self.alarm_overlay = None
             print("⏰ Alarm stopped")
 
     def get_time_from_inputs(self, hour_str, minute_str, ampm):
         """Convert time inputs to a time object"""
-        try:
-            hour = int(hour_str)
-            minute = int(minute_str)
-            
-            # Validate inputs
-            if not (1 <= hour <= 12):
-                return None
-            if not (0 <= minute <= 59):
-                return None
-            
-            # Convert to 24-hour format
-            if ampm == 'PM' and hour != 12:
-                hour += 12
-            elif ampm == 'AM' and hour == 12:
-                hour = 0
-            
-            return time(hour, minute)
-        except:
-            return None
-
-    def is_within_minute(self, current_time, target_time):
-        """Check if current time is within the target minute"""
-        return (current_time.hour == target_time.hour and 
-                current_time.minute == target_time.minute)
+        return parse_time(hour_str, minute_str, ampm)
 
     def update_time(self, dt):
         self.time_label.text = datetime.now().strftime("%I:%M %p")
@@ -621,15 +592,19 @@ class TrackerScreen(Screen):
                 hours = elapsed.total_seconds() / 3600
                 
                 if self.user:
-                    db.add_sleep_session(
+                    self.sleep_label.text = "Saving sleep session..."
+                    dispatcher.submit(
+                        session_repository.add_sleep_session,
                         self.user['user_id'],
-                        self.sleep_start_time.year,
-                        self.sleep_start_time.month,
-                        self.sleep_start_time.day,
-                        round(hours, 2)
+                        self.sleep_start_time,
+                        end_time,
+                        owner=self,
+                        write=True,
+                        on_success=lambda result, h=hours: self.on_session_saved(h),
+                        on_error=self.on_session_save_error
                     )
-                
-                self.sleep_label.text = f"Session complete! You slept for {hours:.1f} hours"
+                else:
+                    self.sleep_label.text = f"Session complete! You slept for {hours:.1f} hours"
             
             self.is_sleeping = False
             self.sleep_start_time = None
@@ -637,13 +612,58 @@ class TrackerScreen(Screen):
             self.start_btn.background_color = (0.4, 0.3, 0.8, 1)
             self.duration_label.text = ""
 
+    def on_session_saved(self, hours):
+        self.sleep_label.text = f"Session complete! You slept for {hours:.1f} hours"
+        sync_engine.request_sync()
+
+    def on_session_save_error(self, error):
+        print(f"Error saving session: {error}")
+        self.sleep_label.text = "Could not save session. Please try again."
+
+    def on_db_busy(self, busy):
+        self.start_btn.disabled = busy
+
+    def update_sync_status(self, *args):
+        status = sync_engine.status
+        if status == 'syncing':
+            self.sync_label.text = "Syncing..."
+            self.sync_label.color = (0.6, 0.6, 0.9, 1)
+        elif status == 'offline':
+            self.sync_label.text = f"Offline ({sync_engine.pending})" if sync_engine.pending else "Offline"
+            self.sync_label.color = (0.9, 0.6, 0.3, 1)
+        elif status == 'pending':
+            self.sync_label.text = f"{sync_engine.pending} pending"
+            self.sync_label.color = (0.9, 0.8, 0.4, 1)
+        elif status == 'synced':
+            self.sync_label.text = "Synced"
+            self.sync_label.color = (0.6, 0.8, 0.6, 1)
+        else:
+            self.sync_label.text = ""
+
+    def on_sync_pulled(self, engine, user_id, result):
+        """Settings changed on another device - show them here too"""
+        if self.user and self.user['user_id'] == user_id and result['settings'] in ('pulled', 'conflict'):
+            self.load_user_settings()
+
     def logout(self, instance):
         """Handle user logout"""
-        # Save settings before logout
+        # Write any pending settings before logout
         self.save_user_settings()
+        if self.user:
+            settings_store.flush(self.user['user_id'])
+        
+        # Disarm this user's bedtime and alarm, drop their cached sessions
+        if self.user:
+            scheduler.clear(owner=self.user['user_id'])
+            session_repository.invalidate(self.user['user_id'])
+        sync_engine.stop()
         
-        # Stop notification checker
-        self.stop_notification_checker()
+        # Drop any settings load still in flight for this user
+        dispatcher.cancel(self)
+        
+        # Free their chart textures (screen_names only lists screens already built)
+        if 'graphs' in self.manager.screen_names:
+            self.manager.get_screen('graphs').clear_user()
         
         self.user = None
         self.username_label.text = "Guest"
@@ -666,50 +686,62 @@ class TrackerScreen(Screen):
         self.manager.current = 'login'
     
     def save_user_settings(self):
-        """Save bedtime and alarm settings to database"""
+        """Queue bedtime and alarm settings; the store batches the database write"""
         if not self.user:
             return
         
-        try:
-            db.save_user_settings(
-                self.user['user_id'],
-                bedtime_enabled=self.bedtime_enabled,
-                bedtime_hour=self.bedtime_hour.text,
-                bedtime_minute=self.bedtime_minute.text,
-                bedtime_ampm=self.bedtime_ampm.text,
-                alarm_enabled=self.alarm_enabled,
-                alarm_hour=self.alarm_hour.text,
-                alarm_minute=self.alarm_minute.text,
-                alarm_ampm=self.alarm_ampm.text
-            )
-        except Exception as e:
-            print(f"Error saving settings: {e}")
+        settings_store.update(
+            self.user['user_id'],
+            bedtime_enabled=bool(self.bedtime_enabled),
+            bedtime_hour=self.bedtime_hour.text,
+            bedtime_minute=self.bedtime_minute.text,
+            bedtime_ampm=self.bedtime_ampm.text,
+            alarm_enabled=bool(self.alarm_enabled),
+            alarm_hour=self.alarm_hour.text,
+            alarm_minute=self.alarm_minute.text,
+            alarm_ampm=self.alarm_ampm.text
+        )
     
     def load_user_settings(self):
-        """Load bedtime and alarm settings from database"""
+        """Load bedtime and alarm settings from the local store"""
         if not self.user:
             return
         
-        try:
-            settings = db.get_user_settings(self.user['user_id'])
-            
-            if settings:
-                # Restore bedtime settings
-                self.bedtime_enabled = settings.get('bedtime_enabled', False)
-                self.bedtime_checkbox.active = self.bedtime_enabled
-                self.bedtime_hour.text = settings.get('bedtime_hour', '10')
-                self.bedtime_minute.text = settings.get('bedtime_minute', '00')
-                self.bedtime_ampm.text = settings.get('bedtime_ampm', 'PM')
-                
-                # Restore alarm settings
-                self.alarm_enabled = settings.get('alarm_enabled', False)
-                self.alarm_checkbox.active = self.alarm_enabled
-                self.alarm_hour.text = settings.get('alarm_hour', '06')
-                self.alarm_minute.text = settings.get('alarm_minute', '30')
-                self.alarm_ampm.text = settings.get('alarm_ampm', 'AM')
-                
-                # Start notification checker if any are enabled
-                if self.bedtime_enabled or self.alarm_enabled:
-                    self.start_notification_checker()
-        except Exception as e:
-            print(f"Error loading settings: {e}")
+        dispatcher.submit(
+            local_store.get_user_settings, self.user['user_id'],
+            owner=self,
+            on_success=self.apply_user_settings,
+            on_error=lambda e: print(f"Error loading settings: {e}")
+        )
+    
+    def apply_user_settings(self, settings):
+        """Restore saved settings once they arrive from the database"""
+        if not self.user or not settings:
+            return
+        
+        # Re-applying what is already stored should not queue a write
+        settings_store.mark_saved(self.user['user_id'], {
+            key: settings.get(key) for key in (
+                'bedtime_hour', 'bedtime_minute', 'bedtime_ampm',
+                'alarm_hour', 'alarm_minute', 'alarm_ampm')
+        } | {
+            'bedtime_enabled': bool(settings.get('bedtime_enabled')),
+            'alarm_enabled': bool(settings.get('alarm_enabled')),
+        })
+        
+        # Restore bedtime settings
+        self.bedtime_enabled = settings.get('bedtime_enabled', False)
+        self.bedtime_checkbox.active = self.bedtime_enabled
+        self.bedtime_hour.text = settings.get('bedtime_hour', '10')
+        self.bedtime_minute.text = settings.get('bedtime_minute', '00')
+        self.bedtime_ampm.text = settings.get('bedtime_ampm', 'PM')
+        
+        # Restore alarm settings
+        self.alarm_enabled = settings.get('alarm_enabled', False)
+        self.alarm_checkbox.active = self.alarm_enabled
+        self.alarm_hour.text = settings.get('alarm_hour', '06')
+        self.alarm_minute.text = settings.get('alarm_minute', '30')
+        self.alarm_ampm.text = settings.get('alarm_ampm', 'AM')
+        
+        # Arm the scheduler for whatever is enabled
+        self.schedule_alarms()
@@ -6,6 +6,7 @@ Create test users with realistic sleep data for Nyx Sleep Tracker
 from datetime import datetime, timedelta
 import random
 import NyxDB as db
+from password_hasher import password_hasher
 import sys
 import time
 
@@ -38,14 +39,10 @@ def create_test_user(username, password, email=None):
         return None
 
 
-def generate_sleep_sessions(user_id, days_back=60, sessions_per_day=1):
-    """Generate realistic sleep sessions for a user"""
-    print(f"\n📊 Generating sleep sessions for user ID: {user_id}")
-    print(f"   Time range: Last {days_back} days")
-    print(f"   Sessions per day: {sessions_per_day}")
-    
-    start_date = datetime.now() - timedelta(days=days_back)
-    total_sessions = 0
+def sleep_session_rows(user_id, days_back=60, end_date=None):
+    """Yield realistic (user_id, start_ts, end_ts) rows for a user"""
+    end_date = end_date or datetime.now()
+    start_date = end_date - timedelta(days=days_back)
     
     # Track weekends for different sleep patterns
     weekend_days = [5, 6]  # Saturday, Sunday (0=Monday, 6=Sunday)
@@ -68,35 +65,67 @@ def generate_sleep_sessions(user_id, days_back=60, sessions_per_day=1):
             # Ensure reasonable values
             hours = max(4.0, min(12.0, hours))
             
-            try:
-                db.add_sleep_session(
-                    user_id,
-                    current_date.year,
-                    current_date.month,
-                    current_date.day,
-                    hours
-                )
-                total_sessions += 1
-                
-                # Occasionally add a nap session (20% chance)
-                if random.random() < 0.2:
-                    nap_hours = round(random.uniform(0.5, 2.0), 1)
-                    db.add_sleep_session(
-                        user_id,
-                        current_date.year,
-                        current_date.month,
-                        current_date.day,
-                        nap_hours
-                    )
-                    total_sessions += 1
-                    
-            except Exception as e:
-                print(f"⚠️  Error adding session for {current_date}: {e}")
+            # Bedtime between 9:30 and 11:45 PM
+            day_start = current_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            start_ts = day_start + timedelta(hours=21, minutes=30 + random.randint(0, 135))
+            yield (user_id, start_ts, start_ts + timedelta(hours=hours))
+            
+            # Occasionally add a nap session (20% chance), early afternoon
+            if random.random() < 0.2:
+                nap_hours = round(random.uniform(0.5, 2.0), 1)
+                nap_start = day_start + timedelta(hours=13, minutes=random.randint(0, 90))
+                yield (user_id, nap_start, nap_start + timedelta(hours=nap_hours))
+
+
+def generate_sleep_sessions(user_id, days_back=60, sessions_per_day=1):
+    """Generate realistic sleep sessions for a user"""
+    print(f"\n📊 Generating sleep sessions for user ID: {user_id}")
+    print(f"   Time range: Last {days_back} days")
+    print(f"   Sessions per day: {sessions_per_day}")
+    
+    try:
+        total_sessions = db.add_sleep_sessions_bulk(sleep_session_rows(user_id, days_back))
+    except Exception as e:
+        print(f"⚠️  Error adding sessions: {e}")
+        return 0
     
     print(f"✅ Generated {total_sessions} sleep sessions")
     return total_sessions
 
 
+def generate_load_dataset(user_count, days_back, prefix="LoadUser", batch_size=5000):
+    """
+    Create many users with long histories for load testing.
+    Rows are generated lazily and written in large batches, so a few
+    million sessions never sit in memory at once. Every user shares one
+    password hash, made once - hashing per user would take longer than
+    the inserts.
+    """
+    print(f"\n🏋️  Generating load dataset: {user_count} users x {days_back} days")
+    start = time.perf_counter()
+    
+    user_ids = []
+    password_hash = None
+    for i in range(user_count):
+        username = f"{prefix}{i:05d}"
+        user = db.get_user_by_name(username)
+        if not user:
+            password_hash = password_hash or password_hasher.hash("password123")
+            db.create_user(username, "password123", f"{username.lower()}@load.test", password_hash)
+            user = db.get_user_by_name(username)
+        user_ids.append(user['user_id'])
+    print(f"   Users ready in {time.perf_counter() - start:.1f}s")
+    
+    def all_rows():
+        for user_id in user_ids:
+            yield from sleep_session_rows(user_id, days_back)
+    
+    total = db.add_sleep_sessions_bulk(all_rows(), batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Inserted {total:,} sessions in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+    return total
+
+
 def generate_user_statistics(user_id):
     """Generate and display user statistics"""
     print("\n📈 User Statistics:")
@@ -118,12 +147,11 @@ def generate_user_statistics(user_id):
     print(f"   Total sessions: {len(sessions)}")
     print(f"   Total hours: {total_hours:.1f}")
     print(f"   Average per session: {avg_hours:.1f} hours")
-    print(f"   Best sleep: {best_session['hours']:.1f} hours on {best_session['year']}-{best_session['month']:02d}-{best_session['day']:02d}")
-    print(f"   Worst sleep: {worst_session['hours']:.1f} hours on {worst_session['year']}-{worst_session['month']:02d}-{worst_session['day']:02d}")
+    print(f"   Best sleep: {best_session['hours']:.1f} hours on {best_session['sleep_date']}")
+    print(f"   Worst sleep: {worst_session['hours']:.1f} hours on {worst_session['sleep_date']}")
     
     # Calculate recent average (last 7 days)
-    recent_sessions = [s for s in sessions if 
-                      datetime(s['year'], s['month'], s['day']) > datetime.now() - timedelta(days=7)]
+    recent_sessions = [s for s in sessions if s['start_ts'] > datetime.now() - timedelta(days=7)]
     if recent_sessions:
         recent_avg = sum(s['hours'] for s in recent_sessions) / len(recent_sessions)
         print(f"   Recent average (7 days): {recent_avg:.1f} hours")
@@ -274,6 +302,7 @@ def quick_create():
         print("  python TestUserCreation.py --create <username>")
         print("  python TestUserCreation.py --sample (creates all sample users)")
         print("  python TestUserCreation.py --add <username>")
+        print("  python TestUserCreation.py --load <users> <days> (bulk load test data)")
         print("  python TestUserCreation.py --interactive")
         print("="*60)
         return False
@@ -287,6 +316,13 @@ def quick_create():
         create_sample_users()
         return False
     
+    if mode == "--load":
+        if len(sys.argv) < 4 or not sys.argv[2].isdigit() or not sys.argv[3].isdigit():
+            print("\n❌ Usage: python TestUserCreation.py --load <users> <days>")
+            return False
+        generate_load_dataset(int(sys.argv[2]), int(sys.argv[3]))
+        return False
+    
     if len(sys.argv) < 3:
         print("\n❌ Missing username.")
         return False
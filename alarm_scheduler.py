@@ -0,0 +1,156 @@
+"""
+Alarm scheduler for Nyx Sleep Tracker
+Keeps every enabled bedtime reminder and alarm in a heap ordered by next
+fire time and arms one one-shot Clock timer for the earliest of them,
+so nothing polls and alarms go off on the second they are set for
+"""
+
+import heapq
+import itertools
+from datetime import datetime, time, timedelta
+
+from kivy.clock import Clock
+
+
+def parse_time(hour_str, minute_str, ampm):
+    """Convert 12-hour text inputs to a time object, or None if invalid"""
+    try:
+        hour = int(hour_str)
+        minute = int(minute_str)
+    except (TypeError, ValueError):
+        return None
+
+    # Validate inputs
+    if not (1 <= hour <= 12) or not (0 <= minute <= 59):
+        return None
+
+    # Convert to 24-hour format
+    if ampm == 'PM' and hour != 12:
+        hour += 12
+    elif ampm == 'AM' and hour == 12:
+        hour = 0
+
+    return time(hour, minute)
+
+
+def next_occurrence(at, now):
+    """First datetime after now whose time of day is `at`"""
+    fire_at = datetime.combine(now.date(), at)
+    if fire_at <= now:
+        fire_at += timedelta(days=1)
+    return fire_at
+
+
+class Alarm:
+    """A daily alarm - callback(alarm) runs on the main thread every day at `at`"""
+
+    def __init__(self, alarm_id, at, callback, owner=None, label=None):
+        self.alarm_id = alarm_id
+        self.at = at
+        self.callback = callback
+        self.owner = owner
+        self.label = label or str(alarm_id)
+        self.fire_at = None
+
+
+class AlarmScheduler:
+    """
+    Any number of daily alarms, keyed by alarm_id.
+
+    Changing or removing an alarm leaves its old heap entry behind; entries
+    whose alarm no longer matches are skipped when they reach the top, so
+    every change is O(log n) and re-arms the single timer.
+    """
+
+    def __init__(self, now=datetime.now):
+        self._now = now
+        self._alarms = {}  # alarm_id -> Alarm
+        self._heap = []    # (fire_at, seq, Alarm)
+        self._seq = itertools.count()
+        self._event = None
+
+    def set_alarm(self, alarm_id, at, callback, owner=None, label=None):
+        """Add or replace a daily alarm"""
+        existing = self._alarms.get(alarm_id)
+        if existing is not None and existing.at == at:
+            existing.callback = callback
+            existing.label = label or existing.label
+            return existing
+
+        alarm = Alarm(alarm_id, at, callback, owner, label)
+        self._alarms[alarm_id] = alarm
+        self._push(alarm, self._now())
+        self._arm()
+        return alarm
+
+    def remove_alarm(self, alarm_id):
+        if self._alarms.pop(alarm_id, None) is not None:
+            self._arm()
+
+    def clear(self, owner=None):
+        """Remove every alarm, or only the ones that belong to owner"""
+        for alarm_id, alarm in list(self._alarms.items()):
+            if owner is None or alarm.owner == owner:
+                del self._alarms[alarm_id]
+        self._arm()
+
+    def get_alarms(self, owner=None):
+        """Active alarms, soonest first"""
+        alarms = [alarm for alarm in self._alarms.values()
+                  if owner is None or alarm.owner == owner]
+        return sorted(alarms, key=lambda alarm: alarm.fire_at)
+
+    def next_alarm(self):
+        """The alarm that will fire next, or None"""
+        return self._peek()
+
+    # ---------- INTERNAL ----------
+    def _push(self, alarm, now):
+        alarm.fire_at = next_occurrence(alarm.at, now)
+        heapq.heappush(self._heap, (alarm.fire_at, next(self._seq), alarm))
+
+    def _peek(self):
+        while self._heap:
+            fire_at, _, alarm = self._heap[0]
+            if self._alarms.get(alarm.alarm_id) is alarm and alarm.fire_at == fire_at:
+                return alarm
+            heapq.heappop(self._heap)  # replaced or removed since it was pushed
+        return None
+
+    def _arm(self):
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+
+        alarm = self._peek()
+        if alarm is None:
+            return
+        delay = max(0, (alarm.fire_at - self._now()).total_seconds())
+        self._event = Clock.schedule_once(self._fire, delay)
+
+    def _fire(self, dt):
+        self._event = None
+        now = self._now()
+
+        due = []
+        while True:
+            alarm = self._peek()
+            if alarm is None or alarm.fire_at > now:
+                break
+            heapq.heappop(self._heap)
+            due.append(alarm)
+            self._push(alarm, now)  # same time tomorrow
+
+        # Re-arm first so a callback that changes alarms sees a consistent heap
+        self._arm()
+
+        for alarm in due:
+            print(f"⏰ {alarm.label} at {now.strftime('%I:%M:%S %p')}")
+            try:
+                alarm.callback(alarm)
+            except Exception as e:
+                print(f"⚠️ Alarm callback error: {e}")
+
+
+# App-wide scheduler, independent of which screen is showing
+scheduler = AlarmScheduler()
@@ -0,0 +1,26 @@
+"""
+Storage backends for NyxDB
+NYX_DB_BACKEND selects one: 'mysql' (default) or 'sqlite'.
+For SQLite, NYX_DB_PATH is the database file, or ':memory:' for a
+throwaway in-process database (handy for tests and benchmarks)
+"""
+
+import os
+
+from backends.base import Backend
+
+__all__ = ['Backend', 'BACKENDS', 'create_backend']
+
+BACKENDS = ('mysql', 'sqlite')
+
+
+def create_backend(name=None, **options):
+    """Build the backend called name, or the one NYX_DB_BACKEND names"""
+    name = (name or os.environ.get("NYX_DB_BACKEND", "mysql")).lower()
+    if name == 'mysql':
+        from backends.mysql_backend import MySQLBackend
+        return MySQLBackend(**options)
+    if name == 'sqlite':
+        from backends.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(**options)
+    raise ValueError(f"Unknown database backend '{name}' (expected one of {', '.join(BACKENDS)})")
@@ -0,0 +1,42 @@
+"""
+Backend interface for NyxDB
+A backend hands out pooled DB-API connections (with mysql.connector's
+%s placeholders and cursor(dictionary=True)) and supplies the few SQL
+fragments that differ between dialects, so every NyxDB query is written
+once and behaves the same on each database
+"""
+
+
+class Backend:
+    """Base class for NyxDB storage backends"""
+
+    name = None
+
+    # Rollup bucket key per period (see NyxDB ROLLUPS) as SQL on sleep_date
+    ROLLUP_BUCKET_SQL = {}
+    # True for Saturday/Sunday sleep_date
+    WEEKEND_SQL = None
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def connect(self):
+        """Check a connection out of the pool - close() hands it back"""
+        return self.pool.get_connection()
+
+    def stats(self):
+        return self.pool.stats()
+
+    def close(self):
+        self.pool.close_all()
+
+    def upsert(self, *key_columns):
+        """
+        Clause that turns the preceding INSERT into an upsert on key_columns,
+        followed by the caller's `col = expr` assignments
+        """
+        raise NotImplementedError
+
+    def excluded(self, column):
+        """The value an upsert tried to insert into column"""
+        raise NotImplementedError
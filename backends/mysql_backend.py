@@ -0,0 +1,52 @@
+"""
+MySQL backend for NyxDB (XAMPP / MariaDB)
+Connection settings come from NYX_DB_* environment variables
+"""
+
+import os
+
+from backends.base import Backend
+from db_pool import ConnectionPool
+
+
+def mysql_config():
+    return {
+        "host": os.environ.get("NYX_DB_HOST", "localhost"),
+        "user": os.environ.get("NYX_DB_USER", "root"),
+        "password": os.environ.get("NYX_DB_PASSWORD", ""),          # default XAMPP
+        "database": os.environ.get("NYX_DB_NAME", "nyx_sleep"),
+        # Fail fast when the server is unreachable so the app can fall back to the local store
+        "connection_timeout": int(os.environ.get("NYX_DB_CONNECT_TIMEOUT", 5)),
+    }
+
+
+def pool_config():
+    return {
+        "size": int(os.environ.get("NYX_DB_POOL_SIZE", 5)),
+        "idle_timeout": float(os.environ.get("NYX_DB_POOL_IDLE_TIMEOUT", 300)),
+        "health_check_interval": float(os.environ.get("NYX_DB_POOL_HEALTH_CHECK", 30)),
+        "checkout_timeout": float(os.environ.get("NYX_DB_POOL_TIMEOUT", 10)),
+    }
+
+
+class MySQLBackend(Backend):
+    name = 'mysql'
+
+    ROLLUP_BUCKET_SQL = {
+        'day': "DATE_FORMAT(sleep_date, '%%Y-%%m-%%d')",
+        'week': "DATE_FORMAT(sleep_date - INTERVAL (DAYOFWEEK(sleep_date) - 1) DAY, '%%Y-%%m-%%d')",
+        'month': "DATE_FORMAT(sleep_date, '%%Y-%%m')",
+        'dow': "WEEKDAY(sleep_date)",
+    }
+    WEEKEND_SQL = "WEEKDAY(sleep_date) >= 5"
+
+    def __init__(self, config=None, **pool_options):
+        self.config = dict(mysql_config(), **(config or {}))
+        super().__init__(ConnectionPool(self.config, **dict(pool_config(), **pool_options)))
+
+    def upsert(self, *key_columns):
+        # MySQL infers the key from the table's PRIMARY/UNIQUE keys
+        return "ON DUPLICATE KEY UPDATE"
+
+    def excluded(self, column):
+        return f"VALUES({column})"
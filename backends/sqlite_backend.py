@@ -0,0 +1,260 @@
+"""
+SQLite backend for NyxDB
+Same tables and semantics as the MySQL schema in migrations.py, in a
+local file (NYX_DB_PATH) or in memory (NYX_DB_PATH=:memory:), so the app,
+the tools and the benchmark suite run without a MySQL server
+"""
+
+import itertools
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+from backends.base import Backend
+from db_pool import ConnectionPool, Error
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "nyx_sleep.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) NOT NULL UNIQUE,
+    password VARCHAR(255) NOT NULL,
+    email VARCHAR(100) NOT NULL UNIQUE,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS sleep_sessions (
+    session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    client_uuid CHAR(36) UNIQUE,
+    start_ts DATETIME NOT NULL,
+    end_ts DATETIME NOT NULL,
+    sleep_date DATE GENERATED ALWAYS AS (date(start_ts)) STORED,
+    -- Whole seconds rounded half-up to 0.01h in integer math, exactly like
+    -- NyxDB.session_interval (float round() disagrees on the .005 ties)
+    hours DECIMAL(5,2) GENERATED ALWAYS AS (
+        ((CAST(strftime('%s', end_ts) AS INTEGER) - CAST(strftime('%s', start_ts) AS INTEGER))
+         * 100 + 1800) / 3600 / 100.0) STORED,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+-- Indexes for the NyxDB session reads (see migrations.py 006); the DROPs
+-- upgrade files created before them. SQLite treats a read of a generated
+-- column as reading the whole row, so only MySQL answers the date-ordered
+-- reads from idx_sessions_by_date alone - here it still saves the sort.
+DROP INDEX IF EXISTS idx_user_sleep_date;
+CREATE INDEX IF NOT EXISTS idx_sessions_by_date
+    ON sleep_sessions (user_id, sleep_date, session_id, start_ts, end_ts, hours);
+DROP INDEX IF EXISTS idx_sessions_by_id;
+CREATE INDEX IF NOT EXISTS idx_sessions_by_created
+    ON sleep_sessions (user_id, created_at, session_id, client_uuid, start_ts, end_ts);
+
+CREATE TABLE IF NOT EXISTS sleep_rollups (
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    period VARCHAR(5) NOT NULL,
+    bucket VARCHAR(10) NOT NULL,
+    total_hours DECIMAL(12,2) NOT NULL DEFAULT 0,
+    session_count INTEGER NOT NULL DEFAULT 0,
+    weekend_hours DECIMAL(12,2) NOT NULL DEFAULT 0,
+    weekend_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, period, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS user_settings (
+    setting_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL UNIQUE REFERENCES users(user_id) ON DELETE CASCADE,
+    bedtime_enabled TINYINT(1) DEFAULT 0,
+    bedtime_hour VARCHAR(2) DEFAULT '10',
+    bedtime_minute VARCHAR(2) DEFAULT '00',
+    bedtime_ampm VARCHAR(2) DEFAULT 'PM',
+    alarm_enabled TINYINT(1) DEFAULT 0,
+    alarm_hour VARCHAR(2) DEFAULT '06',
+    alarm_minute VARCHAR(2) DEFAULT '30',
+    alarm_ampm VARCHAR(2) DEFAULT 'AM',
+    revision INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS password_resets (
+    reset_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email VARCHAR(100) NOT NULL,
+    code VARCHAR(6) NOT NULL,
+    expires_at DATETIME NOT NULL,
+    used TINYINT(1) DEFAULT 0,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+DROP INDEX IF EXISTS idx_email_code;
+CREATE INDEX IF NOT EXISTS idx_resets_lookup ON password_resets (email, code, used, expires_at);
+CREATE INDEX IF NOT EXISTS idx_resets_expiry ON password_resets (expires_at);
+
+CREATE TABLE IF NOT EXISTS rate_limits (
+    bucket_key VARCHAR(191) PRIMARY KEY,
+    allowed TINYINT(1) NOT NULL DEFAULT 1,
+    tokens DOUBLE NOT NULL,
+    updated_at DOUBLE NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_rate_limits_updated ON rate_limits (updated_at);
+"""
+
+# Hand back the same Python types mysql.connector does
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=' '))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("DECIMAL", lambda value: Decimal(value.decode()))
+
+_PLACEHOLDER = re.compile(r"%(s|%)")
+_memory_ids = itertools.count(1)
+
+
+def _to_qmark(operation):
+    """mysql.connector '%s' placeholders (and '%%' escapes) to sqlite3's '?'"""
+    return _PLACEHOLDER.sub(lambda match: '?' if match.group(1) == 's' else '%', operation)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def _now():
+    return datetime.now().isoformat(sep=' ', timespec='seconds')
+
+
+class SQLiteCursor:
+    """mysql.connector-style cursor: %s placeholders and optional dictionary rows"""
+
+    def __init__(self, raw, dictionary=False):
+        self._cursor = raw.cursor()
+        if dictionary:
+            self._cursor.row_factory = _dict_row
+
+    def execute(self, operation, params=None):
+        # Like mysql.connector, only interpolate when there are parameters
+        if params is None:
+            self._cursor.execute(operation)
+        else:
+            self._cursor.execute(_to_qmark(operation), params)
+
+    def executemany(self, operation, seq_params):
+        self._cursor.executemany(_to_qmark(operation), seq_params)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class SQLiteConnection:
+    """Wraps sqlite3.Connection with the mysql.connector methods NyxDB and the pool use"""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._open = True
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self._raw, dictionary)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def is_connected(self):
+        return self._open
+
+    def ping(self, reconnect=False):
+        if not self._open:
+            raise Error("SQLite connection is closed")
+
+    def close(self):
+        self._open = False
+        self._raw.close()
+
+
+class SQLiteBackend(Backend):
+    name = 'sqlite'
+
+    ROLLUP_BUCKET_SQL = {
+        'day': "strftime('%%Y-%%m-%%d', sleep_date)",
+        'week': "date(sleep_date, '-' || strftime('%%w', sleep_date) || ' days')",
+        'month': "strftime('%%Y-%%m', sleep_date)",
+        'dow': "(CAST(strftime('%%w', sleep_date) AS INTEGER) + 6) %% 7",
+    }
+    WEEKEND_SQL = "strftime('%%w', sleep_date) IN ('0', '6')"
+
+    def __init__(self, path=None, pool_size=None, checkout_timeout=10):
+        path = path or os.environ.get("NYX_DB_PATH", DEFAULT_PATH)
+        self.memory = path == ':memory:'
+        self._keeper = None
+
+        if self.memory:
+            # A named shared-cache database lives as long as one connection to it is open.
+            # A single pooled connection avoids shared-cache table lock errors.
+            self.path = f"file:nyx-memory-{os.getpid()}-{next(_memory_ids)}?mode=memory&cache=shared"
+            self._keeper = self._open_raw()
+            size = 1
+        else:
+            self.path = path
+            size = pool_size or int(os.environ.get("NYX_DB_POOL_SIZE", 5))
+
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+        super().__init__(ConnectionPool(
+            {'database': self.path}, size=size,
+            idle_timeout=float('inf'), health_check_interval=float('inf'),
+            checkout_timeout=checkout_timeout, connect=self._connect
+        ))
+
+    def _open_raw(self):
+        raw = sqlite3.connect(
+            self.path, uri=self.memory, timeout=10,
+            detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+        )
+        raw.execute("PRAGMA foreign_keys = ON")
+        raw.create_function("NOW", 0, _now)
+        return raw
+
+    @staticmethod
+    def _upgrade(raw):
+        """Columns added since a database file was created (SCHEMA only creates what's missing)"""
+        columns = {row[1] for row in raw.execute("PRAGMA table_info(user_settings)")}
+        if 'revision' not in columns:
+            raw.execute("ALTER TABLE user_settings ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+            raw.commit()
+
+    def _connect(self):
+        raw = self._open_raw()
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    if not self.memory:
+                        raw.execute("PRAGMA journal_mode = WAL")
+                    raw.executescript(SCHEMA)
+                    self._upgrade(raw)
+                    self._schema_ready = True
+        return SQLiteConnection(raw)
+
+    def close(self):
+        super().close()
+        if self._keeper is not None:
+            self._keeper.close()
+            self._keeper = None
+
+    def upsert(self, *key_columns):
+        return f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET"
+
+    def excluded(self, column):
+        return f"excluded.{column}"
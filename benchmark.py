@@ -0,0 +1,227 @@
+"""
+Nyx Sleep Tracker - Benchmark Suite
+Seeds a dataset of configurable size and times the login, statistics and
+chart data paths headless, reporting p50/p95 latency and peak memory
+
+Usage:
+  python benchmark.py --users 20 --days 365
+  python benchmark.py --users 20 --days 365 --json results.json
+  python benchmark.py --users 20 --days 365 --baseline results.json
+  python benchmark.py --backend sqlite --db-path :memory:
+"""
+
+import os
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import argparse
+import json
+import math
+import random
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import NyxDB as db
+import sleep_analytics
+from backends import BACKENDS
+from password_hasher import HASH_CONFIG, password_hasher
+from TestUserCreation import sleep_session_rows
+
+BENCH_PREFIX = "BenchUser"
+BENCH_PASSWORD = "password123"
+
+
+def seed_dataset(user_count, days):
+    """
+    Create any missing benchmark users, each with `days` of history.
+    They share one password hash at the configured cost, so logins are
+    timed at full cost but seeding doesn't hash once per user.
+    """
+    random.seed(42)
+    user_ids = []
+    new_ids = []
+    password_hash = None
+
+    for i in range(user_count):
+        username = f"{BENCH_PREFIX}{i:05d}"
+        user = db.get_user_by_name(username)
+        if not user:
+            password_hash = password_hash or password_hasher.hash(BENCH_PASSWORD)
+            db.create_user(username, BENCH_PASSWORD, f"{username.lower()}@bench.test", password_hash)
+            user = db.get_user_by_name(username)
+            new_ids.append(user['user_id'])
+        user_ids.append(user['user_id'])
+
+    if new_ids:
+        print(f"🌱 Seeding {len(new_ids)} users x {days} days...")
+        start = time.perf_counter()
+        rows = (row for user_id in new_ids for row in sleep_session_rows(user_id, days))
+        total = db.add_sleep_sessions_bulk(rows, batch_size=5000)
+        print(f"   {total:,} sessions in {time.perf_counter() - start:.1f}s")
+    else:
+        print(f"🌱 Reusing {len(user_ids)} existing benchmark users")
+
+    return user_ids
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def measure(func, runs):
+    """Time `runs` calls, then one more under tracemalloc for peak memory"""
+    func()  # warm up pool connections and caches
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': percentile(timings, 50) * 1000,
+        'p95_ms': percentile(timings, 95) * 1000,
+        'mean_ms': sum(timings) / len(timings) * 1000,
+        'peak_kb': peak / 1024,
+    }
+
+
+def build_benchmarks(user_ids, login_threads=8):
+    """Name -> zero-argument callable, each picking a random benchmark user"""
+    from session_repository import load_stats
+    from Screens.graph_screen import render_charts
+
+    def pick():
+        index = random.randrange(len(user_ids))
+        return index, user_ids[index]
+
+    def login():
+        index, _ = pick()
+        db.validate_user(f"{BENCH_PREFIX}{index:05d}", BENCH_PASSWORD)
+
+    def login_burst():
+        # login_threads users signing in at once; done when the last one is through
+        with ThreadPoolExecutor(max_workers=login_threads) as pool:
+            for future in [pool.submit(login) for _ in range(login_threads)]:
+                future.result()
+
+    def all_sessions():
+        db.get_all_sessions(pick()[1])
+
+    def stats_load():
+        load_stats(pick()[1], store=db)
+
+    def chart_data():
+        user_id = pick()[1]
+        sleep_analytics.rollup_day_of_week_means(db.get_rollups(user_id, 'dow'))
+        sleep_analytics.rollup_weekly_means(db.get_rollups(user_id, 'week', limit=8))
+
+    def chart_render():
+        render_charts(pick()[1], store=db)
+
+    return {
+        'validate_user': login,
+        f'login_x{login_threads}': login_burst,
+        'get_all_sessions': all_sessions,
+        'stats_load': stats_load,
+        'chart_data': chart_data,
+        'chart_render': chart_render,
+    }
+
+
+def print_report(results, baseline=None):
+    print("\n" + "="*78)
+    print(f"{'Benchmark':<20} {'p50 ms':>10} {'p95 ms':>10} {'mean ms':>10} {'peak KB':>10} {'p95 vs base':>14}")
+    print("-"*78)
+    for name, result in results.items():
+        delta = ""
+        if baseline and name in baseline:
+            base = baseline[name]['p95_ms']
+            delta = f"{(result['p95_ms'] - base) / base * 100:+.1f}%" if base else ""
+        print(f"{name:<20} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+              f"{result['mean_ms']:>10.2f} {result['peak_kb']:>10.1f} {delta:>14}")
+    print("="*78)
+
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base and base['p95_ms'] and result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nyx Sleep Tracker benchmarks")
+    parser.add_argument("--users", type=int, default=10, help="benchmark users to seed")
+    parser.add_argument("--days", type=int, default=365, help="days of history per user")
+    parser.add_argument("--runs", type=int, default=30, help="timed runs per benchmark")
+    parser.add_argument("--only", nargs="*", help="run only these benchmarks")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed p95 slowdown vs baseline before failing (0.2 = 20%%)")
+    parser.add_argument("--backend", choices=BACKENDS,
+                        help="database backend (default: NYX_DB_BACKEND, else mysql)")
+    parser.add_argument("--db-path", help="SQLite database file, or :memory:")
+    parser.add_argument("--login-threads", type=int, default=8,
+                        help="simultaneous logins in the login_xN benchmark")
+    args = parser.parse_args()
+
+    if args.backend or args.db_path:
+        options = {'path': args.db_path} if args.db_path else {}
+        db.configure(args.backend or 'sqlite', **options)
+
+    print("="*78)
+    print(f"⏱️  NYX SLEEP TRACKER - BENCHMARKS ({args.users} users x {args.days} days, "
+          f"{db.get_backend().name})")
+    print("="*78)
+
+    user_ids = seed_dataset(args.users, args.days)
+    benchmarks = build_benchmarks(user_ids, args.login_threads)
+
+    results = {}
+    for name, func in benchmarks.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"▶️  {name}...")
+        results[name] = measure(func, args.runs)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    print_report(results, baseline)
+    print(f"Pool: {db.get_pool_stats()}")
+    print(f"Password hashing: {HASH_CONFIG}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({'users': args.users, 'days': args.days, 'runs': args.runs,
+                       'backend': db.get_backend().name, 'results': results}, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+    db.close_pool()
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ p95 regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+        print("✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
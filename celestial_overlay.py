@@ -1,144 +1,197 @@
 # celestial_overlay.py
 """
 Simple celestial overlay for Nyx Sleep Tracker
-Adds stars, moon, and clouds to any screen
+Adds stars, moon, and clouds to any screen.
+The background sky is rendered once per size into a texture that every screen shares
 """
 
+from collections import OrderedDict
+from kivy.clock import Clock
 from kivy.uix.widget import Widget
-from kivy.graphics import Color, Ellipse
+from kivy.graphics import (Color, Ellipse, Rectangle, Fbo, ClearColor, ClearBuffers,
+                           InstructionGroup)
 import random
 from kivy.properties import NumericProperty
 
 
 class CelestialOverlay(Widget):
-    """Simple overlay with stars, moon, and clouds"""
+    """
+    Simple overlay with stars, moon, and clouds.
+    The sky is laid out once from a seed in normalized coordinates and kept
+    in an InstructionGroup; resizes only move the existing ellipses.
+    """
     
     star_count = NumericProperty(15)  # Number of stars
     cloud_count = NumericProperty(2)  # Number of clouds
     
-    def __init__(self, **kwargs):
+    def __init__(self, seed=None, **kwargs):
         super().__init__(**kwargs)
-        self.bind(size=self.draw_elements, pos=self.draw_elements)
-        self.draw_elements()
+        self.seed = seed if seed is not None else StarfieldRenderer.SEED
+        self.sky = InstructionGroup()
+        self.canvas.add(self.sky)
+        
+        # Layout passes fire pos/size many times per frame - rescale once
+        self._trigger_rescale = Clock.create_trigger(self.rescale)
+        self.bind(size=self._trigger_rescale, pos=self._trigger_rescale)
+        self.bind(star_count=self.build_sky, cloud_count=self.build_sky)
+        self.build_sky()
 
-def add_celestial_background(widget, star_count=20, cloud_count=2):
-    """Add celestial background to any widget"""
-    from kivy.graphics import Color, Ellipse, Rectangle
-    import random
-    
-    with widget.canvas.before:
-        # Background
-        Color(0.07, 0.07, 0.15, 1)
-        widget.bg_rect = Rectangle(pos=widget.pos, size=widget.size)
+    def build_sky(self, *args):
+        """Generate the sky layout and its canvas instructions"""
+        rng = random.Random(self.seed)
+        self.sky.clear()
+        self.stars = []   # (Ellipse, u, v)
+        self.moon = []    # (Ellipse, dx, dy) from the moon anchor
+        self.clouds = []  # (Ellipse, u, v, dx, dy)
         
         # Stars
-        for _ in range(star_count):
-            x = random.uniform(20, widget.width - 20)
-            y = random.uniform(widget.height * 0.4, widget.height - 50)
-            brightness = random.uniform(0.7, 1.0)
-            Color(brightness, brightness, brightness, random.uniform(0.6, 0.9))
-            size = random.uniform(2, 4)
-            Ellipse(pos=(x, y), size=(size, size))
+        for _ in range(int(self.star_count)):
+            brightness = rng.uniform(0.7, 1.0)
+            self.sky.add(Color(brightness, brightness, brightness, rng.uniform(0.6, 0.9)))
+            star_size = rng.uniform(2, 4)
+            self.stars.append((self._add_ellipse((star_size, star_size)), rng.random(), rng.random()))
         
-        # Moon
-        moon_x = widget.width - 80
-        moon_y = widget.height - 80
-        Color(0.98, 0.98, 0.9, 0.9)
-        Ellipse(pos=(moon_x, moon_y), size=(40, 40))
+        # Moon glow, body and crescent shadow
+        moon_size = 40
+        for color, offset, size in (
+            ((0.95, 0.95, 0.8, 0.3), (-5, -5), (moon_size + 10, moon_size + 10)),
+            ((0.98, 0.98, 0.9, 0.9), (0, 0), (moon_size, moon_size)),
+            ((0.05, 0.05, 0.15, 0.8), (10, -2), (moon_size, moon_size)),
+        ):
+            self.sky.add(Color(*color))
+            self.moon.append((self._add_ellipse(size),) + offset)
         
-        # Clouds
-        Color(0.9, 0.9, 0.95, 0.35)
-        for i in range(cloud_count):
-            cloud_x = random.uniform(20, widget.width - 150)
-            cloud_y = random.uniform(20, 150)
-            cloud_size = random.uniform(80, 120)
-            for j in range(3):
-                offset_x = random.uniform(-15, 15)
-                offset_y = random.uniform(-8, 8)
-                Ellipse(
-                    pos=(cloud_x + offset_x + (j * 30), cloud_y + offset_y),
-                    size=(cloud_size * random.uniform(0.4, 0.7), cloud_size * 0.4)
-                )
-    
-    # Update on resize
-    def update_bg(instance, value):
-        if hasattr(instance, 'bg_rect'):
-            instance.bg_rect.pos = instance.pos
-            instance.bg_rect.size = instance.size
-    
-    widget.bind(size=update_bg, pos=update_bg)
-
-    def draw_elements(self, *args):
-        """Draw all celestial elements"""
-        # Clear previous drawings
-        self.canvas.clear()
+        # Clouds are made of overlapping circles
+        for _ in range(int(self.cloud_count)):
+            u, v = rng.random(), rng.random()
+            cloud_size = rng.uniform(80, 120)
+            self.sky.add(Color(0.9, 0.9, 0.95, rng.uniform(0.3, 0.5)))
+            for i in range(3):
+                offset_x = rng.uniform(-15, 15)
+                offset_y = rng.uniform(-8, 8)
+                part_size = cloud_size * rng.uniform(0.4, 0.7)
+                ellipse = self._add_ellipse((part_size, part_size * 0.4))
+                self.clouds.append((ellipse, u, v, offset_x, offset_y))
         
-        with self.canvas:
-            # Draw stars
-            for _ in range(self.star_count):
-                self.draw_star()
-            
-            # Draw moon
-            self.draw_moon()
-            
-            # Draw clouds
-            for _ in range(self.cloud_count):
-                self.draw_cloud()
+        self.rescale()
     
-    def draw_star(self):
-        """Draw a single star at random position"""
-        if self.width == 0 or self.height == 0:
-            return
-        
-        x = random.uniform(20, self.width - 20)
-        y = random.uniform(self.height * 0.4, self.height - 50)
-        size = random.uniform(2, 4)
-        brightness = random.uniform(0.7, 1.0)
-        
-        Color(brightness, brightness, brightness, random.uniform(0.6, 0.9))
-        Ellipse(pos=(x, y), size=(size, size))
+    def _add_ellipse(self, size):
+        ellipse = Ellipse(size=size)
+        self.sky.add(ellipse)
+        return ellipse
     
-    def draw_moon(self):
-        """Draw a crescent moon in top-right corner"""
+    def rescale(self, *args):
+        """Move the existing ellipses to fit the current size"""
         if self.width == 0 or self.height == 0:
             return
         
-        moon_x = self.width - 80  # 20px from right
-        moon_y = self.height - 80  # 20px from top
-        moon_size = 40
+        x0, y0 = self.pos
+        w, h = self.size
         
-        # Moon glow (subtle)
-        Color(0.95, 0.95, 0.8, 0.3)
-        Ellipse(pos=(moon_x - 5, moon_y - 5), 
-                size=(moon_size + 10, moon_size + 10))
+        for ellipse, u, v in self.stars:
+            ellipse.pos = (x0 + 20 + u * (w - 40), y0 + h * 0.4 + v * (h * 0.6 - 50))
         
-        # Moon body
-        Color(0.98, 0.98, 0.9, 0.9)
-        Ellipse(pos=(moon_x, moon_y), 
-                size=(moon_size, moon_size))
+        moon_x = x0 + w - 80  # 20px from right
+        moon_y = y0 + h - 80  # 20px from top
+        for ellipse, dx, dy in self.moon:
+            ellipse.pos = (moon_x + dx, moon_y + dy)
         
-        # Crescent shadow
-        Color(0.05, 0.05, 0.15, 0.8)
-        Ellipse(pos=(moon_x + 10, moon_y - 2), 
-                size=(moon_size, moon_size))
+        for ellipse, u, v, dx, dy in self.clouds:
+            cloud_x = 20 + u * (w - 170)
+            cloud_y = 20 + v * (h * 0.3 - 20)
+            ellipse.pos = (x0 + cloud_x + dx, y0 + cloud_y + dy)
+
+
+class StarfieldRenderer:
+    """
+    Draws the background sky into an off-screen Fbo and caches the texture
+    per (size, star_count, cloud_count). Screens then draw the whole sky
+    as one textured Rectangle instead of an Ellipse per star and cloud puff.
+    """
     
-    def draw_cloud(self):
-        """Draw a fluffy cloud"""
-        if self.width == 0 or self.height == 0:
-            return
-        
-        cloud_x = random.uniform(20, self.width - 150)
-        cloud_y = random.uniform(20, self.height * 0.3)
-        cloud_size = random.uniform(80, 120)
-        opacity = random.uniform(0.3, 0.5)
-        
-        Color(0.9, 0.9, 0.95, opacity)
+    SEED = 2024  # same sky on every screen and every run
+    
+    def __init__(self, max_textures=4):
+        self.max_textures = max_textures
+        self._fbos = OrderedDict()  # key -> Fbo, least recently used first
+    
+    def get_texture(self, size, star_count=20, cloud_count=2):
+        width, height = int(size[0]), int(size[1])
+        key = (width, height, star_count, cloud_count)
+        fbo = self._fbos.get(key)
+        if fbo is None:
+            fbo = self._render(width, height, star_count, cloud_count)
+            self._fbos[key] = fbo
+            while len(self._fbos) > self.max_textures:
+                self._fbos.popitem(last=False)
+        else:
+            self._fbos.move_to_end(key)
+        return fbo.texture
+    
+    def _render(self, width, height, star_count, cloud_count):
+        rng = random.Random(self.SEED)
+        fbo = Fbo(size=(width, height))
         
-        # Cloud is made of overlapping circles
-        for i in range(3):
-            offset_x = random.uniform(-15, 15)
-            offset_y = random.uniform(-8, 8)
-            part_size = cloud_size * random.uniform(0.4, 0.7)
+        with fbo:
+            ClearColor(0, 0, 0, 0)
+            ClearBuffers()
+            
+            # Background
+            Color(0.07, 0.07, 0.15, 1)
+            Rectangle(pos=(0, 0), size=(width, height))
             
-            Ellipse(pos=(cloud_x + offset_x, cloud_y + offset_y), 
-                   size=(part_size, part_size * 0.4))
\ No newline at end of file
+            # Stars
+            for _ in range(star_count):
+                x = rng.uniform(20, width - 20)
+                y = rng.uniform(height * 0.4, height - 50)
+                brightness = rng.uniform(0.7, 1.0)
+                Color(brightness, brightness, brightness, rng.uniform(0.6, 0.9))
+                star_size = rng.uniform(2, 4)
+                Ellipse(pos=(x, y), size=(star_size, star_size))
+            
+            # Moon
+            Color(0.98, 0.98, 0.9, 0.9)
+            Ellipse(pos=(width - 80, height - 80), size=(40, 40))
+            
+            # Clouds
+            Color(0.9, 0.9, 0.95, 0.35)
+            for _ in range(cloud_count):
+                cloud_x = rng.uniform(20, width - 150)
+                cloud_y = rng.uniform(20, 150)
+                cloud_size = rng.uniform(80, 120)
+                for j in range(3):
+                    offset_x = rng.uniform(-15, 15)
+                    offset_y = rng.uniform(-8, 8)
+                    Ellipse(
+                        pos=(cloud_x + offset_x + (j * 30), cloud_y + offset_y),
+                        size=(cloud_size * rng.uniform(0.4, 0.7), cloud_size * 0.4)
+                    )
+        
+        fbo.draw()
+        return fbo
+
+
+# Shared by every screen
+starfield = StarfieldRenderer()
+
+
+def add_celestial_background(widget, star_count=20, cloud_count=2):
+    """Add celestial background to any widget"""
+    with widget.canvas.before:
+        Color(1, 1, 1, 1)
+        widget.bg_rect = Rectangle(pos=widget.pos, size=widget.size)
+    
+    def refresh_texture(dt):
+        if widget.width > 0 and widget.height > 0:
+            widget.bg_rect.texture = starfield.get_texture(widget.size, star_count, cloud_count)
+    
+    # Stretch the current texture right away, re-render once the size settles
+    refresh = Clock.create_trigger(refresh_texture, 0.15)
+    
+    def update_bg(instance, value):
+        instance.bg_rect.pos = instance.pos
+        instance.bg_rect.size = instance.size
+        refresh()
+    
+    widget.bind(size=update_bg, pos=update_bg)
+    refresh()
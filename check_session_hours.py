@@ -0,0 +1,96 @@
+"""
+Nyx Sleep Tracker - Session Hours Check
+Inserts sessions whose length sits exactly on a 0.005h rounding tie (and
+one second either side) and checks that the hours column the database
+derives, the incremental rollups and rebuild_rollups() all agree with
+NyxDB.session_interval - as does the local store's copy.
+
+Usage:
+  python check_session_hours.py --backend sqlite --db-path :memory:
+  python check_session_hours.py                         (NYX_DB_BACKEND, else mysql)
+"""
+
+import os
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+import NyxDB as db
+import local_store
+from backends import BACKENDS
+
+CHECK_USER = "HoursCheckUser"
+
+
+def tie_durations(count):
+    """Seconds on the 0.005h ties (18 mod 36) and their neighbours, up to a day"""
+    return [36 * k + 18 + offset for k in range(count) for offset in (-1, 0, 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check derived session hours against session_interval")
+    parser.add_argument("--count", type=int, default=1000, help="rounding ties to insert (max 2399)")
+    parser.add_argument("--backend", choices=BACKENDS,
+                        help="database backend (default: NYX_DB_BACKEND, else mysql)")
+    parser.add_argument("--db-path", help="SQLite database file, or :memory:")
+    args = parser.parse_args()
+
+    if args.backend or args.db_path:
+        options = {'path': args.db_path} if args.db_path else {}
+        db.configure(args.backend or 'sqlite', **options)
+
+    print("="*78)
+    print(f"🔍 NYX SLEEP TRACKER - SESSION HOURS ({db.get_backend().name})")
+    print("="*78)
+
+    user = db.get_user_by_name(CHECK_USER)
+    if not user:
+        db.create_user(CHECK_USER, "password123", "hourscheck@check.test")
+        user = db.get_user_by_name(CHECK_USER)
+    user_id = user['user_id']
+
+    base = datetime(2001, 1, 1, 22, 0, 0)
+    expected = {}
+    rows = []
+    for i, seconds in enumerate(tie_durations(min(args.count, 2399))):
+        start_ts = base + timedelta(days=i)
+        end_ts = start_ts + timedelta(seconds=seconds)
+        expected[start_ts, end_ts] = db.session_interval(start_ts, end_ts)[3]
+        rows.append((user_id, start_ts, end_ts))
+
+    db.add_sleep_sessions_bulk(rows)
+    incremental = db.get_rollups(user_id, 'day')
+
+    failures = []
+    for s in db.get_sessions_between(user_id, base.date(), rows[-1][1].date()):
+        want = expected[s['start_ts'], s['end_ts']]
+        if s['hours'] != want:
+            failures.append(f"column: {s['start_ts']} -> {s['end_ts']}: stored {s['hours']}, "
+                            f"session_interval {want}")
+        local = local_store._interval_row(s['start_ts'], s['end_ts'])[3]
+        if local != float(want):
+            failures.append(f"local store: {s['start_ts']} -> {s['end_ts']}: {local}, "
+                            f"session_interval {want}")
+
+    db.rebuild_rollups(user_id)
+    rebuilt = db.get_rollups(user_id, 'day')
+    if incremental != rebuilt:
+        differ = [(a['bucket'], a['total_hours'], b['total_hours'])
+                  for a, b in zip(incremental, rebuilt) if a != b]
+        failures.append(f"rollups: incremental and rebuilt differ in {len(differ)} day(s), e.g. {differ[:3]}")
+
+    db.close_pool()
+    for failure in failures[:20]:
+        print(f"❌ {failure}")
+    print("="*78)
+    if failures:
+        print(f"❌ {len(failures)} mismatch(es) in {len(rows)} sessions")
+        return 1
+    print(f"✅ {len(rows)} sessions: column, local store and rollups match session_interval")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+Connection pool for Nyx Sleep Tracker
+Keeps database connections open and hands them out to NyxDB calls,
+so a login or a stats refresh no longer pays a TCP + auth handshake per query
+"""
+
+import threading
+import time
+from collections import deque
+
+try:
+    import mysql.connector
+    from mysql.connector import Error
+except ImportError:
+    # SQLite-only installs - see backends/
+    mysql = None
+
+    class Error(Exception):
+        """Database error"""
+
+
+class PoolExhaustedError(Error):
+    """Raised when no connection frees up before the checkout timeout"""
+
+
+class PooledConnection:
+    """Proxy around a pooled connection - close() returns it to the pool"""
+
+    def __init__(self, pool, raw, checked_out_at):
+        self._pool = pool
+        self._raw = raw
+        self._checked_out_at = checked_out_at
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._release(raw, time.monotonic() - self._checked_out_at)
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise Error("Connection already returned to the pool")
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # Safety net for callers that bail out before close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Bounded pool with health checks, idle eviction and usage stats"""
+
+    def __init__(self, connect_args, size=5, idle_timeout=300,
+                 health_check_interval=30, checkout_timeout=10, connect=None):
+        self.connect_args = dict(connect_args)
+        # Opens a raw connection; MySQL by default, see backends/ for others
+        self.connect = connect or (lambda: mysql.connector.connect(**self.connect_args))
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = deque()  # (raw connection, last returned at)
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stopped = threading.Event()
+        self._evictor = None  # started with the first idle connection
+        self._stats = {
+            'checkouts': 0,
+            'hits': 0,          # served from an idle connection
+            'misses': 0,        # had to open a new connection
+            'waits': 0,         # pool was full, caller had to wait
+            'timeouts': 0,
+            'reconnects': 0,    # stale socket replaced during health check
+            'evictions': 0,     # idle connections closed
+            'discarded': 0,     # broken connections dropped on release
+            'checkout_time_total': 0.0,
+            'checkout_time_max': 0.0,
+            'hold_time_total': 0.0,
+        }
+
+    # ---------- CHECKOUT ----------
+    def get_connection(self):
+        start = time.monotonic()
+        deadline = start + self.checkout_timeout
+        raw = None
+        last_used = None
+        waited = False
+
+        with self._cond:
+            if self._closed:
+                raise Error("Connection pool is closed")
+            stale = self._pop_expired_locked(start)
+
+            while not self._idle and self._in_use >= self.size:
+                waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolExhaustedError(
+                        f"No database connection available after {self.checkout_timeout}s"
+                    )
+                self._cond.wait(remaining)
+
+            if self._idle:
+                raw, last_used = self._idle.pop()  # LIFO keeps the warmest socket busy
+            self._in_use += 1
+            if waited:
+                self._stats['waits'] += 1
+
+        self._close_quietly(stale)
+
+        try:
+            if raw is None:
+                raw = self._connect()
+                hit = False
+            else:
+                raw = self._ensure_healthy(raw, start - last_used)
+                hit = True
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        now = time.monotonic()
+        elapsed = now - start
+        with self._cond:
+            self._stats['checkouts'] += 1
+            self._stats['hits' if hit else 'misses'] += 1
+            self._stats['checkout_time_total'] += elapsed
+            self._stats['checkout_time_max'] = max(self._stats['checkout_time_max'], elapsed)
+
+        return PooledConnection(self, raw, now)
+
+    def _connect(self):
+        return self.connect()
+
+    def _ensure_healthy(self, raw, idle_for):
+        """Ping connections that sat idle long enough to have gone stale"""
+        # is_connected() is a ping too, so recently used connections get no round trip
+        if idle_for < self.health_check_interval:
+            return raw
+        try:
+            raw.ping(reconnect=False)
+            return raw
+        except Error:
+            self._close_quietly([raw])
+            fresh = self._connect()
+            with self._cond:
+                self._stats['reconnects'] += 1
+            return fresh
+
+    # ---------- RELEASE ----------
+    def _release(self, raw, held_for):
+        keep = True
+        try:
+            # Never hand the next caller someone else's half-finished transaction
+            if raw.in_transaction:
+                raw.rollback()
+        except Error:
+            keep = False
+
+        with self._cond:
+            self._in_use -= 1
+            self._stats['hold_time_total'] += held_for
+            if keep and not self._closed and len(self._idle) < self.size:
+                self._idle.append((raw, time.monotonic()))
+                raw = None
+                self._start_evictor_locked()
+            elif not keep:
+                self._stats['discarded'] += 1
+            self._cond.notify()
+
+        if raw is not None:
+            self._close_quietly([raw])
+
+    # ---------- MAINTENANCE ----------
+    def _pop_expired_locked(self, now):
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+        self._stats['evictions'] += len(expired)
+        return expired
+
+    def _start_evictor_locked(self):
+        if self._evictor is None and self.idle_timeout < float('inf'):
+            self._evictor = threading.Thread(target=self._evict_loop, name="db-pool-evictor", daemon=True)
+            self._evictor.start()
+
+    def _evict_loop(self):
+        """Background eviction, so idle sockets close even when no checkout comes along"""
+        period = max(self.idle_timeout / 2, 1)
+        while not self._stopped.wait(period):
+            self.evict_idle()
+
+    def evict_idle(self):
+        """Close connections that have been idle longer than idle_timeout"""
+        with self._cond:
+            expired = self._pop_expired_locked(time.monotonic())
+        self._close_quietly(expired)
+        return len(expired)
+
+    def close_all(self):
+        """Close every idle connection and refuse new checkouts"""
+        with self._cond:
+            self._closed = True
+            self._stopped.set()
+            idle = [raw for raw, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        self._close_quietly(idle)
+
+    @staticmethod
+    def _close_quietly(connections):
+        for raw in connections:
+            try:
+                raw.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """Snapshot of pool counters for monitoring"""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot['size'] = self.size
+            snapshot['in_use'] = self._in_use
+            snapshot['idle'] = len(self._idle)
+        checkouts = snapshot['checkouts'] or 1
+        snapshot['avg_checkout_ms'] = snapshot['checkout_time_total'] / checkouts * 1000
+        snapshot['max_checkout_ms'] = snapshot['checkout_time_max'] * 1000
+        snapshot['avg_hold_ms'] = snapshot['hold_time_total'] / checkouts * 1000
+        return snapshot
@@ -0,0 +1,129 @@
+"""
+Background database dispatch for Nyx Sleep Tracker
+Runs NyxDB calls on worker threads and delivers the results back
+on the Kivy main thread, so a slow network never freezes the UI
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from kivy.clock import Clock
+
+
+class DBTask:
+    """Handle for a queued database call"""
+
+    def __init__(self, owner, write=False):
+        self.owner = owner
+        self.write = write
+        self.future = None
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Drop the result. Reads that have not started yet are skipped;
+        writes always run so cancelling never loses data.
+        """
+        self.cancelled = True
+        if self.future is not None and not self.write:
+            self.future.cancel()
+
+
+class DBDispatcher:
+    """
+    Thread pool for NyxDB calls.
+
+    Results arrive through on_success / on_error via Clock.schedule_once.
+    Tasks are grouped by owner (usually a screen): cancel(owner) drops
+    everything still pending for it (pass write=True for calls that must
+    still reach the database even if the screen goes away), and owners that define
+    on_db_busy(busy) are told when their first task starts and their
+    last one finishes, so they can show a busy state.
+    """
+
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='nyx-db')
+        self._pending = {}  # owner -> list of DBTask
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, owner=None, on_success=None, on_error=None,
+               write=False, **kwargs):
+        task = DBTask(owner, write)
+        self._track(task)
+        task.future = self._executor.submit(func, *args, **kwargs)
+        task.future.add_done_callback(
+            lambda future: Clock.schedule_once(lambda dt: self._deliver(task, on_success, on_error))
+        )
+        return task
+
+    def cancel(self, owner):
+        """Cancel every pending task that belongs to owner"""
+        with self._lock:
+            tasks = self._pending.pop(owner, [])
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            self._notify_busy(owner, False)
+
+    def is_busy(self, owner):
+        with self._lock:
+            return bool(self._pending.get(owner))
+
+    def shutdown(self, wait=True):
+        """Stop accepting work; queued writes still finish when wait is True"""
+        self._executor.shutdown(wait=wait)
+
+    # ---------- INTERNAL ----------
+    def _track(self, task):
+        if task.owner is None:
+            return
+        with self._lock:
+            tasks = self._pending.setdefault(task.owner, [])
+            tasks.append(task)
+            first = len(tasks) == 1
+        if first:
+            self._notify_busy(task.owner, True)
+
+    def _untrack(self, task):
+        if task.owner is None:
+            return
+        with self._lock:
+            tasks = self._pending.get(task.owner)
+            if not tasks or task not in tasks:
+                return
+            tasks.remove(task)
+            idle = not tasks
+            if idle:
+                del self._pending[task.owner]
+        if idle:
+            self._notify_busy(task.owner, False)
+
+    def _deliver(self, task, on_success, on_error):
+        self._untrack(task)
+        if task.cancelled or task.future.cancelled():
+            return
+
+        error = task.future.exception()
+        if error is not None:
+            if on_error:
+                on_error(error)
+            else:
+                print(f"Database error: {error}")
+        elif on_success:
+            on_success(task.future.result())
+
+    @staticmethod
+    def _notify_busy(owner, busy):
+        callback = getattr(owner, 'on_db_busy', None)
+        if callback:
+            callback(busy)
+
+
+# Shared dispatcher used by all screens
+dispatcher = DBDispatcher()
+
+
+def run_in_background(func, *args, **kwargs):
+    """Shortcut for dispatcher.submit"""
+    return dispatcher.submit(func, *args, **kwargs)
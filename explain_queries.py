@@ -0,0 +1,229 @@
+"""
+Nyx Sleep Tracker - Query Plan Check
+Seeds the benchmark dataset, calls every NyxDB function that reads or
+changes rows, and runs EXPLAIN on each statement it sent. Fails if any
+statement scans a whole table/index or sorts its results (filesort /
+temp B-tree) instead of walking an index.
+
+Every NyxDB function with a SELECT, UPDATE or DELETE must be exercised
+below, so a new query can't slip in unchecked.
+
+Usage:
+  python explain_queries.py --backend sqlite --db-path :memory:
+  python explain_queries.py                         (NYX_DB_BACKEND, else mysql)
+"""
+
+import os
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import argparse
+import inspect
+import re
+import sys
+import uuid
+from datetime import date, datetime, timedelta
+
+import NyxDB as db
+from backends import BACKENDS
+from benchmark import BENCH_PREFIX, BENCH_PASSWORD, seed_dataset
+
+# Statements that may scan or sort, and why
+ALLOWED = {
+    'rebuild_rollups': "maintenance job - reads every user and groups sessions by a computed bucket",
+}
+
+EXPLAINABLE = re.compile(r"^\s*(SELECT|UPDATE|DELETE|INSERT\b.*\bSELECT)\b", re.S | re.I)
+QUERY_WORDS = re.compile(r"\b(SELECT|UPDATE|DELETE)\b")
+
+
+# ---------- RECORDING ----------
+class RecordingCursor:
+    """Passes everything through, noting each statement and the NyxDB function that sent it"""
+
+    def __init__(self, cursor, log):
+        self._cursor = cursor
+        self._log = log
+
+    def execute(self, sql, params=None):
+        self._record(sql, params)
+        return self._cursor.execute(sql, params)
+
+    def executemany(self, sql, seq_params):
+        seq_params = list(seq_params)
+        if seq_params:
+            self._record(sql, seq_params[0])
+        return self._cursor.executemany(sql, seq_params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _record(self, sql, params):
+        frame = sys._getframe(2)
+        while frame and frame.f_globals.get('__name__') != db.__name__:
+            frame = frame.f_back
+        caller = frame.f_code.co_name if frame else '?'
+        key = " ".join(sql.split())
+        if key not in self._log:
+            self._log[key] = (caller, sql, params)
+
+
+class RecordingConnection:
+    def __init__(self, connection, log):
+        self._connection = connection
+        self._log = log
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self._connection.cursor(*args, **kwargs), self._log)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+def record_queries(log):
+    backend = db.get_backend()
+    connect = backend.connect
+    backend.connect = lambda: RecordingConnection(connect(), log)
+    return connect
+
+
+def exercise(user_id):
+    """Call every NyxDB query function once against seeded user_id"""
+    username = f"{BENCH_PREFIX}{0:05d}"
+    user = db.get_user_by_name(username)
+    db.get_user_by_email(user['email'])
+    db.validate_user(username, BENCH_PASSWORD)
+    db.update_user_password(user['user_id'], BENCH_PASSWORD)
+
+    db.save_reset_code(user['email'], '123456')
+    db.verify_reset_code(user['email'], '123456')
+    db.delete_reset_code(user['email'])
+    db.save_reset_code(user['email'], '654321')
+    db.purge_reset_codes(retention=timedelta(hours=-1))  # cutoff in the future: purges it
+
+    now = datetime.now().replace(microsecond=0)
+    db.add_sleep_session(user_id, now - timedelta(hours=8), now)
+    db.get_all_sessions(user_id)
+    db.get_recent_sessions(user_id)
+    db.get_sessions_between(user_id, date.today() - timedelta(days=30), date.today())
+    # The first page sends the same SQL as get_recent_sessions, so ask for a later
+    # one directly - iter_sessions only reaches it with more than page_size sessions
+    db.get_sessions_page(user_id, after=(date.today(), 2**31 - 1))
+    for _ in db.iter_sessions(user_id, page_size=100):
+        pass
+    db.get_sessions_fingerprint(user_id)
+
+    db.get_sleep_summary(user_id)
+    db.get_monthly_summary(user_id, now.year, now.month)
+    db.get_rollups(user_id, 'dow')
+    db.get_rollups(user_id, 'week', limit=8)
+    db.rebuild_rollups(user_id)
+
+    db.push_sleep_sessions(user_id, [{'client_uuid': str(uuid.uuid4()),
+                                      'start_ts': now - timedelta(hours=30), 'end_ts': now - timedelta(hours=22)}])
+    db.get_sessions_created_after(user_id, limit=200)
+    db.get_sessions_created_after(user_id, (now - db.PULL_OVERLAP, 0), limit=200)
+
+    db.save_user_settings(user_id, 1, '10', '30', 'PM', 1, '06', '45', 'AM')
+    db.get_user_settings(user_id)
+
+    db.take_rate_limit_token('login:id:explain', 5, 1 / 60, now.timestamp())
+    db.refund_rate_limit_token('login:id:explain', 5)
+    db.reset_rate_limit('login:id:explain')
+    db.purge_rate_limits(now.timestamp() - 3600)
+
+
+def query_functions():
+    """Names of NyxDB functions that run a SELECT, UPDATE or DELETE"""
+    return {
+        name for name, func in vars(db).items()
+        if inspect.isfunction(func) and func.__module__ == db.__name__
+        and '.execute' in (source := inspect.getsource(func)) and QUERY_WORDS.search(source)
+    }
+
+
+# ---------- PLANS ----------
+def plan_problems(connection, sql, params):
+    """(plan lines, problems) for one statement on the current backend"""
+    backend = db.get_backend().name
+    if backend == 'sqlite':
+        cur = connection.cursor()
+        cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+        lines = [row[3] for row in cur.fetchall()]
+        problems = [line for line in lines
+                    if line.startswith('SCAN ') or 'TEMP B-TREE' in line]
+        return lines, problems
+
+    cur = connection.cursor(dictionary=True)
+    cur.execute("EXPLAIN " + sql, params)
+    lines, problems = [], []
+    for row in cur.fetchall():
+        extra = row.get('Extra') or ''
+        line = f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} {extra}".strip()
+        lines.append(line)
+        if row['type'] in ('ALL', 'index') or 'filesort' in extra or 'temporary' in extra:
+            problems.append(line)
+    return lines, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check NyxDB query plans for scans and sorts")
+    parser.add_argument("--users", type=int, default=5, help="benchmark users to seed")
+    parser.add_argument("--days", type=int, default=365, help="days of history per user")
+    parser.add_argument("--backend", choices=BACKENDS,
+                        help="database backend (default: NYX_DB_BACKEND, else mysql)")
+    parser.add_argument("--db-path", help="SQLite database file, or :memory:")
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    if args.backend or args.db_path:
+        options = {'path': args.db_path} if args.db_path else {}
+        db.configure(args.backend or 'sqlite', **options)
+
+    print("="*78)
+    print(f"🔍 NYX SLEEP TRACKER - QUERY PLANS ({db.get_backend().name})")
+    print("="*78)
+
+    user_ids = seed_dataset(args.users, args.days)
+    log = {}
+    connect = record_queries(log)
+    exercise(user_ids[0])
+
+    failures = []
+    checked = 0
+    connection = connect()
+    try:
+        if db.get_backend().name == 'sqlite':
+            connection.cursor().execute("ANALYZE")  # give the planner real row counts, as MySQL has
+        for caller, sql, params in log.values():
+            if not EXPLAINABLE.match(sql):
+                continue
+            lines, problems = plan_problems(connection, sql, params)
+            checked += 1
+            allowed = caller in ALLOWED
+            status = "⚠️ " if problems and allowed else "❌" if problems else "✅"
+            print(f"{status} {caller}: {' '.join(sql.split())[:60]}...")
+            if problems or args.verbose:
+                for line in lines:
+                    print(f"      {line}")
+            if problems and not allowed:
+                failures.append(caller)
+            elif problems:
+                print(f"      allowed: {ALLOWED[caller]}")
+    finally:
+        connection.close()
+        db.close_pool()
+
+    missed = sorted(query_functions() - {caller for caller, _, _ in log.values()})
+    if missed:
+        print(f"❌ Not exercised (add them to exercise()): {', '.join(missed)}")
+
+    print("="*78)
+    if failures or missed:
+        print(f"❌ {len(failures)} statement(s) scan or sort: {', '.join(sorted(set(failures))) or '-'}")
+        return 1
+    print(f"✅ {checked} statements checked, none scan or sort")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
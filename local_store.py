@@ -0,0 +1,521 @@
+"""
+Local store for Nyx Sleep Tracker
+Embedded SQLite copy of each signed-in user's sessions and settings.
+The app reads and writes here first, so tracking, statistics and charts
+keep working when the MySQL server is unreachable; sync_engine.py moves
+changes between this file and MySQL in the background
+"""
+
+import hashlib
+import hmac
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import date, datetime
+
+from NyxDB import session_interval
+
+LOCAL_DB_PATH = os.environ.get(
+    "NYX_LOCAL_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "nyx_local.db")
+)
+
+# Offline login verifiers - only ever compared locally
+PBKDF2_ITERATIONS = 200_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT,
+    password_salt BLOB,
+    password_hash BLOB
+);
+
+-- local_id is this device's key; session_id is the MySQL key once known.
+-- client_uuid makes pushes idempotent: a retried push never duplicates.
+-- sleep_date and hours are derived from start_ts/end_ts when written.
+CREATE TABLE IF NOT EXISTS sleep_sessions (
+    local_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_uuid TEXT UNIQUE,
+    session_id INTEGER UNIQUE,
+    user_id INTEGER NOT NULL,
+    start_ts TEXT NOT NULL,
+    end_ts TEXT NOT NULL,
+    sleep_date TEXT NOT NULL,
+    hours REAL NOT NULL,
+    synced INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_local_user_date ON sleep_sessions (user_id, sleep_date, local_id);
+CREATE INDEX IF NOT EXISTS idx_local_pending ON sleep_sessions (synced, user_id);
+
+-- updated_at is when the settings last changed on this device,
+-- remote_revision the server's revision they were last synced with.
+-- revision goes up on every local change; sync clears dirty only if it
+-- is unchanged (updated_at has whole seconds, too coarse for that).
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id INTEGER PRIMARY KEY,
+    bedtime_enabled INTEGER NOT NULL DEFAULT 0,
+    bedtime_hour TEXT NOT NULL DEFAULT '10',
+    bedtime_minute TEXT NOT NULL DEFAULT '00',
+    bedtime_ampm TEXT NOT NULL DEFAULT 'PM',
+    alarm_enabled INTEGER NOT NULL DEFAULT 0,
+    alarm_hour TEXT NOT NULL DEFAULT '06',
+    alarm_minute TEXT NOT NULL DEFAULT '30',
+    alarm_ampm TEXT NOT NULL DEFAULT 'AM',
+    updated_at TEXT NOT NULL,
+    remote_revision INTEGER,
+    revision INTEGER NOT NULL DEFAULT 0,
+    dirty INTEGER NOT NULL DEFAULT 0
+);
+
+-- last_pulled_at is the server's created_at of the newest session pulled
+CREATE TABLE IF NOT EXISTS sync_state (
+    user_id INTEGER PRIMARY KEY,
+    last_pulled_at TEXT,
+    last_synced_at TEXT
+);
+"""
+
+SETTINGS_FIELDS = ('bedtime_enabled', 'bedtime_hour', 'bedtime_minute', 'bedtime_ampm',
+                   'alarm_enabled', 'alarm_hour', 'alarm_minute', 'alarm_ampm')
+
+# PRAGMA user_version of an up-to-date local database
+SCHEMA_VERSION = 4
+
+# Version 1: sessions are start_ts/end_ts intervals instead of year/month/day/hours.
+# Old rows have no time of day, so they start at midnight of their date.
+MIGRATE_TO_INTERVALS = """
+CREATE TABLE sleep_sessions_v1 (
+    local_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_uuid TEXT UNIQUE,
+    session_id INTEGER UNIQUE,
+    user_id INTEGER NOT NULL,
+    start_ts TEXT NOT NULL,
+    end_ts TEXT NOT NULL,
+    sleep_date TEXT NOT NULL,
+    hours REAL NOT NULL,
+    synced INTEGER NOT NULL DEFAULT 0
+);
+INSERT INTO sleep_sessions_v1
+    (local_id, client_uuid, session_id, user_id, start_ts, end_ts, sleep_date, hours, synced)
+SELECT local_id, client_uuid, session_id, user_id,
+       sleep_date || ' 00:00:00',
+       datetime(sleep_date, '+' || CAST(round(hours * 3600) AS INTEGER) || ' seconds'),
+       sleep_date, hours, synced
+FROM sleep_sessions;
+DROP TABLE sleep_sessions;
+ALTER TABLE sleep_sessions_v1 RENAME TO sleep_sessions;
+"""
+
+# Version 2: hours rounded half-up like the server (version 1 rounded floats)
+RECOMPUTE_HOURS = """
+UPDATE sleep_sessions SET hours =
+    ((CAST(strftime('%s', end_ts) AS INTEGER) - CAST(strftime('%s', start_ts) AS INTEGER))
+     * 100 + 1800) / 3600 / 100.0;
+"""
+
+# Version 4: pulls resume from the server's created_at, settings sync by
+# server revision. Every server row starts at revision 0, so settings
+# synced before are at 0; last_pulled_id is left unused and the first
+# pull re-reads everything (merging is idempotent).
+SYNC_BY_REVISION = """
+ALTER TABLE user_settings ADD COLUMN remote_revision INTEGER;
+UPDATE user_settings SET remote_revision = 0 WHERE remote_updated_at IS NOT NULL;
+ALTER TABLE sync_state ADD COLUMN last_pulled_at TEXT;
+"""
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def get_connection():
+    """Open the local database - cheap, so every call gets its own connection"""
+    db = sqlite3.connect(LOCAL_DB_PATH, timeout=10)
+    db.row_factory = sqlite3.Row
+    if LOCAL_DB_PATH not in _schema_ready:
+        with _schema_lock:
+            if LOCAL_DB_PATH not in _schema_ready:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.executescript(SCHEMA)
+                _migrate(db)
+                _schema_ready.add(LOCAL_DB_PATH)
+    return db
+
+
+def _migrate(db):
+    """Bring a local database written by an older version up to SCHEMA_VERSION"""
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    columns = {row[1] for row in db.execute("PRAGMA table_info(sleep_sessions)")}
+    if 'start_ts' not in columns:
+        db.executescript("BEGIN;" + MIGRATE_TO_INTERVALS + "COMMIT;")
+        db.executescript(SCHEMA)  # indexes went with the old table
+        print("✅ Local sessions moved to start/end times")
+    if version < 2:
+        db.executescript("BEGIN;" + RECOMPUTE_HOURS + "COMMIT;")
+    # Version 3: user_settings.revision
+    if 'revision' not in {row[1] for row in db.execute("PRAGMA table_info(user_settings)")}:
+        db.execute("ALTER TABLE user_settings ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+    if 'remote_revision' not in {row[1] for row in db.execute("PRAGMA table_info(user_settings)")}:
+        db.executescript("BEGIN;" + SYNC_BY_REVISION + "COMMIT;")
+    db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def _now():
+    return datetime.now().isoformat(sep=' ', timespec='seconds')
+
+
+# ---------- USERS ----------
+def _hash_password(password, salt):
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PBKDF2_ITERATIONS)
+
+
+def remember_user(user, password):
+    """Keep a user and a password verifier so they can log in offline later"""
+    salt = os.urandom(16)
+    db = get_connection()
+    with db:
+        db.execute("""
+            INSERT INTO users (user_id, username, email, password_salt, password_hash)
+            VALUES (?,?,?,?,?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username=excluded.username, email=excluded.email,
+                password_salt=excluded.password_salt, password_hash=excluded.password_hash
+        """, (user['user_id'], user['username'], user.get('email'), salt,
+              _hash_password(password, salt)))
+    db.close()
+
+
+def verify_user(username, password):
+    """Offline login: the remembered user, or None if unknown or the password is wrong"""
+    db = get_connection()
+    row = db.execute(
+        "SELECT user_id, username, email, password_salt, password_hash FROM users WHERE username=?",
+        (username,)
+    ).fetchone()
+    db.close()
+    if row is None or row['password_hash'] is None:
+        return None
+    if not hmac.compare_digest(_hash_password(password, row['password_salt']), row['password_hash']):
+        return None
+    return {'user_id': row['user_id'], 'username': row['username'], 'email': row['email']}
+
+
+# ---------- SLEEP ----------
+def _interval_row(start_ts, end_ts):
+    """(start_ts, end_ts, sleep_date, hours) as stored, rounded the same way as on the server"""
+    start_ts, end_ts, sleep_date, hours = session_interval(start_ts, end_ts)
+    return start_ts.isoformat(sep=' '), end_ts.isoformat(sep=' '), sleep_date.isoformat(), float(hours)
+
+
+def add_sleep_session(user_id, start_ts, end_ts):
+    """Record a session locally; it is pushed to MySQL on the next sync"""
+    db = get_connection()
+    with db:
+        cur = db.execute("""
+            INSERT INTO sleep_sessions (client_uuid, user_id, start_ts, end_ts, sleep_date, hours)
+            VALUES (?,?,?,?,?,?)
+        """, (str(uuid.uuid4()), user_id) + _interval_row(start_ts, end_ts))
+    db.close()
+    return cur.lastrowid
+
+
+def _session_rows(cur):
+    return [dict(row) for row in cur.fetchall()]
+
+
+def get_recent_sessions(user_id, limit=10):
+    """Most recent sessions, with local ids as session_id"""
+    db = get_connection()
+    sessions = _session_rows(db.execute("""
+        SELECT local_id AS session_id, sleep_date, start_ts, end_ts, hours
+        FROM sleep_sessions
+        WHERE user_id=?
+        ORDER BY sleep_date DESC, local_id DESC
+        LIMIT ?
+    """, (user_id, limit)))
+    db.close()
+    return sessions
+
+
+def get_sessions_page(user_id, after=None, limit=50):
+    """
+    One page of sessions, newest first - same contract as NyxDB.get_sessions_page.
+    Pass the returned cursor back as `after`; it is None on the last page.
+    """
+    db = get_connection()
+    if after is None:
+        cur = db.execute("""
+            SELECT local_id AS session_id, sleep_date, start_ts, end_ts, hours
+            FROM sleep_sessions
+            WHERE user_id=?
+            ORDER BY sleep_date DESC, local_id DESC
+            LIMIT ?
+        """, (user_id, limit))
+    else:
+        after_date, after_id = after
+        cur = db.execute("""
+            SELECT local_id AS session_id, sleep_date, start_ts, end_ts, hours
+            FROM sleep_sessions
+            WHERE user_id=?
+              AND (sleep_date < ? OR (sleep_date = ? AND local_id < ?))
+            ORDER BY sleep_date DESC, local_id DESC
+            LIMIT ?
+        """, (user_id, after_date, after_date, after_id, limit))
+    sessions = _session_rows(cur)
+    db.close()
+
+    cursor = None
+    if len(sessions) == limit:
+        last = sessions[-1]
+        cursor = (last['sleep_date'], last['session_id'])
+    return sessions, cursor
+
+
+def get_sessions_fingerprint(user_id):
+    """(count, newest local id) - changes whenever a session is added locally or pulled"""
+    db = get_connection()
+    row = db.execute(
+        "SELECT COUNT(*), COALESCE(MAX(local_id), 0) FROM sleep_sessions WHERE user_id=?",
+        (user_id,)
+    ).fetchone()
+    db.close()
+    return tuple(row)
+
+
+def _summary_row(total_hours, session_count):
+    total_hours = total_hours or 0
+    session_count = int(session_count or 0)
+    return {
+        'session_count': session_count,
+        'total_hours': total_hours,
+        'avg_hours': total_hours / session_count if session_count else 0,
+    }
+
+
+def get_sleep_summary(user_id):
+    db = get_connection()
+    row = db.execute(
+        "SELECT SUM(hours), COUNT(*) FROM sleep_sessions WHERE user_id=?", (user_id,)
+    ).fetchone()
+    db.close()
+    return _summary_row(*row)
+
+
+def get_monthly_summary(user_id, year, month):
+    first = date(year, month, 1)
+    after = date(year + month // 12, month % 12 + 1, 1)
+    db = get_connection()
+    row = db.execute(
+        "SELECT SUM(hours), COUNT(*) FROM sleep_sessions "
+        "WHERE user_id=? AND sleep_date >= ? AND sleep_date < ?",
+        (user_id, first.isoformat(), after.isoformat())
+    ).fetchone()
+    db.close()
+    return _summary_row(*row)
+
+
+# Same periods and bucket keys as the NyxDB backends' ROLLUP_BUCKET_SQL, computed on the fly
+ROLLUP_BUCKET_SQL = {
+    'day': "sleep_date",
+    'week': "date(sleep_date, '-' || strftime('%w', sleep_date) || ' days')",
+    'month': "substr(sleep_date, 1, 7)",
+    'dow': "CAST((CAST(strftime('%w', sleep_date) AS INTEGER) + 6) % 7 AS TEXT)",
+}
+WEEKEND_SQL = "strftime('%w', sleep_date) IN ('0', '6')"
+
+
+def get_rollups(user_id, period, limit=None):
+    """Rollup buckets for one period, oldest first - same shape as NyxDB.get_rollups"""
+    query = """
+        SELECT {bucket} AS bucket, SUM(hours) AS total_hours, COUNT(*) AS session_count,
+               SUM(CASE WHEN {weekend} THEN hours ELSE 0 END) AS weekend_hours,
+               SUM(CASE WHEN {weekend} THEN 1 ELSE 0 END) AS weekend_count
+        FROM sleep_sessions
+        WHERE user_id=?
+        GROUP BY bucket
+        ORDER BY bucket DESC
+    """.format(bucket=ROLLUP_BUCKET_SQL[period], weekend=WEEKEND_SQL)
+    params = (user_id,)
+    if limit is not None:
+        query += " LIMIT ?"
+        params += (limit,)
+    db = get_connection()
+    rows = _session_rows(db.execute(query, params))
+    db.close()
+    rows.reverse()
+    return rows
+
+
+# ---------- SYNC BOOKKEEPING ----------
+def get_pending_user_ids():
+    """Users with sessions or settings not yet pushed to MySQL"""
+    db = get_connection()
+    rows = db.execute("""
+        SELECT user_id FROM sleep_sessions WHERE synced=0
+        UNION
+        SELECT user_id FROM user_settings WHERE dirty=1
+    """).fetchall()
+    db.close()
+    return [row[0] for row in rows]
+
+
+def get_pending_sessions(user_id, limit=200):
+    db = get_connection()
+    sessions = _session_rows(db.execute("""
+        SELECT client_uuid, start_ts, end_ts
+        FROM sleep_sessions
+        WHERE synced=0 AND user_id=?
+        ORDER BY local_id
+        LIMIT ?
+    """, (user_id, limit)))
+    db.close()
+    return sessions
+
+
+def mark_sessions_synced(session_ids):
+    """session_ids maps client_uuid -> MySQL session_id"""
+    db = get_connection()
+    with db:
+        db.executemany(
+            "UPDATE sleep_sessions SET session_id=?, synced=1 WHERE client_uuid=?",
+            [(session_id, client_uuid) for client_uuid, session_id in session_ids.items()]
+        )
+    db.close()
+
+
+def merge_remote_sessions(user_id, sessions):
+    """
+    Store sessions pulled from MySQL. Sessions this device pushed are matched
+    by client_uuid; anything already known by session_id is skipped.
+    Returns how many sessions were new to this device.
+    """
+    added = 0
+    db = get_connection()
+    with db:
+        for s in sessions:
+            if s.get('client_uuid'):
+                cur = db.execute(
+                    "UPDATE sleep_sessions SET session_id=?, synced=1 WHERE client_uuid=?",
+                    (s['session_id'], s['client_uuid'])
+                )
+                if cur.rowcount:
+                    continue
+            cur = db.execute("""
+                INSERT OR IGNORE INTO sleep_sessions
+                (client_uuid, session_id, user_id, start_ts, end_ts, sleep_date, hours, synced)
+                VALUES (?,?,?,?,?,?,?,1)
+            """, (s.get('client_uuid'), s['session_id'], user_id)
+                 + _interval_row(s['start_ts'], s['end_ts']))
+            added += cur.rowcount
+    db.close()
+    return added
+
+
+def get_pull_watermark(user_id):
+    """Server created_at of the newest session pulled, or None before the first pull"""
+    db = get_connection()
+    row = db.execute("SELECT last_pulled_at FROM sync_state WHERE user_id=?", (user_id,)).fetchone()
+    db.close()
+    return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+
+def set_pull_watermark(user_id, created_at):
+    db = get_connection()
+    with db:
+        db.execute("""
+            INSERT INTO sync_state (user_id, last_pulled_at, last_synced_at) VALUES (?,?,?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                last_pulled_at=excluded.last_pulled_at, last_synced_at=excluded.last_synced_at
+        """, (user_id, str(created_at), _now()))
+    db.close()
+
+
+def pending_count(user_id):
+    """Unsynced sessions plus 1 if the settings are unsynced"""
+    db = get_connection()
+    row = db.execute("""
+        SELECT (SELECT COUNT(*) FROM sleep_sessions WHERE synced=0 AND user_id=?)
+             + (SELECT COUNT(*) FROM user_settings WHERE dirty=1 AND user_id=?)
+    """, (user_id, user_id)).fetchone()
+    db.close()
+    return row[0]
+
+
+# ---------- USER SETTINGS ----------
+def save_user_settings(user_id, bedtime_enabled, bedtime_hour, bedtime_minute, bedtime_ampm,
+                       alarm_enabled, alarm_hour, alarm_minute, alarm_ampm):
+    """Save settings locally and mark them for the next sync"""
+    db = get_connection()
+    with db:
+        db.execute("""
+            INSERT INTO user_settings
+            (user_id, bedtime_enabled, bedtime_hour, bedtime_minute, bedtime_ampm,
+             alarm_enabled, alarm_hour, alarm_minute, alarm_ampm, updated_at, dirty)
+            VALUES (?,?,?,?,?,?,?,?,?,?,1)
+            ON CONFLICT(user_id) DO UPDATE SET
+                bedtime_enabled=excluded.bedtime_enabled, bedtime_hour=excluded.bedtime_hour,
+                bedtime_minute=excluded.bedtime_minute, bedtime_ampm=excluded.bedtime_ampm,
+                alarm_enabled=excluded.alarm_enabled, alarm_hour=excluded.alarm_hour,
+                alarm_minute=excluded.alarm_minute, alarm_ampm=excluded.alarm_ampm,
+                updated_at=excluded.updated_at, revision=user_settings.revision + 1, dirty=1
+        """, (user_id, int(bool(bedtime_enabled)), bedtime_hour, bedtime_minute, bedtime_ampm,
+              int(bool(alarm_enabled)), alarm_hour, alarm_minute, alarm_ampm, _now()))
+    db.close()
+
+
+def get_user_settings(user_id):
+    db = get_connection()
+    row = db.execute("SELECT * FROM user_settings WHERE user_id=?", (user_id,)).fetchone()
+    db.close()
+    return dict(row) if row else None
+
+
+def mark_settings_synced(user_id, revision, remote_revision):
+    """Clear the dirty flag, unless the settings changed again (a new revision) while being pushed"""
+    db = get_connection()
+    with db:
+        db.execute(
+            "UPDATE user_settings SET dirty=0, remote_revision=? WHERE user_id=? AND revision=?",
+            (remote_revision, user_id, revision)
+        )
+    db.close()
+
+
+def apply_remote_settings(user_id, remote, expected_revision=None):
+    """
+    Overwrite local settings with the server's copy.
+    With expected_revision, nothing happens if the local settings changed
+    since they were read. Returns True if the settings were replaced.
+    """
+    values = [remote[field] for field in SETTINGS_FIELDS]
+    db = get_connection()
+    with db:
+        if expected_revision is None:
+            cur = db.execute("""
+                INSERT INTO user_settings
+                (user_id, bedtime_enabled, bedtime_hour, bedtime_minute, bedtime_ampm,
+                 alarm_enabled, alarm_hour, alarm_minute, alarm_ampm,
+                 updated_at, remote_revision, dirty)
+                VALUES (?,?,?,?,?,?,?,?,?,?,?,0)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    bedtime_enabled=excluded.bedtime_enabled, bedtime_hour=excluded.bedtime_hour,
+                    bedtime_minute=excluded.bedtime_minute, bedtime_ampm=excluded.bedtime_ampm,
+                    alarm_enabled=excluded.alarm_enabled, alarm_hour=excluded.alarm_hour,
+                    alarm_minute=excluded.alarm_minute, alarm_ampm=excluded.alarm_ampm,
+                    updated_at=excluded.updated_at, remote_revision=excluded.remote_revision,
+                    revision=user_settings.revision + 1, dirty=0
+            """, [user_id] + values + [_now(), remote['revision']])
+        else:
+            cur = db.execute("""
+                UPDATE user_settings SET
+                    bedtime_enabled=?, bedtime_hour=?, bedtime_minute=?, bedtime_ampm=?,
+                    alarm_enabled=?, alarm_hour=?, alarm_minute=?, alarm_ampm=?,
+                    updated_at=?, remote_revision=?, revision=revision + 1, dirty=0
+                WHERE user_id=? AND revision=?
+            """, values + [_now(), remote['revision'], user_id, expected_revision])
+    db.close()
+    return cur.rowcount > 0
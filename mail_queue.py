@@ -0,0 +1,258 @@
+"""
+Mail queue for Nyx Sleep Tracker
+Delivers email (password reset codes) on a background thread over one
+reused SMTP connection, retrying temporary failures with backoff and
+reporting each message's status back on the Kivy main thread
+"""
+
+import heapq
+import itertools
+import os
+import smtplib
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from kivy.clock import Clock
+
+# NYX_MAIL_TRANSPORT picks how mail leaves the app:
+#   smtp    - the real server below (default)
+#   debug   - a local debugging SMTP server, e.g. `python -m aiosmtpd -n -l localhost:1025`
+#   console - print messages instead of sending them
+MAIL_CONFIG = {
+    "transport": os.environ.get("NYX_MAIL_TRANSPORT", "smtp"),
+    "host": os.environ.get("NYX_SMTP_HOST", "smtp.gmail.com"),
+    "port": int(os.environ.get("NYX_SMTP_PORT", 587)),
+    # Credentials only ever come from the environment.
+    # For Gmail, use an app password: https://support.google.com/accounts/answer/185833
+    "username": os.environ.get("NYX_SMTP_USER"),
+    "password": os.environ.get("NYX_SMTP_PASSWORD"),
+    "sender": os.environ.get("NYX_MAIL_FROM") or os.environ.get("NYX_SMTP_USER"),
+    "timeout": float(os.environ.get("NYX_SMTP_TIMEOUT", 10)),
+}
+
+
+def build_message(sender, to, subject, body):
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = to
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+
+# ---------- TRANSPORTS ----------
+# A transport has send(msg) and close(); send raises on failure.
+
+class SMTPTransport:
+    """
+    Keeps one SMTP connection open between messages. A connection the
+    server dropped while idle is reopened once before giving up. Any
+    failure other than a rejected message closes the connection.
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._server = None
+
+    def send(self, msg):
+        reused = self._server is not None
+        try:
+            self._send(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            if not reused:
+                raise
+            self._send(msg)  # once more, on a fresh connection
+
+    def close(self):
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+
+    def _send(self, msg):
+        try:
+            self._connection().send_message(msg)
+        except smtplib.SMTPResponseException as e:
+            # A rejected message leaves the session usable, unless the server is closing it
+            if e.smtp_code == 421:
+                self.close()
+            raise
+        except Exception:
+            self.close()
+            raise
+
+    def _connection(self):
+        if self._server is None:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.starttls:
+                    server.starttls()
+                if self.username:
+                    server.login(self.username, self.password)
+            except Exception:
+                server.close()
+                raise
+            self._server = server
+        return self._server
+
+
+class ConsoleTransport:
+    """Prints messages instead of sending them - for development"""
+
+    def send(self, msg):
+        print(f"📧 To: {msg['To']} | {msg['Subject']}")
+        print(msg.get_payload()[0].get_payload())
+
+    def close(self):
+        pass
+
+
+def create_transport(config=MAIL_CONFIG):
+    name = config["transport"]
+    if name == "smtp":
+        if not config["username"] or not config["password"]:
+            print("⚠️ NYX_SMTP_USER / NYX_SMTP_PASSWORD not set - reset emails will fail "
+                  "(set NYX_MAIL_TRANSPORT=console to print them instead)")
+        return SMTPTransport(config["host"], config["port"], config["username"],
+                             config["password"], timeout=config["timeout"])
+    if name == "debug":
+        return SMTPTransport("localhost", int(os.environ.get("NYX_SMTP_DEBUG_PORT", 1025)),
+                             starttls=False, timeout=config["timeout"])
+    if name == "console":
+        return ConsoleTransport()
+    raise ValueError(f"Unknown mail transport '{name}' (expected smtp, debug or console)")
+
+
+def is_permanent(error):
+    """5xx replies and refused recipients will not succeed on a retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+# ---------- QUEUE ----------
+class MailJob:
+    """
+    One queued message. status goes queued -> sending -> sent, or through
+    retrying back to sending, ending at failed once attempts run out.
+    """
+
+    def __init__(self, msg, on_status=None):
+        self.msg = msg
+        self.on_status = on_status
+        self.status = 'queued'
+        self.attempts = 0
+        self.error = None
+        self.retry_in = None
+
+
+class MailQueue:
+    """
+    Single worker thread, so one SMTP connection serves every message in
+    order. Failed sends are retried after retry_delay seconds, doubling up
+    to max_retry_delay, at most max_attempts times. The connection is
+    closed after idle_close seconds with nothing to send.
+    """
+
+    def __init__(self, transport=None, sender=None, max_attempts=4, retry_delay=2,
+                 max_retry_delay=60, idle_close=30):
+        self.transport = transport or create_transport()
+        self.sender = sender or MAIL_CONFIG["sender"]
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.idle_close = idle_close
+        self._heap = []  # (ready_at, seq, job)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def send(self, to, subject, body, on_status=None):
+        """
+        Queue a message and return its MailJob at once. on_status(job, status)
+        is called on the main thread after every status change.
+        """
+        job = MailJob(build_message(self.sender, to, subject, body), on_status)
+        self._push(job, 0)
+        return job
+
+    def stop(self):
+        """Drop unsent mail and close the connection once the current send finishes"""
+        with self._cond:
+            self._stopping = True
+            self._heap.clear()
+            self._cond.notify()
+
+    # ---------- INTERNAL ----------
+    def _push(self, job, delay):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='nyx-mail', daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), job))
+            self._cond.notify()
+
+    def _next_job(self):
+        """Wait for a due job; None after idle_close seconds of nothing (or when stopping)"""
+        with self._cond:
+            deadline = time.monotonic() + self.idle_close
+            while not self._stopping:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    return heapq.heappop(self._heap)[2]
+                wake = self._heap[0][0] if self._heap else deadline
+                if wake <= now:
+                    return None
+                self._cond.wait(wake - now)
+            return None
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                # Idle: don't hold a connection the server will time out anyway
+                self.transport.close()
+                with self._cond:
+                    if self._stopping:
+                        return
+                continue
+            self._deliver(job)
+
+    def _deliver(self, job):
+        job.attempts += 1
+        self._report(job, 'sending')
+        try:
+            self.transport.send(job.msg)
+        except Exception as e:
+            job.error = e
+            if is_permanent(e) or job.attempts >= self.max_attempts:
+                print(f"❌ Email to {job.msg['To']} failed: {e}")
+                self._report(job, 'failed')
+                return
+            job.retry_in = min(self.retry_delay * 2 ** (job.attempts - 1), self.max_retry_delay)
+            print(f"⚠️ Email to {job.msg['To']} failed ({e}), retrying in {job.retry_in}s")
+            self._report(job, 'retrying')
+            self._push(job, job.retry_in)
+            return
+        job.error = None
+        self._report(job, 'sent')
+
+    def _report(self, job, status):
+        job.status = status
+        if job.on_status:
+            Clock.schedule_once(lambda dt: job.on_status(job, status))
+
+
+# App-wide mail queue
+mail_queue = MailQueue()
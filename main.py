@@ -2,31 +2,116 @@
 Nyx Sleep Tracker - Main Application
 Run this file to start the application
 """
+import time
+STARTUP_T0 = time.perf_counter()
+
 from kivy.clock import Clock
 from kivy.app import App
 from kivy.uix.screenmanager import ScreenManager
 from kivy.core.window import Window
 
-from Screens.login_screen import LoginScreen
-from Screens.register_screen import RegisterScreen
-from Screens.forgot_password_screen import ForgotPasswordScreen
-from Screens.tracker_screen import TrackerScreen
-from Screens.stats_screen import StatsScreen
-from Screens.graph_screen import GraphScreen
+import NyxDB as db
+from db_worker import dispatcher
+from mail_queue import mail_queue
+from reset_code_purge import reset_code_purger
+from settings_store import settings_store
+from sync_engine import sync_engine
 
 Window.size = (500, 800)
 Window.clearcolor = (0.05, 0.05, 0.15, 1)
 
+
+def _login_screen(**kwargs):
+    from Screens.login_screen import LoginScreen
+    return LoginScreen(**kwargs)
+
+
+def _register_screen(**kwargs):
+    from Screens.register_screen import RegisterScreen
+    return RegisterScreen(**kwargs)
+
+
+def _forgot_password_screen(**kwargs):
+    from Screens.forgot_password_screen import ForgotPasswordScreen
+    return ForgotPasswordScreen(**kwargs)
+
+
+def _tracker_screen(**kwargs):
+    from Screens.tracker_screen import TrackerScreen
+    return TrackerScreen(**kwargs)
+
+
+def _stats_screen(**kwargs):
+    from Screens.stats_screen import StatsScreen
+    return StatsScreen(**kwargs)
+
+
+def _graph_screen(**kwargs):
+    from Screens.graph_screen import GraphScreen
+    return GraphScreen(**kwargs)
+
+
+class LazyScreenManager(ScreenManager):
+    """
+    ScreenManager that builds each screen the first time it is needed -
+    when navigated to (current = name) or looked up with get_screen().
+    """
+
+    def __init__(self, **kwargs):
+        self._factories = {}
+        self.build_times = {}
+        super().__init__(**kwargs)
+
+    def register(self, name, factory):
+        self._factories[name] = factory
+
+    def get_screen(self, name):
+        factory = self._factories.pop(name, None)
+        if factory is not None:
+            start = time.perf_counter()
+            self.add_widget(factory(name=name))
+            self.build_times[name] = (time.perf_counter() - start) * 1000
+            print(f"⏱️  Built '{name}' screen in {self.build_times[name]:.0f} ms")
+        return super().get_screen(name)
+
+    def has_screen(self, name):
+        return name in self._factories or super().has_screen(name)
+
+
 class NyxApp(App):
     def build(self):
-        sm = ScreenManager()
-        sm.add_widget(LoginScreen(name="login"))
-        sm.add_widget(RegisterScreen(name="register"))
-        sm.add_widget(ForgotPasswordScreen(name="forgot_password"))
-        sm.add_widget(TrackerScreen(name="tracker"))
-        sm.add_widget(StatsScreen(name="stats"))
-        sm.add_widget(GraphScreen(name="graphs"))
+        self.build_started = time.perf_counter()
+        sm = LazyScreenManager()
+        sm.register("login", _login_screen)
+        sm.register("register", _register_screen)
+        sm.register("forgot_password", _forgot_password_screen)
+        sm.register("tracker", _tracker_screen)
+        sm.register("stats", _stats_screen)
+        sm.register("graphs", _graph_screen)
+        sm.current = "login"
+        self.build_finished = time.perf_counter()
+        Clock.schedule_once(self.report_startup, 0)
         return sm
 
+    def report_startup(self, dt):
+        """Print where cold start time went, up to the first rendered frame"""
+        now = time.perf_counter()
+        print("⏱️  Startup timing:")
+        print(f"   imports + window : {(self.build_started - STARTUP_T0) * 1000:.0f} ms")
+        print(f"   build()          : {(self.build_finished - self.build_started) * 1000:.0f} ms")
+        print(f"   first frame      : {(now - STARTUP_T0) * 1000:.0f} ms total")
+
+    def on_start(self):
+        reset_code_purger.start()
+
+    def on_stop(self):
+        # Let pending and queued writes finish before the pool goes away
+        settings_store.flush()
+        sync_engine.stop()
+        mail_queue.stop()
+        reset_code_purger.stop()
+        dispatcher.shutdown(wait=True)
+        db.close_pool()
+
 if __name__ == "__main__":
     NyxApp().run()
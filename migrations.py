@@ -0,0 +1,491 @@
+"""
+Schema migrations for Nyx Sleep Tracker (MySQL)
+Numbered migrations, applied in order and recorded in schema_migrations,
+so schema changes reach existing installs as well as new ones.
+
+Every migration checks the live schema before changing it. Databases set
+up before the runner existed have no version table; all migrations run
+against them and skip whatever is already there. MySQL commits DDL as it
+goes, so a migration that fails partway is simply run again.
+
+The SQLite backend builds its current schema directly (backends/sqlite_backend.py).
+"""
+
+import time
+from datetime import date, timedelta
+
+VERSION_TABLE = "schema_migrations"
+
+# mysql.connector errors for "this ALTER can't run with the requested ALGORITHM/LOCK"
+ALTER_NOT_SUPPORTED = (1845, 1846)
+
+
+class Migration:
+    def __init__(self, version, name, apply):
+        self.version = version
+        self.name = name
+        self.apply = apply
+
+    def __repr__(self):
+        return f"{self.version:03d} {self.name}"
+
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register the decorated function(m) as migration number `version`"""
+    def register(apply):
+        assert all(existing.version < version for existing in MIGRATIONS), "migrations must be numbered in order"
+        MIGRATIONS.append(Migration(version, name, apply))
+        return apply
+    return register
+
+
+class Migrator:
+    """
+    What a migration works with. Reads (has_column, has_index, scalar)
+    always hit the database; writes go through execute(), alter() and
+    backfill(), which only print their SQL when dry_run is set.
+    """
+
+    def __init__(self, connection, dry_run=False, chunk_size=5000, chunk_pause=0.0):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+
+    # ---------- SCHEMA CHECKS ----------
+    def has_table(self, table):
+        return self.scalar("""
+            SELECT COUNT(*) FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,)) > 0
+
+    def has_column(self, table, column):
+        return self.scalar("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """, (table, column)) > 0
+
+    def has_index(self, table, index):
+        return self.scalar("""
+            SELECT COUNT(*) FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        """, (table, index)) > 0
+
+    def scalar(self, sql, params=None):
+        self.cursor.execute(sql, params)
+        return self.cursor.fetchone()[0]
+
+    # ---------- CHANGES ----------
+    def execute(self, sql, params=None):
+        if self.dry_run:
+            print(self._show(sql, params))
+            return
+        self.cursor.execute(sql, params)
+
+    def alter(self, table, *clauses, online=True):
+        """
+        ALTER TABLE table with the given clauses. online=True asks for an
+        in-place build that keeps the table writable (ALGORITHM=INPLACE,
+        LOCK=NONE); if the server can't do that for these clauses it falls
+        back to a regular ALTER, which may copy the table.
+        """
+        sql = f"ALTER TABLE {table} " + ", ".join(clauses)
+        if online:
+            try:
+                self.execute(sql + ", ALGORITHM=INPLACE, LOCK=NONE")
+                return
+            except Exception as e:
+                if getattr(e, 'errno', None) not in ALTER_NOT_SUPPORTED:
+                    raise
+                print(f"⚠️  {table}: online ALTER not supported ({e.msg}), running a locking ALTER")
+        self.execute(sql)
+
+    def backfill(self, table, assignments, where, key):
+        """
+        UPDATE table SET assignments WHERE where, one chunk_size range of
+        the integer `key` column at a time with a commit after each, so
+        a large table is never locked in one long transaction
+        """
+        # In a dry run the table may not have been created yet
+        max_key = self.scalar(f"SELECT COALESCE(MAX({key}), 0) FROM {table}") if self.has_table(table) else 0
+        sql = f"UPDATE {table} SET {assignments} WHERE {key} > %s AND {key} <= %s AND ({where})"
+        chunks = -(-max_key // self.chunk_size)
+        if self.dry_run:
+            print(self._show(sql) + f"  -- {chunks} chunk(s) of {self.chunk_size} {key}s")
+            return 0
+
+        updated = 0
+        for low in range(0, max_key, self.chunk_size):
+            self.cursor.execute(sql, (low, low + self.chunk_size))
+            updated += self.cursor.rowcount
+            self.connection.commit()
+            if self.chunk_pause:
+                time.sleep(self.chunk_pause)  # let queued app queries through
+        print(f"   {table}: {updated} rows backfilled in {chunks} chunk(s)")
+        return updated
+
+    @staticmethod
+    def _show(sql, params=None):
+        text = "   " + " ".join(sql.split()) + ";"
+        if params:
+            text += f"  -- params {params}"
+        return text
+
+
+# ---------- RUNNER ----------
+def ensure_version_table(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            version INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms INT NOT NULL
+        )
+    """)
+
+
+def applied_versions(cursor):
+    cursor.execute(f"SELECT version FROM {VERSION_TABLE}")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def current_version(connection):
+    """Highest applied migration, 0 for a database the runner hasn't touched"""
+    cursor = connection.cursor()
+    try:
+        ensure_version_table(cursor)
+        return max(applied_versions(cursor), default=0)
+    finally:
+        cursor.close()
+
+
+def migrate(connection, target=None, dry_run=False, chunk_size=5000, chunk_pause=0.0):
+    """
+    Apply every pending migration up to target (default: the latest) on
+    connection, which must already be using the app's database.
+    dry_run prints the statements instead of running them; since nothing
+    changes, later migrations are planned against the unmigrated schema.
+    Returns the migrations applied (or that would be).
+    """
+    m = Migrator(connection, dry_run, chunk_size, chunk_pause)
+    if dry_run and not m.has_table(VERSION_TABLE):
+        done = set()
+    else:
+        ensure_version_table(m.cursor)
+        done = applied_versions(m.cursor)
+    pending = [mig for mig in MIGRATIONS
+               if mig.version not in done and (target is None or mig.version <= target)]
+
+    if not pending:
+        print(f"✅ Schema is up to date (version {max(done, default=0)})")
+
+    try:
+        for mig in pending:
+            print(f"{'📝 Would apply' if dry_run else '🔄 Applying'} migration {mig}")
+            start = time.perf_counter()
+            mig.apply(m)
+            if dry_run:
+                continue
+            elapsed_ms = int((time.perf_counter() - start) * 1000)
+            m.cursor.execute(
+                f"INSERT INTO {VERSION_TABLE} (version, name, duration_ms) VALUES (%s, %s, %s)",
+                (mig.version, mig.name, elapsed_ms)
+            )
+            connection.commit()
+            print(f"✅ Migration {mig} applied in {elapsed_ms} ms")
+    finally:
+        m.cursor.close()
+    return pending
+
+
+# ---------- MIGRATIONS ----------
+# Never edit one that has shipped - add a new number instead.
+
+@migration(1, "create base tables")
+def create_base_tables(m):
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) NOT NULL UNIQUE,
+            password VARCHAR(255) NOT NULL,
+            email VARCHAR(100) NOT NULL UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_username (username),
+            INDEX idx_email (email)
+        )
+    """)
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS sleep_sessions (
+            session_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            year INT NOT NULL,
+            month INT NOT NULL,
+            day INT NOT NULL,
+            hours DECIMAL(5,2) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+            INDEX idx_user_date (user_id, year, month, day)
+        )
+    """)
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS user_settings (
+            setting_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL UNIQUE,
+            bedtime_enabled TINYINT(1) DEFAULT 0,
+            bedtime_hour VARCHAR(2) DEFAULT '10',
+            bedtime_minute VARCHAR(2) DEFAULT '00',
+            bedtime_ampm VARCHAR(2) DEFAULT 'PM',
+            alarm_enabled TINYINT(1) DEFAULT 0,
+            alarm_hour VARCHAR(2) DEFAULT '06',
+            alarm_minute VARCHAR(2) DEFAULT '30',
+            alarm_ampm VARCHAR(2) DEFAULT 'AM',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+    """)
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS password_resets (
+            reset_id INT AUTO_INCREMENT PRIMARY KEY,
+            email VARCHAR(100) NOT NULL,
+            code VARCHAR(6) NOT NULL,
+            expires_at DATETIME NOT NULL,
+            used TINYINT(1) DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_email_code (email, code)
+        )
+    """)
+
+
+# Tables created before sessions had start/end times derived sleep_date from
+# year/month/day; only needed while upgrading those
+LEGACY_SLEEP_DATE_EXPR = "MAKEDATE(year, 1) + INTERVAL (month - 1) MONTH + INTERVAL (day - 1) DAY"
+
+
+@migration(2, "sleep_sessions.sleep_date index")
+def add_sleep_date(m):
+    if m.has_column('sleep_sessions', 'start_ts'):
+        return  # already on intervals (migration 5), which has its own sleep_date
+    if not m.has_column('sleep_sessions', 'sleep_date'):
+        # A stored generated column needs a table copy; MySQL can't add it in place
+        m.alter('sleep_sessions', f"ADD COLUMN sleep_date DATE AS ({LEGACY_SLEEP_DATE_EXPR}) STORED",
+                online=False)
+    if not m.has_index('sleep_sessions', 'idx_user_sleep_date'):
+        m.alter('sleep_sessions', "ADD INDEX idx_user_sleep_date (user_id, sleep_date, session_id)")
+
+
+@migration(3, "sleep_rollups table")
+def create_rollups(m):
+    if m.has_table('sleep_rollups'):
+        return
+    m.execute("""
+        CREATE TABLE sleep_rollups (
+            user_id INT NOT NULL,
+            period VARCHAR(5) NOT NULL,
+            bucket VARCHAR(10) NOT NULL,
+            total_hours DECIMAL(12,2) NOT NULL DEFAULT 0,
+            session_count INT NOT NULL DEFAULT 0,
+            weekend_hours DECIMAL(12,2) NOT NULL DEFAULT 0,
+            weekend_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, period, bucket),
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+    """)
+    # Existing installs have sessions but no rollups yet
+    if m.has_table('sleep_sessions') and m.scalar("SELECT EXISTS(SELECT 1 FROM sleep_sessions)"):
+        if m.dry_run:
+            print("   -- rebuild rollups for existing sessions (NyxDB.rebuild_rollups)")
+            return
+        import NyxDB
+        NyxDB.configure('mysql')  # migrations are MySQL-only, whatever NYX_DB_BACKEND says
+        try:
+            users = NyxDB.rebuild_rollups()
+        finally:
+            NyxDB.close_pool()
+        print(f"   Rollups built for {users} existing users")
+
+
+@migration(4, "sleep_sessions.client_uuid")
+def add_client_uuid(m):
+    if not m.has_column('sleep_sessions', 'client_uuid'):
+        m.alter('sleep_sessions', "ADD COLUMN client_uuid CHAR(36) NULL AFTER user_id",
+                "ADD UNIQUE KEY uq_client_uuid (client_uuid)")
+
+
+# A session is its start and end time. sleep_date (the day it started) and
+# hours are derived, so range queries walk a single (user_id, sleep_date) index
+SLEEP_DATE_EXPR = "DATE(start_ts)"
+HOURS_EXPR = "TIMESTAMPDIFF(SECOND, start_ts, end_ts) / 3600"
+
+
+@migration(5, "sleep_sessions start_ts/end_ts")
+def migrate_to_intervals(m):
+    """
+    Replace year/month/day/hours with start_ts/end_ts. Old rows never had
+    a time of day, so they start at midnight of their date and last `hours`.
+    """
+    if m.has_column('sleep_sessions', 'start_ts') and not m.has_column('sleep_sessions', 'year'):
+        return
+    if not m.has_column('sleep_sessions', 'start_ts'):
+        m.alter('sleep_sessions', "ADD COLUMN start_ts DATETIME NULL AFTER user_id",
+                "ADD COLUMN end_ts DATETIME NULL AFTER start_ts")
+
+    m.backfill('sleep_sessions',
+               "start_ts = TIMESTAMP(sleep_date), "
+               "end_ts = TIMESTAMP(sleep_date) + INTERVAL ROUND(hours * 3600) SECOND",
+               "start_ts IS NULL", key='session_id')
+
+    # Same sleep_date and hours as before, now computed from the interval.
+    # Indexes on the dropped columns go too; idx_user_sleep_date is rebuilt.
+    # Adding stored generated columns copies the table (reads still work).
+    m.alter('sleep_sessions',
+            *[f"DROP INDEX {index}" for index in ('idx_user_date', 'idx_user_sleep_date')
+              if m.has_index('sleep_sessions', index)],
+            "DROP COLUMN sleep_date", "DROP COLUMN hours",
+            "DROP COLUMN year", "DROP COLUMN month", "DROP COLUMN day",
+            "MODIFY start_ts DATETIME NOT NULL",
+            "MODIFY end_ts DATETIME NOT NULL",
+            f"ADD COLUMN sleep_date DATE AS ({SLEEP_DATE_EXPR}) STORED AFTER end_ts",
+            f"ADD COLUMN hours DECIMAL(5,2) AS ({HOURS_EXPR}) STORED AFTER sleep_date",
+            "ADD INDEX idx_user_sleep_date (user_id, sleep_date, session_id)",
+            online=False)
+
+
+@migration(6, "covering indexes")
+def add_covering_indexes(m):
+    """
+    One index per NyxDB access path, holding every column the query reads
+    so it never touches the table rows (check with explain_queries.py):
+      idx_sessions_by_date - date-ordered session reads, paging, fingerprint
+      idx_sessions_by_id   - incremental sync pulls (session_id > n)
+      idx_resets_lookup    - reset code checks, newest first
+    The users indexes duplicated the UNIQUE keys on the same columns.
+    """
+    if not m.has_index('sleep_sessions', 'idx_sessions_by_date'):
+        # Added before the old index goes, so the user_id foreign key always has one
+        m.alter('sleep_sessions',
+                "ADD INDEX idx_sessions_by_date (user_id, sleep_date, session_id, start_ts, end_ts, hours)",
+                "ADD INDEX idx_sessions_by_id (user_id, session_id, client_uuid, start_ts, end_ts)")
+    if m.has_index('sleep_sessions', 'idx_user_sleep_date'):
+        m.alter('sleep_sessions', "DROP INDEX idx_user_sleep_date")
+
+    if not m.has_index('password_resets', 'idx_resets_lookup'):
+        m.alter('password_resets', "ADD INDEX idx_resets_lookup (email, code, used, expires_at)")
+    if m.has_index('password_resets', 'idx_email_code'):
+        m.alter('password_resets', "DROP INDEX idx_email_code")
+
+    for index in ('idx_username', 'idx_email'):
+        if m.has_index('users', index):
+            m.alter('users', f"DROP INDEX {index}")
+
+
+@migration(7, "password_resets expiry index")
+def add_reset_expiry_index(m):
+    """Lets NyxDB.purge_reset_codes find expired codes without a scan"""
+    if not m.has_index('password_resets', 'idx_resets_expiry'):
+        m.alter('password_resets', "ADD INDEX idx_resets_expiry (expires_at)")
+
+
+@migration(8, "rate_limits table")
+def create_rate_limits(m):
+    """Token buckets for rate_limiter.DatabaseStore (NYX_RATE_LIMIT_STORE=database)"""
+    m.execute("""
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            bucket_key VARCHAR(191) PRIMARY KEY,
+            allowed TINYINT(1) NOT NULL DEFAULT 1,
+            tokens DOUBLE NOT NULL,
+            updated_at DOUBLE NOT NULL,
+            INDEX idx_rate_limits_updated (updated_at)
+        )
+    """)
+
+
+@migration(9, "sync by server time and settings revisions")
+def sync_by_server_time(m):
+    """
+    Pulls page by (created_at, session_id) instead of session_id, which
+    commits out of order under concurrent pushes: idx_sessions_by_created
+    replaces idx_sessions_by_id. user_settings.revision counts saves so
+    devices detect remote edits without comparing clocks.
+    """
+    if not m.has_index('sleep_sessions', 'idx_sessions_by_created'):
+        m.alter('sleep_sessions',
+                "ADD INDEX idx_sessions_by_created (user_id, created_at, session_id, client_uuid, start_ts, end_ts)")
+    if m.has_index('sleep_sessions', 'idx_sessions_by_id'):
+        m.alter('sleep_sessions', "DROP INDEX idx_sessions_by_id")
+
+    if not m.has_column('user_settings', 'revision'):
+        m.alter('user_settings', "ADD COLUMN revision INT NOT NULL DEFAULT 0 AFTER alarm_ampm")
+
+
+# ---------- PASSWORD RESET PARTITIONS ----------
+# Optional (setup_database.py --partition-resets): one RANGE partition per
+# day of expires_at, named p<YYYYMMDD> for the day it holds, plus a
+# p_future catch-all. reset_code_purge then drops whole days instead of
+# deleting rows. MySQL requires the partition column in every unique key,
+# so the primary key becomes (reset_id, expires_at).
+
+def _day_partition(day):
+    return f"PARTITION p{day:%Y%m%d} VALUES LESS THAN ('{day + timedelta(days=1)}')"
+
+
+def reset_partition_days(cursor):
+    """Days with their own password_resets partition, oldest first - empty if not partitioned"""
+    cursor.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'password_resets'
+          AND PARTITION_NAME IS NOT NULL AND PARTITION_NAME != 'p_future'
+    """)
+    return sorted(date(int(name[1:5]), int(name[5:7]), int(name[7:9]))
+                  for (name,) in cursor.fetchall())
+
+
+def partition_password_resets(m, days_ahead=7):
+    """Partition password_resets by day; everything already there lands in yesterday's partition"""
+    if reset_partition_days(m.cursor):
+        print("ℹ️  password_resets is already partitioned")
+        return
+    today = date.today()
+    partitions = [f"PARTITION p{today - timedelta(days=1):%Y%m%d} VALUES LESS THAN ('{today}')"]
+    partitions += [_day_partition(today + timedelta(days=n)) for n in range(days_ahead + 1)]
+    partitions.append("PARTITION p_future VALUES LESS THAN (MAXVALUE)")
+
+    # Both rebuild the table; password_resets only holds recent codes, so it is small
+    m.alter('password_resets', "DROP PRIMARY KEY", "ADD PRIMARY KEY (reset_id, expires_at)", online=False)
+    m.execute("ALTER TABLE password_resets PARTITION BY RANGE COLUMNS (expires_at) (%s)"
+              % ", ".join(partitions))
+    if not m.dry_run:
+        print(f"✅ 'password_resets' partitioned by day ({len(partitions)} partitions)")
+
+
+def rotate_reset_partitions(cursor, cutoff, days_ahead=7):
+    """
+    Drop the partitions whose rows all expired before cutoff and make sure
+    the next days_ahead days have one. Returns (dropped, added) counts.
+    """
+    days = reset_partition_days(cursor)
+    if not days:
+        return 0, 0
+
+    expired = [day for day in days if day + timedelta(days=1) <= cutoff.date()]
+    if len(expired) == len(days):
+        expired.pop()  # keep one, RANGE partitioning needs a partition below p_future
+    if expired:
+        cursor.execute("ALTER TABLE password_resets DROP PARTITION %s"
+                       % ", ".join(f"p{day:%Y%m%d}" for day in expired))
+
+    # Split new days off p_future, which is empty while the rotation keeps ahead
+    last = max(days)
+    new_days = [last + timedelta(days=n)
+                for n in range(1, (date.today() + timedelta(days=days_ahead) - last).days + 1)]
+    if new_days:
+        cursor.execute(
+            "ALTER TABLE password_resets REORGANIZE PARTITION p_future INTO (%s, "
+            "PARTITION p_future VALUES LESS THAN (MAXVALUE))"
+            % ", ".join(_day_partition(day) for day in new_days)
+        )
+    return len(expired), len(new_days)
@@ -0,0 +1,131 @@
+"""
+Password hashing for Nyx Sleep Tracker
+Salted PBKDF2 or scrypt hashes with a tunable cost. The key derivation runs
+on a small bounded thread pool (hashlib releases the GIL), so a burst of
+logins cannot eat every CPU or pile up unbounded work
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Raising a cost only affects new hashes; older ones are upgraded on the
+# next successful login (see needs_rehash)
+HASH_CONFIG = {
+    "algorithm": os.environ.get("NYX_PASSWORD_ALGORITHM", "pbkdf2_sha256"),  # or 'scrypt'
+    "iterations": int(os.environ.get("NYX_PASSWORD_ITERATIONS", 310000)),   # pbkdf2_sha256
+    "scrypt_n": int(os.environ.get("NYX_PASSWORD_SCRYPT_N", 2 ** 14)),       # scrypt
+    "workers": int(os.environ.get("NYX_PASSWORD_WORKERS", 2)),
+    "max_pending": int(os.environ.get("NYX_PASSWORD_MAX_PENDING", 32)),
+}
+
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+
+class HasherBusy(Exception):
+    """Too many hash/verify calls already waiting for the pool"""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+class PasswordHasher:
+    """
+    Encoded hashes look like
+        pbkdf2_sha256$<iterations>$<salt>$<hash>
+        scrypt$<n>$<r>$<p>$<salt>$<hash>
+    Anything else is treated as a legacy plaintext password: it still
+    verifies, and needs_rehash() is always True for it.
+
+    hash() and verify() block the calling (worker) thread while the pool
+    does the work. At most max_pending calls may wait at once; beyond that
+    they raise HasherBusy after busy_timeout seconds instead of queueing.
+    """
+
+    def __init__(self, algorithm='pbkdf2_sha256', iterations=310000, scrypt_n=2 ** 14,
+                 workers=2, max_pending=32, busy_timeout=5):
+        if algorithm not in ('pbkdf2_sha256', 'scrypt'):
+            raise ValueError(f"Unknown password algorithm '{algorithm}'")
+        self.algorithm = algorithm
+        self.iterations = iterations
+        self.scrypt_n = scrypt_n
+        self.busy_timeout = busy_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nyx-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._dummy = None
+
+    # ---------- PUBLIC ----------
+    def hash(self, password):
+        """New salted hash of password with the current algorithm and cost"""
+        return self._run(self._hash, password)
+
+    def verify(self, password, encoded):
+        """
+        True if password matches encoded. encoded=None (unknown user)
+        still spends the same time, so usernames cannot be probed by timing.
+        """
+        if encoded is None:
+            if self._dummy is None:
+                self._dummy = self._run(self._hash, os.urandom(16).hex())
+            self._run(self._check, password, self._dummy)
+            return False
+        return self._run(self._check, password, encoded)
+
+    def needs_rehash(self, encoded):
+        """True if encoded is plaintext or uses another algorithm or cost"""
+        parts = encoded.split('$')
+        if self.algorithm == 'pbkdf2_sha256':
+            return not (len(parts) == 4 and parts[0] == 'pbkdf2_sha256'
+                        and parts[1] == str(self.iterations))
+        return not (len(parts) == 6 and parts[0] == 'scrypt' and parts[1] == str(self.scrypt_n)
+                    and parts[2] == str(SCRYPT_R) and parts[3] == str(SCRYPT_P))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    # ---------- INTERNAL ----------
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.busy_timeout):
+            raise HasherBusy("Password hashing is overloaded, try again")
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def _hash(self, password, salt=None):
+        salt = salt or os.urandom(16)
+        if self.algorithm == 'pbkdf2_sha256':
+            digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, self.iterations)
+            return f"pbkdf2_sha256${self.iterations}${_b64(salt)}${_b64(digest)}"
+        digest = hashlib.scrypt(password.encode(), salt=salt, n=self.scrypt_n, r=SCRYPT_R,
+                                p=SCRYPT_P, maxmem=256 * self.scrypt_n * SCRYPT_R)
+        return f"scrypt${self.scrypt_n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+    @staticmethod
+    def _check(password, encoded):
+        parts = encoded.split('$')
+        if len(parts) == 4 and parts[0] == 'pbkdf2_sha256':
+            _, iterations, salt, expected = parts
+            digest = hashlib.pbkdf2_hmac('sha256', password.encode(), _unb64(salt), int(iterations))
+        elif len(parts) == 6 and parts[0] == 'scrypt':
+            _, n, r, p, salt, expected = parts
+            n, r, p = int(n), int(r), int(p)
+            digest = hashlib.scrypt(password.encode(), salt=_unb64(salt), n=n, r=r, p=p,
+                                    maxmem=256 * n * r)
+        else:
+            # Legacy plaintext row from before passwords were hashed
+            return hmac.compare_digest(password.encode(), encoded.encode())
+        return hmac.compare_digest(digest, _unb64(expected))
+
+
+# Shared by NyxDB
+password_hasher = PasswordHasher(**HASH_CONFIG)
@@ -0,0 +1,184 @@
+"""
+Rate limiting for Nyx Sleep Tracker
+Token buckets for login and password reset attempts, checked before any
+database query or email goes out. Each attempt is charged to the
+username/email it targets and to this device, so neither guessing one
+account nor spraying many of them from one machine gets far.
+"""
+
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+import NyxDB as db
+
+# NYX_RATE_LIMIT_STORE picks where buckets live:
+#   memory   - this process only (default)
+#   database - the rate_limits table, shared by every app instance
+RATE_LIMIT_CONFIG = {
+    "store": os.environ.get("NYX_RATE_LIMIT_STORE", "memory"),
+    "max_keys": int(os.environ.get("NYX_RATE_LIMIT_MAX_KEYS", 10000)),   # memory store LRU size
+}
+
+# action: (burst, seconds to earn back one attempt)
+RATE_LIMITS = {
+    'login': (5, 60),
+    'reset_send': (3, 600),
+    'reset_verify': (5, 60),
+}
+# Same, for everything this device tries, whatever the account
+DEVICE_LIMITS = {
+    'login': (20, 10),
+    'reset_send': (10, 60),
+    'reset_verify': (20, 10),
+}
+
+DEVICE = socket.gethostname()
+
+
+class RateLimited(Exception):
+    """Too many attempts; retry_after is the wait in seconds"""
+
+    def __init__(self, action, retry_after):
+        super().__init__(f"Too many {action} attempts, try again in {retry_after:.0f}s")
+        self.action = action
+        self.retry_after = retry_after
+
+
+# ---------- STORES ----------
+# A store has take(key, capacity, refill_rate) -> (allowed, retry_after),
+# refund(key, capacity) to give a taken token back, and reset(key).
+
+class MemoryStore:
+    """
+    Buckets in a dict, least recently used first. Past max_keys the oldest
+    bucket is forgotten - by then it has usually refilled anyway.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill_rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / refill_rate
+
+    def refund(self, key, capacity):
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(capacity, tokens + 1), updated)
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+class DatabaseStore:
+    """
+    Buckets in the rate_limits table, so several app processes share them.
+    If the database can't be reached it falls back to a memory store
+    rather than letting every attempt through.
+    """
+
+    def __init__(self, prune_every=1000, max_keys=10000):
+        self.prune_every = prune_every
+        self._fallback = MemoryStore(max_keys)
+        self._takes = 0
+        self._longest_refill = 0
+
+    def take(self, key, capacity, refill_rate):
+        now = time.time()
+        try:
+            allowed, tokens = db.take_rate_limit_token(key, capacity, refill_rate, now)
+        except Exception as e:
+            print(f"⚠️ Rate limit store unreachable, limiting locally: {e}")
+            return self._fallback.take(key, capacity, refill_rate)
+
+        self._takes += 1
+        self._longest_refill = max(self._longest_refill, capacity / refill_rate)
+        if self._takes % self.prune_every == 0:
+            # Buckets idle for a full refill are as good as new
+            try:
+                db.purge_rate_limits(now - self._longest_refill)
+            except Exception as e:
+                print(f"⚠️ Could not prune rate limits: {e}")
+        return allowed, 0 if allowed else (1 - tokens) / refill_rate
+
+    def refund(self, key, capacity):
+        try:
+            db.refund_rate_limit_token(key, capacity)
+        except Exception as e:
+            print(f"⚠️ Rate limit store unreachable, refunding locally: {e}")
+            self._fallback.refund(key, capacity)
+
+    def reset(self, key):
+        self._fallback.reset(key)
+        try:
+            db.reset_rate_limit(key)
+        except Exception as e:
+            print(f"⚠️ Could not reset rate limit {key}: {e}")
+
+
+def create_store(config=RATE_LIMIT_CONFIG):
+    name = config["store"]
+    if name == "memory":
+        return MemoryStore(config["max_keys"])
+    if name == "database":
+        return DatabaseStore(max_keys=config["max_keys"])
+    raise ValueError(f"Unknown rate limit store '{name}' (expected memory or database)")
+
+
+# ---------- LIMITER ----------
+class RateLimiter:
+    """
+    check(action, identifier) spends one attempt from the device's and the
+    identifier's buckets, raising RateLimited when either is empty. A
+    rejected attempt costs nothing: tokens already taken are refunded, so
+    a device over its limit can't drain (and lock out) someone's account.
+    Call it first thing in the worker function, before any query.
+    reset(action, identifier) refills the identifier's bucket, e.g. after a
+    successful login, so earlier typos don't count against the next one.
+    """
+
+    def __init__(self, store=None, limits=RATE_LIMITS, device_limits=DEVICE_LIMITS, device=DEVICE):
+        self.store = store or create_store()
+        self.limits = limits
+        self.device_limits = device_limits
+        self.device = device
+
+    def check(self, action, identifier):
+        # Device first, so a device over its limit never touches the account bucket
+        buckets = []
+        if action in self.device_limits:
+            buckets.append((f"{action}:device:{self.device}", self.device_limits[action]))
+        buckets.append((f"{action}:id:{identifier.strip().lower()}", self.limits[action]))
+
+        taken = []
+        for key, (burst, seconds) in buckets:
+            allowed, retry_after = self.store.take(key, burst, 1 / seconds)
+            if not allowed:
+                for taken_key, capacity in taken:
+                    self.store.refund(taken_key, capacity)
+                print(f"🚫 Rate limited {key} for {retry_after:.0f}s")
+                raise RateLimited(action, retry_after)
+            taken.append((key, burst))
+
+    def reset(self, action, identifier):
+        self.store.reset(f"{action}:id:{identifier.strip().lower()}")
+
+
+# App-wide rate limiter
+rate_limiter = RateLimiter()
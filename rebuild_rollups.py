@@ -0,0 +1,44 @@
+"""
+Nyx Sleep Tracker - Rollup Rebuild Script
+Recomputes the sleep_rollups table from sleep_sessions
+
+Usage:
+  python rebuild_rollups.py                      (all users)
+  python rebuild_rollups.py --username <username>
+"""
+
+import sys
+import time
+
+import NyxDB as db
+
+
+def main():
+    user_id = None
+    
+    if len(sys.argv) >= 3 and sys.argv[1] == "--username":
+        user = db.get_user_by_name(sys.argv[2])
+        if not user:
+            print(f"❌ User '{sys.argv[2]}' not found")
+            return 1
+        user_id = user['user_id']
+    elif len(sys.argv) > 1:
+        print(__doc__)
+        return 1
+    
+    print("🔄 Rebuilding sleep rollups...")
+    start = time.perf_counter()
+    try:
+        users = db.rebuild_rollups(user_id)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return 1
+    finally:
+        db.close_pool()
+    
+    print(f"✅ Rebuilt rollups for {users} user(s) in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Reset code cleanup for Nyx Sleep Tracker
+Deletes password reset codes once they have been expired for the retention
+window, on a timer while the app runs (reset_code_purger) or from cron.
+A partitioned password_resets table (setup_database.py --partition-resets)
+is trimmed by dropping whole days, the rest in small delete batches.
+
+Usage:
+  python reset_code_purge.py
+  python reset_code_purge.py --retention-hours 48
+"""
+
+import os
+if __name__ == "__main__":
+    # Run from cron: argparse below owns the command line, not Kivy.
+    # main.py imports this module, so the app keeps Kivy's own arguments.
+    os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+from kivy.clock import Clock
+
+import NyxDB as db
+from db_worker import dispatcher
+
+# Expired codes are kept retention_hours before they go, e.g. for auditing
+PURGE_CONFIG = {
+    "retention_hours": float(os.environ.get("NYX_RESET_RETENTION_HOURS", 24)),
+    "interval": float(os.environ.get("NYX_RESET_PURGE_INTERVAL", 3600)),   # seconds between runs in the app
+    "batch_size": int(os.environ.get("NYX_RESET_PURGE_BATCH", 500)),
+    "partitions_ahead": int(os.environ.get("NYX_RESET_PARTITIONS_AHEAD", 7)),
+}
+
+
+def purge(retention_hours=24, batch_size=500, partitions_ahead=7):
+    """One cleanup pass. Returns counts of partitions dropped/added and rows deleted."""
+    retention = timedelta(hours=retention_hours)
+    result = {'partitions_dropped': 0, 'partitions_added': 0, 'deleted': 0}
+
+    if db.get_backend().name == 'mysql':
+        import migrations
+        connection = db.get_connection()
+        try:
+            cursor = connection.cursor()
+            dropped, added = migrations.rotate_reset_partitions(
+                cursor, datetime.now() - retention, partitions_ahead)
+            result['partitions_dropped'] = dropped
+            result['partitions_added'] = added
+        finally:
+            connection.close()
+
+    # Whatever the dropped partitions didn't cover (or everything, unpartitioned)
+    result['deleted'] = db.purge_reset_codes(retention, batch_size)
+    return result
+
+
+class ResetCodePurger:
+    """
+    Runs purge() on the database dispatcher every `interval` seconds while
+    the app is open, the first time start_delay seconds after start() so
+    it stays out of the way of startup
+    """
+
+    def __init__(self, interval=3600, start_delay=60, **options):
+        self.interval = interval
+        self.start_delay = start_delay
+        self.options = options
+        self._event = None
+        self._running = False
+
+    def start(self):
+        if self._event is None:
+            self._event = Clock.schedule_once(self._run, self.start_delay)
+
+    def stop(self):
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+
+    # ---------- INTERNAL ----------
+    def _run(self, *args):
+        self._event = Clock.schedule_once(self._run, self.interval)
+        if self._running:
+            return
+        self._running = True
+        dispatcher.submit(
+            purge, **self.options,
+            write=True,
+            on_success=self._on_done,
+            on_error=self._on_failed
+        )
+
+    def _on_done(self, result):
+        self._running = False
+        if any(result.values()):
+            print(f"🧹 Reset codes purged: {result['deleted']} rows, "
+                  f"{result['partitions_dropped']} partitions dropped, "
+                  f"{result['partitions_added']} added")
+
+    def _on_failed(self, error):
+        # Offline is fine - the next run catches up
+        self._running = False
+        print(f"⚠️ Reset code purge failed: {error}")
+
+
+# App-wide purge job
+reset_code_purger = ResetCodePurger(
+    interval=PURGE_CONFIG["interval"],
+    retention_hours=PURGE_CONFIG["retention_hours"],
+    batch_size=PURGE_CONFIG["batch_size"],
+    partitions_ahead=PURGE_CONFIG["partitions_ahead"],
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete expired password reset codes")
+    parser.add_argument("--retention-hours", type=float, default=PURGE_CONFIG["retention_hours"],
+                        help="keep codes this long after they expire")
+    parser.add_argument("--batch-size", type=int, default=PURGE_CONFIG["batch_size"],
+                        help="rows per delete transaction")
+    args = parser.parse_args()
+
+    print("🧹 Purging expired reset codes...")
+    start = time.perf_counter()
+    try:
+        result = purge(args.retention_hours, args.batch_size, PURGE_CONFIG["partitions_ahead"])
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return 1
+    finally:
+        db.close_pool()
+
+    print(f"✅ Deleted {result['deleted']} codes, dropped {result['partitions_dropped']} and added "
+          f"{result['partitions_added']} partitions in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
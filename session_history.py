@@ -0,0 +1,153 @@
+"""
+Session history list for Nyx Sleep Tracker
+A RecycleView over a user's whole sleep history: pages are fetched in the
+background as the list nears its end, and only enough row widgets for the
+visible area are ever created, however long the history is
+"""
+
+from kivy.clock import Clock
+from kivy.graphics import Color, RoundedRectangle
+from kivy.properties import BooleanProperty, StringProperty
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.label import Label
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview import RecycleView
+
+from db_worker import dispatcher
+import local_store
+
+
+class SessionRow(BoxLayout):
+    """One recycled history row; RecycleView sets date_text/hours_text from its data"""
+
+    date_text = StringProperty('')
+    hours_text = StringProperty('')
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation='horizontal', padding=15, spacing=10, **kwargs)
+
+        with self.canvas.before:
+            Color(0.12, 0.12, 0.18, 1)
+            self.rect = RoundedRectangle(radius=[10])
+        self.bind(pos=self.update_rect, size=self.update_rect)
+
+        date_label = Label(font_size=16, color=(0.8, 0.8, 0.9, 1))
+        hours_label = Label(font_size=18, color=(0.6, 0.8, 0.6, 1), size_hint_x=0.4)
+        self.bind(date_text=date_label.setter('text'), hours_text=hours_label.setter('text'))
+        self.add_widget(date_label)
+        self.add_widget(hours_label)
+
+    def update_rect(self, *args):
+        self.rect.pos = self.pos
+        self.rect.size = self.size
+
+
+def session_row_data(session):
+    """RecycleView data entry for a session row"""
+    return {
+        'date_text': str(session['sleep_date']),
+        'hours_text': f"{session['hours']:.1f} hrs",
+    }
+
+
+class SessionHistory(RecycleView):
+    """
+    Lazily paged, newest-first session list.
+
+    load_page(user_id, after, limit) -> (sessions, cursor) is the keyset
+    paging call (local_store.get_sessions_page by default) and runs on the
+    database dispatcher. show_user() starts from the first page; the next
+    one is requested whenever fewer than prefetch_rows rows are left below
+    the visible area. loading is True while a page is in flight.
+    """
+
+    loading = BooleanProperty(False)
+
+    def __init__(self, load_page=local_store.get_sessions_page, page_size=50,
+                 row_height=60, prefetch_rows=10, **kwargs):
+        super().__init__(**kwargs)
+        self.load_page = load_page
+        self.page_size = page_size
+        self.row_height = row_height
+        self.prefetch_rows = prefetch_rows
+        self.user_id = None
+        self._cursor = None
+        self._exhausted = True
+        self._top_offset = None
+
+        self.layout = RecycleBoxLayout(
+            viewclass=SessionRow,
+            orientation='vertical',
+            default_size=(None, row_height),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=10,
+            padding=[0, 10]
+        )
+        self.layout.bind(minimum_height=self.layout.setter('height'))
+        self.add_widget(self.layout)
+
+        # Also re-checked once a new page has been laid out, which keeps
+        # loading until the visible area is full
+        self._trigger_check = Clock.create_trigger(self._check_scroll)
+        self.bind(scroll_y=self._trigger_check, height=self._trigger_check)
+        self.layout.bind(height=self._keep_position)
+        self.layout.bind(height=self._trigger_check)
+
+    def show_user(self, user_id):
+        """Clear the list and load the first page for user_id"""
+        dispatcher.cancel(self)
+        self.user_id = user_id
+        self._cursor = None
+        self._exhausted = False
+        self._top_offset = None
+        self.data = []
+        self.scroll_y = 1
+        self.load_more()
+
+    def load_more(self):
+        if self.user_id is None or self._exhausted or self.loading:
+            return
+        dispatcher.submit(
+            self.load_page, self.user_id, self._cursor, self.page_size,
+            owner=self,
+            on_success=self._on_page,
+            on_error=lambda e: print(f"Error loading session history: {e}")
+        )
+
+    def cancel(self):
+        """Drop an in-flight page; resume() or the next scroll asks for it again"""
+        dispatcher.cancel(self)
+
+    def resume(self):
+        """Fetch the next page if the list is short of one, e.g. after cancel()"""
+        self._trigger_check()
+
+    def on_db_busy(self, busy):
+        self.loading = busy
+
+    # ---------- INTERNAL ----------
+    def _on_page(self, result):
+        sessions, cursor = result
+        self._cursor = cursor
+        self._exhausted = cursor is None
+        if sessions:
+            # Growing the list would otherwise shift the rows under the user's finger
+            self._top_offset = self._scrolled_from_top()
+            self.data.extend(session_row_data(session) for session in sessions)
+
+    def _scrolled_from_top(self):
+        return (1 - self.scroll_y) * max(self.layout.height - self.height, 0)
+
+    def _keep_position(self, layout, height):
+        if self._top_offset is None:
+            return
+        scrollable = height - self.height
+        if scrollable > 0:
+            self.scroll_y = max(0, 1 - self._top_offset / scrollable)
+        self._top_offset = None
+
+    def _check_scroll(self, *args):
+        remaining = self.scroll_y * max(self.layout.height - self.height, 0)
+        if remaining < self.prefetch_rows * self.row_height:
+            self.load_more()
@@ -0,0 +1,117 @@
+"""
+Session repository for Nyx Sleep Tracker
+Per-user in-memory cache of the session data the stats and chart screens
+read, so moving between tracker, stats and charts does not re-query the
+local store. Entries are dropped when this app adds a session or a sync
+pulls new ones, and expire after max_age seconds
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import local_store
+
+_MISSING = object()
+
+
+def load_stats(user_id, store=local_store):
+    """
+    Summary figures for the stats screen, or None when there are no sessions.
+    All of them come from the 'month' rollups through sleep_analytics, the
+    same module the charts use. store is any module with the NyxDB read
+    API - the local store by default.
+    """
+    import sleep_analytics  # NumPy - loaded with the first stats, not at startup
+
+    months = store.get_rollups(user_id, 'month')
+    summary = sleep_analytics.rollup_summary(months)
+    if not summary['session_count']:
+        return None
+
+    first_of_month = datetime.now().date().replace(day=1)
+    this_month = first_of_month.strftime('%Y-%m')
+    last_month = (first_of_month - timedelta(days=1)).strftime('%Y-%m')
+    month_keys, means = sleep_analytics.rollup_monthly_means(months)
+    monthly_means = dict(zip(month_keys.astype(str).tolist(), means.tolist()))
+    change = None
+    if this_month in monthly_means and last_month in monthly_means:
+        change = monthly_means[this_month] - monthly_means[last_month]
+    return {
+        'summary': summary,
+        'monthly': sleep_analytics.rollup_summary([row for row in months if row['bucket'] == this_month]),
+        'monthly_means': monthly_means,
+        'month_change': change,   # this month's average minus last month's, hours
+    }
+
+
+class SessionRepository:
+    """
+    Thread-safe cache keyed by (user_id, name).
+
+    get() runs the loader on a miss outside the lock (it is a database
+    call), and only stores the result if the user was not invalidated
+    while it ran, so a slow read can never cache data older than a write.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._entries = {}      # (user_id, name) -> (loaded_at, value)
+        self._generations = {}  # user_id -> bumped on every invalidate
+        self._lock = threading.Lock()
+
+    def peek(self, user_id, name, default=None):
+        """Cached value, or default if missing or expired; never touches the database"""
+        with self._lock:
+            entry = self._entries.get((user_id, name))
+        if entry is None or time.monotonic() - entry[0] > self.max_age:
+            return default
+        return entry[1]
+
+    def is_cached(self, user_id, name):
+        return self.peek(user_id, name, _MISSING) is not _MISSING
+
+    def get(self, user_id, name, loader):
+        value = self.peek(user_id, name, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            generation = self._generations.get(user_id, 0)
+        value = loader(user_id)
+        with self._lock:
+            if self._generations.get(user_id, 0) == generation:
+                self._entries[(user_id, name)] = (time.monotonic(), value)
+        return value
+
+    def invalidate(self, user_id=None):
+        """Drop everything cached for a user, or for everyone"""
+        with self._lock:
+            if user_id is None:
+                for uid in self._generations:
+                    self._generations[uid] += 1
+                self._entries.clear()
+                return
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    # ---------- DATA ----------
+    def get_stats(self, user_id):
+        return self.get(user_id, 'stats', load_stats)
+
+    def get_fingerprint(self, user_id):
+        """(session count, newest session id) - what chart caching keys on"""
+        return self.get(user_id, 'fingerprint', local_store.get_sessions_fingerprint)
+
+    def add_sleep_session(self, user_id, start_ts, end_ts):
+        """Write a session to the local store, then drop the user's cached reads"""
+        try:
+            return local_store.add_sleep_session(user_id, start_ts, end_ts)
+        finally:
+            # Even a failed write may have reached the server
+            self.invalidate(user_id)
+
+
+# Shared by every screen
+session_repository = SessionRepository()
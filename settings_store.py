@@ -0,0 +1,85 @@
+"""
+Settings store for Nyx Sleep Tracker
+Write-behind cache for bedtime/alarm settings: changes are held in memory
+and written once things go quiet, so a burst of checkbox clicks and time
+edits becomes a single database write
+"""
+
+import threading
+
+from kivy.clock import Clock
+
+from db_worker import dispatcher
+from sync_engine import sync_engine
+import local_store
+
+
+class SettingsStore:
+    """
+    Debounced writer for local_store.save_user_settings; the sync engine
+    then pushes the saved settings to MySQL.
+
+    update() records the latest settings for a user and restarts the
+    delay; when it expires everything pending is written. Settings equal
+    to the last ones written are dropped. flush() writes immediately.
+    """
+
+    def __init__(self, delay=1.5):
+        self._pending = {}  # user_id -> settings dict
+        self._saved = {}    # user_id -> last settings handed to the database
+        self._lock = threading.Lock()
+        self._trigger = Clock.create_trigger(lambda dt: self.flush(), delay)
+
+    def update(self, user_id, **settings):
+        with self._lock:
+            if self._saved.get(user_id) == settings:
+                self._pending.pop(user_id, None)
+                return
+            self._pending[user_id] = settings
+        # Restart the countdown on every change
+        self._trigger.cancel()
+        self._trigger()
+
+    def mark_saved(self, user_id, settings):
+        """Record settings loaded from the database so re-applying them is not a write"""
+        with self._lock:
+            self._saved[user_id] = dict(settings)
+
+    def has_pending(self, user_id=None):
+        with self._lock:
+            return bool(self._pending) if user_id is None else user_id in self._pending
+
+    def flush(self, user_id=None):
+        """Queue pending writes now - for one user, or all of them"""
+        with self._lock:
+            if user_id is None:
+                batch = self._pending
+                self._pending = {}
+            elif user_id in self._pending:
+                batch = {user_id: self._pending.pop(user_id)}
+            else:
+                batch = {}
+            for uid, settings in batch.items():
+                self._saved[uid] = settings
+        if not self._pending:
+            self._trigger.cancel()
+
+        for uid, settings in batch.items():
+            dispatcher.submit(
+                local_store.save_user_settings, uid,
+                write=True,
+                on_success=sync_engine.request_sync,
+                on_error=lambda e, uid=uid: self._on_save_error(uid, e),
+                **settings
+            )
+        return len(batch)
+
+    def _on_save_error(self, user_id, error):
+        print(f"Error saving settings: {error}")
+        with self._lock:
+            # Let the next update() retry instead of treating it as a no-op
+            self._saved.pop(user_id, None)
+
+
+# Shared by the tracker screen and NyxApp.on_stop
+settings_store = SettingsStore()
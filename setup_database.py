@@ -1,97 +1,63 @@
 """
 Nyx Sleep Tracker - Database Setup Script
-Run this to create all necessary tables
+Run this to create the database, or to upgrade an existing one - the
+tables themselves are built by the numbered migrations in migrations.py.
+Connects with the same NYX_DB_* settings as the app (backends/mysql_backend.py)
+
+Usage:
+  python setup_database.py                 (apply all pending migrations)
+  python setup_database.py --dry-run       (print what would run)
+  python setup_database.py --target 3      (stop after migration 3)
+  python setup_database.py --partition-resets
+                                           (also partition password_resets by day)
 """
 
+import argparse
+
 import mysql.connector
 from mysql.connector import Error
 
-def create_database():
-    """Create the database and all tables"""
+import migrations
+from backends.mysql_backend import mysql_config
+
+
+def create_database(dry_run=False, target=None, chunk_size=5000, chunk_pause=0.0,
+                    partition_resets=False):
+    """Create the database and migrate it to the latest (or target) schema version"""
     
     connection = None
+    config = mysql_config()
+    name = config.pop("database")
     try:
         # Connect to MySQL (without specifying database)
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password=""
-        )
+        connection = mysql.connector.connect(**config)
         
         cursor = connection.cursor()
         
         print("📦 Setting up Nyx Sleep Tracker database...")
         
         # 1. Create database
-        cursor.execute("CREATE DATABASE IF NOT EXISTS nyx_sleep CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci")
-        cursor.execute("USE nyx_sleep")
-        print("✅ Database 'nyx_sleep' created/verified")
+        cursor.execute("SHOW DATABASES LIKE %s", (name,))
+        if cursor.fetchall():
+            cursor.execute(f"USE `{name}`")
+            print(f"✅ Database '{name}' verified")
+        elif dry_run:
+            print(f"📝 Would create database '{name}'")
+        else:
+            cursor.execute(f"CREATE DATABASE `{name}` CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci")
+            cursor.execute(f"USE `{name}`")
+            print(f"✅ Database '{name}' created")
         
-        # 2. Create users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(50) NOT NULL UNIQUE,
-                password VARCHAR(255) NOT NULL,
-                email VARCHAR(100) NOT NULL UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                INDEX idx_username (username),
-                INDEX idx_email (email)
-            )
-        """)
-        print("✅ 'users' table created")
+        # 2. Bring the schema up to date
+        applied = migrations.migrate(connection, target=target, dry_run=dry_run,
+                                     chunk_size=chunk_size, chunk_pause=chunk_pause)
+        if partition_resets:
+            migrations.partition_password_resets(migrations.Migrator(connection, dry_run))
+        if dry_run:
+            print(f"\n📝 Dry run: {len(applied)} migration(s) pending, nothing was changed")
+            return
         
-        # 3. Create sleep_sessions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sleep_sessions (
-                session_id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                year INT NOT NULL,
-                month INT NOT NULL,
-                day INT NOT NULL,
-                hours DECIMAL(5,2) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
-                INDEX idx_user_date (user_id, year, month, day)
-            )
-        """)
-        print("✅ 'sleep_sessions' table created")
-        
-        # 4. Create user_settings table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_settings (
-                setting_id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL UNIQUE,
-                bedtime_enabled TINYINT(1) DEFAULT 0,
-                bedtime_hour VARCHAR(2) DEFAULT '10',
-                bedtime_minute VARCHAR(2) DEFAULT '00',
-                bedtime_ampm VARCHAR(2) DEFAULT 'PM',
-                alarm_enabled TINYINT(1) DEFAULT 0,
-                alarm_hour VARCHAR(2) DEFAULT '06',
-                alarm_minute VARCHAR(2) DEFAULT '30',
-                alarm_ampm VARCHAR(2) DEFAULT 'AM',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-            )
-        """)
-        print("✅ 'user_settings' table created")
-        
-        # 5. Create password_resets table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS password_resets (
-                reset_id INT AUTO_INCREMENT PRIMARY KEY,
-                email VARCHAR(100) NOT NULL,
-                code VARCHAR(6) NOT NULL,
-                expires_at DATETIME NOT NULL,
-                used TINYINT(1) DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                INDEX idx_email_code (email, code)
-            )
-        """)
-        print("✅ 'password_resets' table created")
-        
-        # 6. Create test user (optional)
+        # 3. Create test user (optional)
         try:
             cursor.execute("""
                 INSERT INTO users (username, password, email) 
@@ -103,6 +69,7 @@ def create_database():
             print("ℹ️  Test user already exists")
         
         connection.commit()
+        
         print("\n" + "="*50)
         print("✨ DATABASE SETUP COMPLETE!")
         print("="*50)
@@ -122,4 +89,14 @@ def create_database():
             print("\n🔌 Database connection closed")
 
 if __name__ == "__main__":
-    create_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create or upgrade the Nyx Sleep Tracker database")
+    parser.add_argument("--dry-run", action="store_true", help="print pending migrations without running them")
+    parser.add_argument("--target", type=int, help="migrate up to this version only")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows per backfill transaction")
+    parser.add_argument("--chunk-pause", type=float, default=0.0,
+                        help="seconds to sleep between backfill chunks on a busy server")
+    parser.add_argument("--partition-resets", action="store_true",
+                        help="partition password_resets by day so old codes are dropped a day at a time")
+    args = parser.parse_args()
+    create_database(args.dry_run, args.target, args.chunk_size, args.chunk_pause,
+                    args.partition_resets)
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+Sleep analytics for Nyx Sleep Tracker
+Turns NyxDB.get_rollups() buckets into NumPy columns and computes the
+averages the charts and the statistics screen need with vectorized
+arithmetic. Each function takes the rows of one rollup period.
+"""
+
+import numpy as np
+
+DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def _day_of_week_result(sums, counts):
+    present = counts > 0
+    names = [name for name, has_data in zip(DAY_NAMES, present) if has_data]
+    return names, sums[present] / counts[present]
+
+
+def _weekday_weekend_result(weekday_sums, weekday_counts, weekend_sums, weekend_counts):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weekday_means = np.where(weekday_counts > 0, weekday_sums / weekday_counts, 0.0)
+        weekend_means = np.where(weekend_counts > 0, weekend_sums / weekend_counts, 0.0)
+    return weekday_means, weekend_means
+
+
+def _rollup_columns(rows):
+    count = len(rows)
+    columns = {}
+    for name in ('total_hours', 'session_count', 'weekend_hours', 'weekend_count'):
+        columns[name] = np.fromiter((row[name] for row in rows), dtype=np.float64, count=count)
+    return columns
+
+
+def rollup_day_of_week_means(rows):
+    """(day names, means) from 'dow' rollup rows"""
+    sums = np.zeros(7)
+    counts = np.zeros(7)
+    columns = _rollup_columns(rows)
+    index = np.fromiter((int(row['bucket']) for row in rows), dtype=np.int64, count=len(rows))
+    sums[index] = columns['total_hours']
+    counts[index] = columns['session_count']
+    return _day_of_week_result(sums, counts)
+
+
+def rollup_weekly_means(rows):
+    """(week start dates, weekday means, weekend means) from 'week' rollup rows, oldest first"""
+    columns = _rollup_columns(rows)
+    weeks = np.array([row['bucket'] for row in rows], dtype='datetime64[D]')
+    weekday_means, weekend_means = _weekday_weekend_result(
+        columns['total_hours'] - columns['weekend_hours'],
+        columns['session_count'] - columns['weekend_count'],
+        columns['weekend_hours'],
+        columns['weekend_count'],
+    )
+    return weeks, weekday_means, weekend_means
+
+
+def rollup_monthly_means(rows):
+    """(months as datetime64[M], mean hours per session) from 'month' rollup rows, oldest first"""
+    columns = _rollup_columns(rows)
+    months = np.array([row['bucket'] for row in rows], dtype='datetime64[M]')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(columns['session_count'] > 0,
+                         columns['total_hours'] / columns['session_count'], 0.0)
+    return months, means
+
+
+def rollup_summary(rows):
+    """Session count, total hours and average hours over rollup rows of one period"""
+    columns = _rollup_columns(rows)
+    count = int(columns['session_count'].sum())
+    total = float(columns['total_hours'].sum())
+    return {
+        'session_count': count,
+        'total_hours': total,
+        'avg_hours': total / count if count else 0.0,
+    }
@@ -0,0 +1,222 @@
+"""
+Sync engine for Nyx Sleep Tracker
+Pushes sessions and settings recorded in the local store to MySQL in
+batches and pulls changes made on other devices, on a background thread.
+Sessions are append-only and carry a client UUID, so a retried push never
+duplicates them. Settings carry a server-assigned revision: if it moved
+while this device had unsynced edits, the server copy wins
+"""
+
+from kivy.clock import Clock
+from kivy.event import EventDispatcher
+from kivy.properties import NumericProperty, StringProperty
+
+from db_worker import dispatcher
+from session_repository import session_repository
+import local_store
+import NyxDB as db
+
+
+def _push_sessions(user_id, batch_size):
+    pushed = 0
+    while True:
+        pending = local_store.get_pending_sessions(user_id, batch_size)
+        if not pending:
+            break
+        local_store.mark_sessions_synced(db.push_sleep_sessions(user_id, pending))
+        pushed += len(pending)
+        if len(pending) < batch_size:
+            break
+    return pushed
+
+
+def _pull_sessions(user_id, batch_size):
+    pulled = 0
+    watermark = local_store.get_pull_watermark(user_id)
+    after = (watermark - db.PULL_OVERLAP, 0) if watermark else None
+    while True:
+        sessions = db.get_sessions_created_after(user_id, after, batch_size)
+        if not sessions:
+            break
+        pulled += local_store.merge_remote_sessions(user_id, sessions)
+        last = sessions[-1]
+        after = (last['created_at'], last['session_id'])
+        local_store.set_pull_watermark(user_id, last['created_at'])
+        if len(sessions) < batch_size:
+            break
+    return pulled
+
+
+def _sync_settings(user_id):
+    """
+    Reconcile one user's settings row. Returns 'pushed', 'pulled',
+    'conflict' (saved on another device meanwhile, so the server copy won)
+    or None.
+    """
+    local = local_store.get_user_settings(user_id)
+    remote = db.get_user_settings(user_id)
+    changed_remotely = remote is not None and (
+        local is None or remote['revision'] != local['remote_revision'])
+
+    if local and local['dirty']:
+        if changed_remotely:
+            if local_store.apply_remote_settings(user_id, remote, local['revision']):
+                return 'conflict'
+            return None  # edited again meanwhile - the next sync decides
+
+        db.save_user_settings(user_id, **{field: local[field] for field in local_store.SETTINGS_FIELDS})
+        # The revision this save made, unless another device saved in between -
+        # then the server is ahead of it and the next sync pulls
+        pushed_revision = (remote['revision'] if remote else 0) + 1
+        local_store.mark_settings_synced(user_id, local['revision'], pushed_revision)
+        return 'pushed'
+
+    if changed_remotely:
+        if local_store.apply_remote_settings(
+                user_id, remote, local['revision'] if local else None):
+            return 'pulled'
+    return None
+
+
+def sync(user_id, batch_size=200):
+    """
+    One sync pass (runs on a worker thread). Pushes pending work for every
+    local user, then pulls the signed-in user's remote changes.
+    """
+    result = {'pushed': 0, 'pulled': 0, 'settings': None}
+
+    for uid in local_store.get_pending_user_ids():
+        result['pushed'] += _push_sessions(uid, batch_size)
+        if uid != user_id:
+            _sync_settings(uid)
+
+    result['pulled'] = _pull_sessions(user_id, batch_size)
+    result['settings'] = _sync_settings(user_id)
+    result['pending'] = local_store.pending_count(user_id)
+    return result
+
+
+class SyncEngine(EventDispatcher):
+    """
+    Runs sync() in the background while a user is signed in.
+
+    status is one of 'idle', 'syncing', 'synced', 'pending' or 'offline'
+    and pending is the number of local changes not on the server yet -
+    bind to them for a status indicator. on_pulled(user_id, result) fires
+    when remote changes were brought in. Failed syncs back off up to
+    max_interval.
+    """
+
+    status = StringProperty('idle')
+    pending = NumericProperty(0)
+    last_error = StringProperty('')
+
+    __events__ = ('on_pulled',)
+
+    def __init__(self, interval=30, max_interval=300, batch_size=200, **kwargs):
+        super().__init__(**kwargs)
+        self.interval = interval
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.user_id = None
+        self._delay = interval
+        self._running = False
+        self._again = False
+        self._event = None
+        self._trigger = Clock.create_trigger(self._start_sync, 1)
+
+    def start(self, user_id):
+        self.stop()
+        self.user_id = user_id
+        self._delay = self.interval
+        self._start_sync()
+
+    def stop(self):
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+        self._trigger.cancel()
+        self.user_id = None
+        self.status = 'idle'
+        self.pending = 0
+
+    def request_sync(self, *args):
+        """Sync soon - call after writing to the local store; bursts collapse into one pass"""
+        if self.user_id is not None:
+            self._trigger()
+
+    def on_pulled(self, user_id, result):
+        pass
+
+    # ---------- INTERNAL ----------
+    def _start_sync(self, *args):
+        if self.user_id is None:
+            return
+        if self._running:
+            self._again = True
+            return
+
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+        self._running = True
+        self._again = False
+        self.status = 'syncing'
+        user_id = self.user_id
+        dispatcher.submit(
+            sync, user_id, self.batch_size,
+            write=True,
+            on_success=lambda result: self._on_synced(user_id, result),
+            on_error=lambda error: self._on_failed(user_id, error)
+        )
+
+    def _on_synced(self, user_id, result):
+        self._running = False
+        if user_id != self.user_id:
+            self._resume_current_user()
+            return
+
+        self._delay = self.interval
+        self.pending = result['pending']
+        self.status = 'pending' if result['pending'] else 'synced'
+        self.last_error = ''
+
+        if result['pushed'] or result['pulled'] or result['settings']:
+            print(f"🔄 Sync: pushed {result['pushed']}, pulled {result['pulled']}, "
+                  f"settings {result['settings'] or 'unchanged'}")
+        if result['pulled'] or result['settings'] in ('pulled', 'conflict'):
+            session_repository.invalidate(user_id)
+            self.dispatch('on_pulled', user_id, result)
+
+        self._schedule_next()
+
+    def _on_failed(self, user_id, error):
+        self._running = False
+        if user_id != self.user_id:
+            self._resume_current_user()
+            return
+
+        print(f"⚠️ Sync failed, working offline: {error}")
+        self.status = 'offline'
+        self.last_error = str(error)
+        self.pending = local_store.pending_count(user_id)
+        self._delay = min(self._delay * 2, self.max_interval)
+        self._schedule_next()
+
+    def _resume_current_user(self):
+        """
+        A pass for a user who has since signed out finished. Whoever signed
+        in meanwhile was only queued (_again) behind it, so start theirs now.
+        """
+        if self.user_id is not None:
+            self._schedule_next()
+
+    def _schedule_next(self):
+        if self._again:
+            self._start_sync()
+        else:
+            self._event = Clock.schedule_once(self._start_sync, self._delay)
+
+
+# App-wide sync engine
+sync_engine = SyncEngine()